@@ -1,76 +1,373 @@
-from flask import Flask, jsonify, render_template, request
-from pymongo import MongoClient
+import os
+import sys
+import json
+import zlib
+import queue
+import argparse
+import threading
+import logging
+from flask import Flask, Response, g, jsonify, render_template, request, stream_with_context
 from bson import ObjectId
 import base64
+import datetime
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from database import get_collection
+from image_store import get_image_store, is_valid_image_id
+from plate_search import (
+    ensure_indexes, find_plates, find_since, search_since, build_query, encode_cursor, encode_since, settled_since,
+)
+from plate_feed import get_plate_feed
+from analytics import get_traffic_stats, ensure_retention, GRANULARITIES
+from memory_db import match_filter
+from ttl_cache import TTLCache
+from config import (
+    SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE, SSE_KEEPALIVE, API_HOST, API_PORT, API_THREADS, API_CACHE_SIZE,
+    API_CACHE_TTL, API_CACHE_MAX_BODY, API_GZIP_LEVEL, PLATE_FEED_LOOKBACK,
+)
+from metrics import REGISTRY, CONTENT_TYPE, Histogram
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-client = MongoClient('mongodb://localhost:27017/')
-db = client['vehicle_db']
-collection = db['vehicle_plates']
+# the client connects lazily; indexes, retention and the rollups are set up by setup()
+collection = get_collection()
+_setup_lock = threading.Lock()
+_setup_done = False
+
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# rendered /api/plates bodies, shared by operators running the same search
+plates_cache = TTLCache(API_CACHE_SIZE, API_CACHE_TTL)
+stats_cache = TTLCache(API_CACHE_SIZE, API_CACHE_TTL)
+
+HTTP_SECONDS = Histogram("lpr_http_request_seconds", "API request latency.", ("endpoint", "status"))
+
+def setup() -> None:
+    """Indexes, record retention (and its image sweeper) and the rollups, once, before the first request."""
+    global _setup_done
+    if _setup_done:
+        return
+    with _setup_lock:
+        if not _setup_done:
+            ensure_indexes(collection)
+            ensure_retention(collection)
+            get_traffic_stats()
+            _setup_done = True
+
+@app.before_request
+def start_timer():
+    setup()
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    start = g.get("request_start")
+    if start is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or "unknown",
+                             status=response.status_code)
+    return response
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def image_urls(doc: dict) -> tuple[str, str]:
+    image_id = doc.get("image_id")
+    if image_id:
+        return f"/api/images/{image_id}", f"/api/images/{image_id}/thumb"
+    # records written before the image store kept the JPEG inline
+    legacy = f"/api/plate/{doc['_id']}/image"
+    return legacy, legacy
+
+def image_response(data: bytes, etag: str) -> Response:
+    response = Response(data, mimetype="image/jpeg")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+    return response.make_conditional(request)
+
 @app.route("/clear-db", methods=["DELETE"])
 def clear_db():
     try:
-        result = collection.delete_many({})   
+        result = collection.delete_many({})
+        get_image_store().clear()
+        get_traffic_stats().clear()
+        plates_cache.clear()
+        stats_cache.clear()
         return jsonify({"message": f"Đã xóa {result.deleted_count} bản ghi!"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def parse_time(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value) if value else None
+
+def plate_summary(doc: dict) -> dict:
+    image_url, thumbnail_url = image_urls(doc)
+    return {
+        "id": str(doc["_id"]),
+        "camera_id": doc.get("camera_id"),
+        "plate": doc.get("plate", ""),
+        "image_url": image_url,
+        "thumbnail_url": thumbnail_url,
+        "timestamp": doc["timestamp"].strftime("%Y-%m-%d %H:%M:%S") if doc.get("timestamp") else None,
+        "vehicle_type": doc.get("vehicle_type", ""),
+        "vehicle_confidence": float(doc.get("vehicle_confidence", 0)) if doc.get("vehicle_confidence") else None,
+        "ocr_confidence": float(doc.get("ocr_confidence", 0)) if doc.get("ocr_confidence") else None,
+    }
+
 @app.route('/api/plates')
 def get_plates():
     search_query = request.args.get("search", "").strip()
     vehicle_type = request.args.get("vehicle_type", "").strip()
-    
-    query = {}
+    exact = request.args.get("match", "prefix") == "exact"
+    cursor = request.args.get("cursor") or None
+    since = request.args.get("since") or None
+    camera_id = request.args.get("camera_id", "").strip() or None
 
-    conditions = []
+    use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    cache_key = (tuple(sorted(request.args.items(multi=True))), use_gzip)
+    cached = plates_cache.get(cache_key)
+    if cached is not None:
+        return json_response([cached], use_gzip)
 
-    if search_query:
-        conditions.append({
-            "$or": [
-                {"plate": {"$regex": search_query, "$options": "i"}},
-                {"vehicle_type": {"$regex": search_query, "$options": "i"}},
-            ]
-        })
+    try:
+        limit = min(max(int(request.args.get("limit", SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+        if since:
+            # incremental mode: only what was written after the last fetch, oldest first
+            docs = find_since(collection, since, search_query, vehicle_type, exact, limit, camera_id)
+        else:
+            start = parse_time(request.args.get("from", "").strip())
+            end = parse_time(request.args.get("to", "").strip())
+            docs = find_plates(collection, search_query, vehicle_type, start, end, exact, cursor, limit, camera_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    if vehicle_type:
-        conditions.append({"vehicle_type": vehicle_type})
+    chunks = plates_json(docs, limit, since, first_page=not cursor)
+    if use_gzip:
+        chunks = gzip_chunks(chunks)
+    return json_response(cache_chunks(chunks, cache_key), use_gzip)
 
-    if conditions:
-        query["$and"] = conditions
+def plates_json(docs, limit: int, since: str = None, first_page: bool = True, chunk_items: int = 50):
+    """Serializes the records of a database cursor piece by piece, ``chunk_items`` records at a time."""
+    yield b'{"items":['
+    first = last = None
+    has_more = False
+    pending = []
+    written = False
+    for n, doc in enumerate(docs):
+        if n == limit:
+            has_more = True
+            break
+        pending.append(json.dumps(plate_summary(doc)))
+        first = first or doc
+        last = doc
+        if len(pending) >= chunk_items:
+            yield (b"," if written else b"") + ",".join(pending).encode()
+            pending, written = [], True
+    if pending:
+        yield (b"," if written else b"") + ",".join(pending).encode()
 
-    cursor = collection.find(query).sort("timestamp", -1).limit(1000)
+    if since:
+        tail = {"since": encode_since(last) if last else since}
+    else:
+        tail = {
+            "next_cursor": encode_cursor(last) if has_more else None,
+            # token for ?since= and the live stream; records of this page written after it may come again
+            "since": settled_since() if first_page else None,
+        }
+    yield b"]," + json.dumps(tail).encode()[1:]
 
-    plates = []
-    for doc in cursor:
-        plates.append({
-            "id": str(doc["_id"]),
-            "plate": doc.get("plate", ""),
-            "image_base64": doc.get("image_base64", ""),
-            "timestamp": doc["timestamp"].strftime("%Y-%m-%d %H:%M:%S") if doc.get("timestamp") else None,
-            "vehicle_type": doc.get("vehicle_type", ""),
-            "vehicle_confidence": float(doc.get("vehicle_confidence", 0)) if doc.get("vehicle_confidence") else None,
-            "ocr_confidence": float(doc.get("ocr_confidence", 0)) if doc.get("ocr_confidence") else None,
-        })
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(API_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
-    return jsonify(plates)
+def cache_chunks(chunks, cache_key, max_size: int = API_CACHE_MAX_BODY):
+    """Passes ``chunks`` through and caches the body, unless it grows beyond ``max_size`` bytes."""
+    body, size = [], 0
+    for chunk in chunks:
+        if body is not None:
+            size += len(chunk)
+            if size <= max_size:
+                body.append(chunk)
+            else:
+                # a large page is streamed without a copy, and not cached
+                body = None
+        yield chunk
+    if body is not None:
+        plates_cache.set(cache_key, b"".join(body))
 
+def json_response(chunks, use_gzip: bool) -> Response:
+    response = Response(chunks, mimetype="application/json")
+    response.headers["Vary"] = "Accept-Encoding"
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
 
+def sse_event(doc: dict) -> str:
+    return f"id: {encode_since(doc)}\nevent: plate\ndata: {json.dumps(plate_summary(doc))}\n\n"
+
+@app.route('/api/plates/stream')
+def stream_plates():
+    search_query = request.args.get("search", "").strip()
+    vehicle_type = request.args.get("vehicle_type", "").strip()
+    exact = request.args.get("match", "prefix") == "exact"
+    camera_id = request.args.get("camera_id", "").strip() or None
+    # EventSource resends the id of the last event it got when it reconnects
+    since = request.headers.get("Last-Event-ID") or request.args.get("since") or None
+    feed = get_plate_feed(collection)
+    events = feed.subscribe()
+    if events is None:
+        # every stream holds a server thread: refuse rather than starve the other routes
+        response = jsonify({"error": "Too many live streams, poll /api/plates?since= instead"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    # subscribed before the backlog is read, so nothing falls between the two; overlaps are deduped below
+    try:
+        query = build_query(search_query, vehicle_type, exact=exact, camera_id=camera_id)
+        # event ids come from the live feed, which runs ahead of the settled records: look back
+        lookback = PLATE_FEED_LOOKBACK if request.headers.get("Last-Event-ID") else 0
+        backlog = search_since(collection, since, search_query, vehicle_type, exact, SEARCH_MAX_PAGE_SIZE,
+                               camera_id, lookback, settled=False)[0] if since else []
+    except ValueError as e:
+        feed.unsubscribe(events)
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        try:
+            sent = {doc["_id"]: doc.get("written_at") for doc in backlog}
+            for doc in backlog:
+                yield sse_event(doc)
+            while True:
+                try:
+                    doc = events.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if doc["_id"] in sent and sent.pop(doc["_id"]) == doc.get("written_at"):
+                    continue
+                if not match_filter(doc, query):
+                    continue
+                yield sse_event(doc)
+        finally:
+            feed.unsubscribe(events)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/api/stats')
+def get_stats():
+    """Vehicle counts per bucket and vehicle type plus the busiest plates, answered from the rollups."""
+    cache_key = tuple(sorted(request.args.items(multi=True)))
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    try:
+        end = parse_time(request.args.get("to", "").strip()) or datetime.datetime.now()
+        start = parse_time(request.args.get("from", "").strip()) or end - datetime.timedelta(days=1)
+        interval = request.args.get("interval", "auto")
+        if interval != "auto" and interval not in GRANULARITIES:
+            raise ValueError(f"interval must be auto or one of {', '.join(GRANULARITIES)}")
+        if start >= end:
+            raise ValueError("from must be before to")
+        top = min(max(int(request.args.get("top", 10)), 0), 100)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    summary = get_traffic_stats().summary(
+        start, end, None if interval == "auto" else interval,
+        request.args.get("camera_id", "").strip() or None,
+        request.args.get("vehicle_type", "").strip() or None,
+        top,
+    )
+    summary["from"], summary["to"] = start.isoformat(), end.isoformat()
+    for point in summary["series"]:
+        point["bucket"] = point["bucket"].isoformat()
+    for plate in summary["top_plates"]:
+        plate["last_seen"] = plate["last_seen"].isoformat() if plate.get("last_seen") else None
+    stats_cache.set(cache_key, summary)
+    return jsonify(summary)
+
+def find_plate(plate_id: str, projection: dict) -> dict:
+    # a malformed id names no record: 404, not a bson InvalidId error
+    if not ObjectId.is_valid(plate_id):
+        return None
+    return collection.find_one({"_id": ObjectId(plate_id)}, projection)
 
 @app.route('/api/plate/<plate_id>')
 def get_plate_detail(plate_id):
-    doc = collection.find_one({"_id": ObjectId(plate_id)})
+    doc = find_plate(plate_id, {"image_base64": 0})
     if doc:
+        image_url, thumbnail_url = image_urls(doc)
         return jsonify({
             "plate": doc.get("plate"),
-            "image_base64": doc.get("image_base64"),
+            "image_url": image_url,
+            "thumbnail_url": thumbnail_url,
             "timestamp": doc.get("timestamp").strftime("%Y-%m-%d %H:%M:%S")
         })
     return jsonify({"error": "Not found"}), 404
 
+@app.route('/api/plate/<plate_id>/image')
+def get_plate_legacy_image(plate_id):
+    doc = find_plate(plate_id, {"image_base64": 1})
+    if not doc or not doc.get("image_base64"):
+        return jsonify({"error": "Not found"}), 404
+    return image_response(base64.b64decode(doc["image_base64"]), f"legacy-{plate_id}")
+
+@app.route('/api/images/<image_id>')
+def get_image(image_id):
+    if not is_valid_image_id(image_id):
+        return jsonify({"error": "Not found"}), 404
+    data = get_image_store().get(image_id)
+    if data is None:
+        return jsonify({"error": "Not found"}), 404
+    return image_response(data, image_id)
+
+@app.route('/api/images/<image_id>/thumb')
+def get_thumbnail(image_id):
+    if not is_valid_image_id(image_id):
+        return jsonify({"error": "Not found"}), 404
+    data = get_image_store().get(image_id, thumbnail=True)
+    if data is None:
+        return jsonify({"error": "Not found"}), 404
+    return image_response(data, f"{image_id}-thumb")
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def serve(host: str = API_HOST, port: int = API_PORT, threads: int = API_THREADS) -> None:
+    setup()
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        logger.warning("[API] waitress is not installed, using the threaded Werkzeug server")
+        app.run(host=host, port=port, threaded=True, debug=False)
+        return
+    logger.info(f"[API] Serving on http://{host}:{port} with {threads} threads")
+    # each open /api/plates/stream holds one thread, size the pool for the operators watching
+    waitress_serve(app, host=host, port=port, threads=threads, channel_timeout=120)
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    parser = argparse.ArgumentParser(description="License plate dashboard and API")
+    parser.add_argument("--debug", action="store_true", help="Flask development server with reloader")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--threads", type=int, default=API_THREADS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.debug:
+        app.run(host=args.host, port=args.port, debug=True)
+    else:
+        serve(args.host, args.port, args.threads)
@@ -0,0 +1,159 @@
+"""Load test for the dashboard API against the in-memory database.
+
+Seeds ``--records`` plate documents, serves app.py the way production does
+(waitress when installed, threaded Werkzeug otherwise) and fires searches
+from ``--concurrency`` client threads. Reports requests per second and
+latency percentiles.
+
+    python benchmarks/bench_api.py --requests 5000 --concurrency 32 --output load.json
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import config
+config.MONGO_URI = "memory://"
+from plate_search import utc_now
+
+VEHICLE_TYPES = ["car", "motorcycle", "truck", "bus"]
+PROVINCES = ["29", "30", "43", "51", "59"]
+
+def seed(collection, records: int) -> None:
+    rng = random.Random(0)
+    now = datetime.datetime.now()
+    written = utc_now()
+    docs = []
+    for i in range(records):
+        plate = f"{rng.choice(PROVINCES)}{rng.choice('ABCDEFGHK')}{rng.randint(10000, 99999)}"
+        docs.append({
+            "camera_id": f"cam{i % 4 + 1}",
+            "track_id": i,
+            "plate": plate,
+            "plate_key": plate,
+            "vehicle_type": rng.choice(VEHICLE_TYPES),
+            "vehicle_confidence": 0.9,
+            "ocr_confidence": 0.8,
+            "image_id": None,
+            "timestamp": now - datetime.timedelta(seconds=i * 7),
+            "written_at": written - datetime.timedelta(seconds=i * 7),
+        })
+    collection.insert_many(docs)
+
+def query_mix(rng: random.Random) -> str:
+    choice = rng.random()
+    if choice < 0.4:
+        return "/api/plates"
+    if choice < 0.6:
+        return f"/api/plates?vehicle_type={rng.choice(VEHICLE_TYPES)}"
+    if choice < 0.9:
+        return f"/api/plates?search={rng.choice(PROVINCES)}{rng.choice('ABCDEFGHK')}"
+    return f"/api/plates?camera_id=cam{rng.randint(1, 4)}&limit=50"
+
+def start_server(app, host: str, port: int, threads: int):
+    try:
+        from waitress import create_server
+        server = create_server(app, host=host, port=port, threads=threads)
+        name = "waitress"
+        port = server.effective_port
+        run = server.run
+    except ImportError:
+        import logging
+        from werkzeug.serving import make_server
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        server = make_server(host, port, app, threaded=True)
+        name = "werkzeug"
+        port = server.server_port
+        run = server.serve_forever
+    threading.Thread(target=run, name="api-server", daemon=True).start()
+    return name, port
+
+def fetch(url: str, use_gzip: bool) -> tuple[float, int]:
+    request = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"} if use_gzip else {})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        body = response.read()
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        json.loads(body)
+        return time.perf_counter() - start, len(body)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test for the plate search API")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=config.API_THREADS, help="server worker threads")
+    parser.add_argument("--no-cache", action="store_true", help="disable the search response cache")
+    parser.add_argument("--no-gzip", action="store_true", help="do not ask for compressed responses")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        config.API_CACHE_TTL = 0
+    import app as api
+
+    seed(api.collection, args.records)
+    server, port = start_server(api.app, "127.0.0.1", 0, args.threads)
+    base = f"http://127.0.0.1:{port}"
+    rng = random.Random(1)
+    urls = [base + query_mix(rng) for _ in range(args.requests)]
+    use_gzip = not args.no_gzip
+
+    for url in urls[:20]:
+        fetch(url, use_gzip)
+
+    errors = 0
+    latencies, sizes = [], []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for future in [pool.submit(fetch, url, use_gzip) for url in urls]:
+            try:
+                latency, size = future.result()
+                latencies.append(latency)
+                sizes.append(size)
+            except Exception as e:
+                errors += 1
+                print(f"[load] {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    times = np.asarray(latencies) * 1000
+    result = {
+        "server": server,
+        "server_threads": args.threads,
+        "records": args.records,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "cache": not args.no_cache,
+        "gzip": use_gzip,
+        "errors": errors,
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(np.percentile(times, 50)) if len(times) else None,
+        "p95_ms": float(np.percentile(times, 95)) if len(times) else None,
+        "p99_ms": float(np.percentile(times, 99)) if len(times) else None,
+        "avg_body_bytes": float(np.mean(sizes)) if sizes else None,
+        "cache_hits": api.plates_cache.hits,
+        "cache_misses": api.plates_cache.misses,
+    }
+    print(f"{server}: {result['rps']:.0f} req/s, p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+          f"p99 {result['p99_ms']:.1f} ms, errors {errors}, cache hits {result['cache_hits']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Compares the inference backends of the three YOLO models on CPU.
+
+For every backend (torch, onnx, openvino) and model (vehicle, lpr, ocr)
+the .pt weights are exported if needed, then cold start (load + first
+inference), warm latency percentiles and throughput are measured on
+synthetic inputs of the size each model sees in the pipeline.
+
+    python benchmarks/bench_backends.py --backends torch onnx openvino --int8 --threads 4 --output backends.json
+
+Backends whose runtime is not installed are reported as skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# inputs shaped like the pipeline's: a camera frame, a vehicle crop, an upscaled plate crop
+INPUT_SHAPES = {
+    "vehicle": (720, 1280, 3),
+    "lpr": (320, 320, 3),
+    "ocr": (320, 960, 3),
+}
+
+def bench_model(name: str, backend: str, int8: bool, runs: int) -> dict:
+    import models
+    from config import MODEL_DEVICE, MODEL_IMGSZ
+    start = time.perf_counter()
+    model = models.load_model(name, backend, int8)
+    cold_start = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, INPUT_SHAPES[name], dtype=np.uint8)
+    samples = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        model.predict(source=image, imgsz=MODEL_IMGSZ[name], device=MODEL_DEVICE, verbose=False)
+        samples.append(time.perf_counter() - t)
+    times = np.asarray(samples) * 1000
+    return {
+        "path": models.export_path(name, backend, int8),
+        "cold_start_s": cold_start,
+        "p50_ms": float(np.percentile(times, 50)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "fps": 1000.0 / float(times.mean()),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare torch / ONNX Runtime / OpenVINO on the LPR models")
+    parser.add_argument("--backends", nargs="*", default=["torch", "onnx", "openvino"])
+    parser.add_argument("--models", nargs="*", default=list(INPUT_SHAPES))
+    parser.add_argument("--int8", action="store_true", help="quantized exports for onnx and openvino")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads (INFERENCE_THREADS)")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # model paths in config.py are relative to src/
+    sys.path.insert(0, SRC_DIR)
+    os.chdir(SRC_DIR)
+    import config
+    config.INFERENCE_THREADS = args.threads
+
+    results = {}
+    for backend in args.backends:
+        results[backend] = {}
+        for name in args.models:
+            print(f"[bench] {backend}/{name} ...", file=sys.stderr)
+            try:
+                results[backend][name] = bench_model(name, backend, args.int8 and backend != "torch", args.runs)
+            except Exception as e:
+                # missing runtime or failed export
+                results[backend][name] = {"skipped": f"{type(e).__name__}: {e}"}
+
+    print(f"{'backend/model':<22}{'cold s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'fps':>9}")
+    for backend, per_model in results.items():
+        for name, r in per_model.items():
+            if "skipped" in r:
+                print(f"{backend + '/' + name:<22}  skipped: {r['skipped']}")
+            else:
+                print(f"{backend + '/' + name:<22}{r['cold_start_s']:>9.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                      f"{r['p99_ms']:>10.2f}{r['fps']:>9.1f}")
+
+    if output:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "threads": args.threads,
+            "int8": args.int8,
+            "results": results,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""CPU benchmarks for the recognition pipeline.
+
+Every stage is timed on its own (vehicle detection, plate detection,
+alignment, OCR, Mongo persistence) and the full ``process_video`` is run
+end to end. Results are printed as a table and written as JSON so two runs
+can be compared.
+
+    python benchmarks/bench_pipeline.py --clips clips/*.mp4 --crops crops/ --output bench.json
+
+Without ``--clips`` / ``--crops`` synthetic fixtures are generated, which is
+enough to compare two revisions of the code on the same machine but not to
+judge recognition accuracy. Mongo writes always go to the in-memory
+stand-in (``MONGO_URI = "memory://"``) and images to a temporary directory.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+def setup_environment(image_dir: str) -> None:
+    # model paths in config.py are relative to src/, and the database must
+    # be the stand-in before database.py reads MONGO_URI
+    sys.path.insert(0, SRC_DIR)
+    os.chdir(SRC_DIR)
+    import config
+    config.MONGO_URI = "memory://"
+    config.IMAGE_STORE = "disk"
+    config.IMAGE_STORE_DIR = image_dir
+    # repeats feed the same crops and track ids: with the plate cache on, every timed call
+    # after the warmup would be a cache hit. detect_plate_cached measures hits on their own
+    config.PLATE_CACHE_SIZE = 0
+
+def reset_peak_rss() -> bool:
+    """Starts a new peak RSS window so the next benchmark reports its own peak (Linux only).
+
+    Elsewhere the peak is the process-wide ``ru_maxrss``, which never goes
+    down: every row after the largest benchmark shows the same number.
+    """
+    try:
+        # "5" resets VmHWM to the current RSS
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def summarize(samples: list[float], items: int = None) -> dict:
+    times = np.asarray(samples, dtype=np.float64)
+    if times.size == 0:
+        return {"count": 0}
+    total = float(times.sum())
+    items = times.size if items is None else items
+    return {
+        "count": int(times.size),
+        "mean_ms": float(times.mean() * 1000),
+        "p50_ms": float(np.percentile(times, 50) * 1000),
+        "p95_ms": float(np.percentile(times, 95) * 1000),
+        "p99_ms": float(np.percentile(times, 99) * 1000),
+        "max_ms": float(times.max() * 1000),
+        "fps": items / total if total > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def time_calls(func, inputs: list, repeat: int = 1, warmup: int = 2) -> dict:
+    for args in inputs[:warmup]:
+        func(*args)
+    samples = []
+    for _ in range(repeat):
+        for args in inputs:
+            start = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+# ---------------------------------------------------------------- fixtures
+
+PLATE_TEXTS = [("51F", "123.45"), ("30A", "999.99"), ("29B1", "234.56"), ("43C", "678.90"), ("59X2", "111.22")]
+
+def synthetic_plate(line1: str, line2: str, size: tuple = (240, 170)) -> np.ndarray:
+    plate = np.full((size[1], size[0], 3), 235, np.uint8)
+    cv2.rectangle(plate, (3, 3), (size[0] - 4, size[1] - 4), (20, 20, 20), 3)
+    cv2.putText(plate, line1, (40, 70), cv2.FONT_HERSHEY_SIMPLEX, 2.0, (15, 15, 15), 5)
+    cv2.putText(plate, line2, (20, 145), cv2.FONT_HERSHEY_SIMPLEX, 2.0, (15, 15, 15), 5)
+    return plate
+
+def synthetic_vehicle(plate: np.ndarray, rng: np.random.Generator, size: tuple = (320, 320)) -> np.ndarray:
+    body = np.full((size[1], size[0], 3), rng.integers(40, 200, 3), np.uint8)
+    small = cv2.resize(plate, (96, 68))
+    y, x = size[1] - 100, (size[0] - 96) // 2
+    body[y:y + 68, x:x + 96] = small
+    return body
+
+def skew(image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    h, w = image.shape[:2]
+    pad = 0.08
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    dst = src + rng.uniform(-pad, pad, (4, 2)).astype(np.float32) * np.float32([w, h])
+    M = cv2.getPerspectiveTransform(src, dst)
+    return cv2.warpPerspective(image, M, (w, h), borderValue=(90, 90, 90))
+
+def synthetic_clip(path: str, frames: int, size: tuple = (1280, 720), fps: int = 25, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    background = rng.integers(60, 120, (size[1], size[0], 3), dtype=np.uint8)
+    vehicles = [synthetic_vehicle(synthetic_plate(*t), rng) for t in PLATE_TEXTS[:3]]
+    for i in range(frames):
+        frame = background.copy()
+        # vehicles drive through the frame, the first third of the clip is static
+        for k, vehicle in enumerate(vehicles):
+            x = int((i - frames // 3) * 12 - k * 400)
+            if 0 <= x <= size[0] - vehicle.shape[1]:
+                y = 200 + k * 60
+                frame[y:y + vehicle.shape[0], x:x + vehicle.shape[1]] = vehicle
+        writer.write(frame)
+    writer.release()
+    return path
+
+def load_crops(path: str, rng: np.random.Generator, count: int) -> list[np.ndarray]:
+    if path:
+        files = sorted(f for ext in ("jpg", "jpeg", "png") for f in glob.glob(os.path.join(path, f"*.{ext}")))
+        crops = [img for img in (cv2.imread(f) for f in files) if img is not None]
+        if not crops:
+            raise SystemExit(f"No readable images in {path}")
+        return crops
+    return [skew(synthetic_plate(*PLATE_TEXTS[i % len(PLATE_TEXTS)]), rng) for i in range(count)]
+
+def clip_frames(path: str, limit: int) -> list[np.ndarray]:
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+# --------------------------------------------------------------- benchmarks
+
+def bench_detect_vehicles(frames: list[np.ndarray], repeat: int) -> dict:
+    from vehicle_detection import detect_vehicles
+    return time_calls(detect_vehicles, [(f,) for f in frames], repeat)
+
+def bench_detect_plate(vehicles: list[np.ndarray], repeat: int) -> dict:
+    from ocr import detect_plate_from_vehicle
+    return time_calls(detect_plate_from_vehicle, [(i, v, "car") for i, v in enumerate(vehicles)], repeat)
+
+def bench_detect_plate_cached(vehicles: list[np.ndarray], repeat: int) -> dict:
+    """Plate detection when the crop is a plate cache hit: hashing and lookup instead of alignment and OCR."""
+    import plate_cache
+    from ocr import detect_plate_from_vehicle
+    plate_cache._cache = plate_cache.PlateCache(maxsize=max(len(vehicles), 1))
+    try:
+        inputs = [(i, v, "car") for i, v in enumerate(vehicles)]
+        # the warmup pass fills the cache
+        result = time_calls(detect_plate_from_vehicle, inputs, repeat, warmup=len(inputs))
+        result["hit_rate"] = plate_cache._cache.hits / max(repeat * len(inputs), 1)
+        return result
+    finally:
+        plate_cache._cache = None
+
+def bench_detect_plates_batch(vehicles: list[np.ndarray], repeat: int) -> dict:
+    from ocr import detect_plates_batch
+    batch = [(i, v, "car") for i, v in enumerate(vehicles)]
+    result = time_calls(detect_plates_batch, [(batch,)], repeat * 3, warmup=1)
+    # fps is vehicles per second here, not batches
+    result["fps"] = result["fps"] * len(batch)
+    return result
+
+def bench_align(crops: list[np.ndarray], repeat: int) -> dict:
+    from plate_align import ALIGNERS, align_plate
+    results = {}
+    for name in ALIGNERS:
+        try:
+            results[name] = time_calls(lambda c: align_plate(c, method=name, fallback=()), [(c,) for c in crops], repeat)
+        except ImportError as e:
+            results[name] = {"skipped": str(e)}
+    return results
+
+def bench_ocr(crops: list[np.ndarray], repeat: int) -> dict:
+    from ocr import ocr_license_plate
+    from plate_align import align_plate
+    aligned = [align_plate(c) for c in crops]
+    return time_calls(ocr_license_plate, [(i, c, "car") for i, c in enumerate(aligned)], repeat)
+
+def bench_save_to_mongo(vehicles: list[np.ndarray], records: int) -> dict:
+    from database import save_to_mongo, get_writer, close_writer, get_collection
+    samples = []
+    for i in range(records):
+        vehicle = vehicles[i % len(vehicles)]
+        start = time.perf_counter()
+        save_to_mongo(i % (records // 4 or 1), vehicle, f"51F{i % 1000:05d}", "car", 0.9, 0.8, "bench")
+        samples.append(time.perf_counter() - start)
+    writer = get_writer()
+    start = time.perf_counter()
+    close_writer()
+    flush_time = time.perf_counter() - start
+    result = summarize(samples)
+    result.update({
+        "flush_ms": flush_time * 1000,
+        "coalesced": writer.coalesced,
+        "documents": get_collection().count_documents({}),
+    })
+    return result
+
+def bench_process_video(clips: list[str]) -> dict:
+    from video_processor import process_video
+    from stream_context import StreamContext
+    from vehicle_detection import create_tracker
+    from database import close_writer
+    results = {}
+    for path in clips:
+        cap = cv2.VideoCapture(path)
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        ctx = StreamContext(camera_id=os.path.basename(path), tracker=create_tracker())
+        reset_peak_rss()
+        start = time.perf_counter()
+        process_video(path, None, "block", ctx)
+        close_writer()
+        elapsed = time.perf_counter() - start
+        results[os.path.basename(path)] = {
+            "frames": frames,
+            "seconds": elapsed,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "tracks_closed": ctx.tracks.closed,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    return results
+
+BENCHMARKS = ["detect_vehicles", "detect_plate", "detect_plate_cached", "detect_plates_batch", "align", "ocr",
+              "save_to_mongo", "process_video"]
+
+def print_table(results: dict) -> None:
+    print(f"{'benchmark':<32}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'fps':>10}{'rss MB':>9}")
+    def row(name, r):
+        if "p50_ms" in r:
+            print(f"{name:<32}{r['count']:>7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+                  f"{r['fps']:>10.1f}{r['peak_rss_mb']:>9.0f}")
+        elif "frames" in r:
+            print(f"{name:<32}{r['frames']:>7}{'':>10}{'':>10}{'':>10}{r['fps']:>10.1f}{r['peak_rss_mb']:>9.0f}")
+        elif "skipped" in r:
+            print(f"{name:<32}  skipped: {r['skipped']}")
+    for name, r in results.items():
+        if isinstance(r, dict) and r and all(isinstance(v, dict) for v in r.values()):
+            for sub, sr in r.items():
+                row(f"{name}/{sub}", sr)
+        else:
+            row(name, r)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="CPU benchmarks for the license plate pipeline")
+    parser.add_argument("--clips", nargs="*", default=[], help="video clips for detect_vehicles and process_video")
+    parser.add_argument("--crops", default=None, help="directory of plate crops for align and OCR")
+    parser.add_argument("--frames", type=int, default=150, help="frames per clip (synthetic clip length)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--records", type=int, default=2000, help="save_to_mongo calls")
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    clips = [os.path.abspath(c) for c in args.clips]
+    crops_dir = os.path.abspath(args.crops) if args.crops else None
+    output = os.path.abspath(args.output) if args.output else None
+
+    with tempfile.TemporaryDirectory(prefix="lpr-bench-") as tmp:
+        setup_environment(os.path.join(tmp, "images"))
+        rng = np.random.default_rng(0)
+        if not clips:
+            clips = [synthetic_clip(os.path.join(tmp, "synthetic.avi"), args.frames)]
+        crops = load_crops(crops_dir, rng, 20)
+        vehicles = [synthetic_vehicle(c, rng) for c in crops]
+        frames = clip_frames(clips[0], args.frames)
+
+        runners = {
+            "detect_vehicles": lambda: bench_detect_vehicles(frames, 1),
+            "detect_plate": lambda: bench_detect_plate(vehicles, args.repeat),
+            "detect_plate_cached": lambda: bench_detect_plate_cached(vehicles, args.repeat),
+            "detect_plates_batch": lambda: bench_detect_plates_batch(vehicles, args.repeat),
+            "align": lambda: bench_align(crops, args.repeat),
+            "ocr": lambda: bench_ocr(crops, args.repeat),
+            "save_to_mongo": lambda: bench_save_to_mongo(vehicles, args.records),
+            "process_video": lambda: bench_process_video(clips),
+        }
+        results = {}
+        rss_per_benchmark = True
+        for name in args.only:
+            print(f"[bench] {name} ...", file=sys.stderr)
+            rss_per_benchmark &= reset_peak_rss()
+            results[name] = runners[name]()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "fixtures": {"clips": [os.path.basename(c) for c in clips], "crops": crops_dir or "synthetic"},
+        "peak_rss": "per benchmark" if rss_per_benchmark else "process-wide, cumulative",
+        "results": results,
+    }
+    print_table(results)
+    if not rss_per_benchmark:
+        print("[bench] rss MB is the process-wide peak so far, not per benchmark", file=sys.stderr)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[bench] Results written to {output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
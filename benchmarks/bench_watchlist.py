@@ -0,0 +1,114 @@
+"""Watchlist match latency against watchlist size.
+
+For every size a random watchlist is built and queried with a mix of exact
+hits, OCR-confused readings of listed plates (0/O, 8/B, ...) and plates
+that are not listed. Reports build time and p50/p95/p99 latency per query
+kind; ``--linear`` adds a brute-force scan with the same distance for
+comparison on the smaller sizes.
+
+    python benchmarks/bench_watchlist.py --sizes 1000 10000 50000 100000 --output watchlist.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from watchlist import WatchlistIndex, plate_distance, normalize_plate
+from plate_format import CONFUSIONS
+
+SERIES = "ABCDEFGHKLMNPSTUVXYZ"
+
+def random_plate(rng: random.Random) -> str:
+    series = rng.choice(SERIES) + (rng.choice(SERIES + "0123456789") if rng.random() < 0.3 else "")
+    return f"{rng.randint(11, 99)}{series}{rng.randint(10000, 99999)}"
+
+def confuse(plate: str, rng: random.Random) -> str:
+    positions = [i for i, ch in enumerate(plate) if ch in CONFUSIONS]
+    if not positions:
+        return plate
+    i = rng.choice(positions)
+    return plate[:i] + rng.choice(CONFUSIONS[plate[i]])[0] + plate[i + 1:]
+
+def percentiles(samples: list[float]) -> dict:
+    times = np.asarray(samples) * 1e6
+    return {
+        "count": int(times.size),
+        "p50_us": float(np.percentile(times, 50)),
+        "p95_us": float(np.percentile(times, 95)),
+        "p99_us": float(np.percentile(times, 99)),
+        "max_us": float(times.max()),
+    }
+
+def linear_match(entries: list[str], plate: str, max_cost: float) -> list:
+    plate = normalize_plate(plate)
+    return [e for e in entries if plate_distance(plate, e) <= max_cost]
+
+def bench_size(size: int, queries: int, max_cost: float, linear: bool, seed: int) -> dict:
+    rng = random.Random(seed)
+    plates = set()
+    while len(plates) < size:
+        plates.add(random_plate(rng))
+    plates = list(plates)
+
+    start = time.perf_counter()
+    index = WatchlistIndex({p: None for p in plates}, max_cost)
+    build_s = time.perf_counter() - start
+
+    kinds = {
+        "exact": [rng.choice(plates) for _ in range(queries)],
+        "confused": [confuse(rng.choice(plates), rng) for _ in range(queries)],
+        "miss": [random_plate(rng) for _ in range(queries)],
+    }
+    result = {"size": size, "build_s": build_s, "max_cost": max_cost}
+    for kind, inputs in kinds.items():
+        samples, hits = [], 0
+        for plate in inputs:
+            t = time.perf_counter()
+            found = index.match(plate, max_cost)
+            samples.append(time.perf_counter() - t)
+            hits += bool(found)
+        result[kind] = {**percentiles(samples), "hit_rate": hits / len(inputs)}
+        if linear:
+            samples = []
+            for plate in inputs[:min(len(inputs), 50)]:
+                t = time.perf_counter()
+                linear_match(plates, plate, max_cost)
+                samples.append(time.perf_counter() - t)
+            result[kind]["linear"] = percentiles(samples)
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Watchlist match latency against watchlist size")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--queries", type=int, default=2000, help="queries per kind and size")
+    parser.add_argument("--max-cost", type=float, default=1.0)
+    parser.add_argument("--linear", action="store_true", help="also time a brute-force scan (slow)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'size':>8}{'build s':>9}  {'kind':<9}{'p50 us':>9}{'p95 us':>9}{'p99 us':>9}{'hits':>7}")
+    for size in args.sizes:
+        r = bench_size(size, args.queries, args.max_cost, args.linear, args.seed)
+        results.append(r)
+        for kind in ("exact", "confused", "miss"):
+            k = r[kind]
+            print(f"{size:>8}{r['build_s']:>9.2f}  {kind:<9}{k['p50_us']:>9.1f}{k['p95_us']:>9.1f}"
+                  f"{k['p99_us']:>9.1f}{k['hit_rate']:>7.0%}")
+            if "linear" in k:
+                print(f"{'':>8}{'':>9}  {'  linear':<9}{k['linear']['p50_us']:>9.1f}{k['linear']['p95_us']:>9.1f}"
+                      f"{k['linear']['p99_us']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
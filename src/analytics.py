@@ -0,0 +1,225 @@
+import datetime
+import threading
+from collections import defaultdict
+from pymongo import ASCENDING, UpdateOne
+from plate_search import normalize_plate
+from plate_voting import INVALID_READINGS
+from image_store import start_image_expiry
+from config import STATS_COLLECTION, PLATE_STATS_COLLECTION, STATS_RETENTION, RECORD_RETENTION_DAYS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Traffic counters, pre-aggregated when records are first written:
+#   traffic_stats: one document per (granularity, bucket, camera_id, vehicle_type) with a count
+#   plate_stats:   one document per (day, camera_id, plate_key) with a count
+# so dashboard statistics read a few hundred small documents instead of raw records.
+
+GRANULARITIES = ("minute", "hour", "day")
+
+def bucket_start(ts: datetime.datetime, granularity: str) -> datetime.datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity '{granularity}', expected one of {GRANULARITIES}")
+
+def pick_granularity(start: datetime.datetime, end: datetime.datetime) -> str:
+    """Finest granularity that keeps a range under a few hundred buckets per series."""
+    span = end - start
+    if span <= datetime.timedelta(hours=6):
+        return "minute"
+    if span <= datetime.timedelta(days=14):
+        return "hour"
+    return "day"
+
+class TrafficStats:
+    """Per-minute, per-hour and per-day vehicle counts by camera and vehicle type, and daily plate counts.
+
+    ``record`` takes the records a flush inserted (not updates of records
+    already counted) and applies them as ``$inc`` upserts. Minute and
+    hour buckets expire after ``STATS_RETENTION`` through a TTL index on
+    ``expires_at``; daily buckets are kept.
+    """
+
+    def __init__(self, collection, plate_collection, retention: dict = STATS_RETENTION):
+        self.collection = collection
+        self.plate_collection = plate_collection
+        self.retention = retention
+
+    def ensure_indexes(self) -> None:
+        self.collection.create_index(
+            [("granularity", ASCENDING), ("bucket", ASCENDING), ("camera_id", ASCENDING), ("vehicle_type", ASCENDING)],
+            name="granularity_bucket_camera_type", unique=True,
+        )
+        self.collection.create_index([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)
+        self.plate_collection.create_index(
+            [("day", ASCENDING), ("camera_id", ASCENDING), ("plate_key", ASCENDING)], name="day_camera_plate",
+            unique=True,
+        )
+
+    def record(self, docs: list[dict]) -> int:
+        """Counts newly inserted plate records (their ``$set`` fields), returns the number counted."""
+        counts = defaultdict(int)
+        plates = defaultdict(lambda: [0, None, None])
+        for doc in docs:
+            ts = doc.get("timestamp")
+            if ts is None or doc.get("archived"):
+                # archived: reprocessed footage of unknown recording time
+                continue
+            camera_id, vehicle_type = doc.get("camera_id"), doc.get("vehicle_type")
+            for granularity in GRANULARITIES:
+                counts[(granularity, bucket_start(ts, granularity), camera_id, vehicle_type)] += 1
+            plate = doc.get("plate")
+            if plate not in INVALID_READINGS and plate is not None:
+                entry = plates[(bucket_start(ts, "day"), camera_id, doc.get("plate_key") or normalize_plate(plate))]
+                entry[0] += 1
+                entry[1] = plate
+                entry[2] = ts if entry[2] is None else max(entry[2], ts)
+
+        ops = []
+        for (granularity, bucket, camera_id, vehicle_type), n in counts.items():
+            update = {"$inc": {"count": n}}
+            keep = self.retention.get(granularity)
+            if keep:
+                update["$setOnInsert"] = {"expires_at": bucket + datetime.timedelta(seconds=keep)}
+            ops.append(UpdateOne(
+                {"granularity": granularity, "bucket": bucket, "camera_id": camera_id, "vehicle_type": vehicle_type},
+                update, upsert=True,
+            ))
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+
+        ops = [
+            UpdateOne({"day": day, "camera_id": camera_id, "plate_key": plate_key},
+                      {"$inc": {"count": n}, "$set": {"plate": plate}, "$max": {"last_seen": last_seen}}, upsert=True)
+            for (day, camera_id, plate_key), (n, plate, last_seen) in plates.items()
+        ]
+        if ops:
+            self.plate_collection.bulk_write(ops, ordered=False)
+        return sum(1 for doc in docs if doc.get("timestamp") is not None and not doc.get("archived"))
+
+    def counts(self, start: datetime.datetime, end: datetime.datetime, granularity: str,
+               camera_id: str = None, vehicle_type: str = None) -> list[dict]:
+        query = {"granularity": granularity, "bucket": {"$gte": bucket_start(start, granularity), "$lt": end}}
+        if camera_id:
+            query["camera_id"] = camera_id
+        if vehicle_type:
+            query["vehicle_type"] = vehicle_type
+        projection = {"_id": 0, "bucket": 1, "camera_id": 1, "vehicle_type": 1, "count": 1}
+        return list(self.collection.find(query, projection).sort("bucket", ASCENDING))
+
+    def top_plates(self, start: datetime.datetime, end: datetime.datetime, limit: int = 10,
+                   camera_id: str = None) -> list[dict]:
+        """Most frequently seen plates between the days of ``start`` and ``end``."""
+        query = {"day": {"$gte": bucket_start(start, "day"), "$lt": end}}
+        if camera_id:
+            query["camera_id"] = camera_id
+        if hasattr(self.plate_collection, "aggregate"):
+            return list(self.plate_collection.aggregate([
+                {"$match": query},
+                {"$sort": {"last_seen": 1}},
+                {"$group": {"_id": "$plate_key", "plate": {"$last": "$plate"}, "count": {"$sum": "$count"},
+                            "last_seen": {"$max": "$last_seen"}}},
+                {"$sort": {"count": -1, "last_seen": -1}},
+                {"$limit": limit},
+                {"$project": {"_id": 0, "plate": 1, "count": 1, "last_seen": 1}},
+            ]))
+        # the in-memory stand-in has no aggregation pipeline
+        totals = {}
+        for doc in self.plate_collection.find(query):
+            entry = totals.setdefault(doc["plate_key"], {"plate": doc["plate"], "count": 0, "last_seen": doc["last_seen"]})
+            entry["count"] += doc["count"]
+            if doc["last_seen"] > entry["last_seen"]:
+                entry["plate"], entry["last_seen"] = doc["plate"], doc["last_seen"]
+        return sorted(totals.values(), key=lambda e: (e["count"], e["last_seen"]), reverse=True)[:limit]
+
+    def summary(self, start: datetime.datetime, end: datetime.datetime, granularity: str = None,
+                camera_id: str = None, vehicle_type: str = None, top: int = 10) -> dict:
+        granularity = granularity or pick_granularity(start, end)
+        series = defaultdict(lambda: defaultdict(int))
+        totals = defaultdict(int)
+        for doc in self.counts(start, end, granularity, camera_id, vehicle_type):
+            series[doc["bucket"]][doc["vehicle_type"]] += doc["count"]
+            totals[doc["vehicle_type"]] += doc["count"]
+        return {
+            "granularity": granularity,
+            "from": start,
+            "to": end,
+            "total": sum(totals.values()),
+            "by_vehicle_type": dict(totals),
+            "series": [{"bucket": bucket, "counts": dict(counts)} for bucket, counts in sorted(series.items())],
+            "top_plates": self.top_plates(start, end, top, camera_id) if top else [],
+        }
+
+    def clear(self) -> None:
+        self.collection.delete_many({})
+        self.plate_collection.delete_many({})
+
+    def rebuild(self, raw_collection, batch_size: int = 5000) -> int:
+        """Recounts every raw record, for databases written before the rollups existed."""
+        self.clear()
+        projection = {"timestamp": 1, "camera_id": 1, "vehicle_type": 1, "plate": 1, "plate_key": 1, "archived": 1}
+        batch, counted = [], 0
+        for doc in raw_collection.find({}, projection):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                counted += self.record(batch)
+                batch = []
+        if batch:
+            counted += self.record(batch)
+        logger.info(f"[Stats] Rebuilt rollups from {counted} records")
+        return counted
+
+def ensure_retention(collection, days: float = RECORD_RETENTION_DAYS) -> None:
+    """Deletes raw plate records ``days`` after they were written, and their images; None keeps them forever.
+
+    Records expire through a TTL on the ``written_at`` index. That is the
+    flush time in UTC, so reprocessed recordings are kept as long as live
+    ones whatever their ``timestamp``. Images go once no record refers to
+    them any more, see ``start_image_expiry``.
+    """
+    indexes = collection.index_information()
+    if "timestamp_ttl" in indexes:
+        # the former TTL, on the (local) time the footage was filmed
+        collection.drop_index("timestamp_ttl")
+        logger.info("[Stats] Dropped the TTL index on timestamp")
+    seconds = int(days * 86400) if days else None
+    if "written_at" in indexes and indexes["written_at"].get("expireAfterSeconds") != seconds:
+        # the since index with another retention, or none: rebuild it with this one
+        collection.drop_index("written_at")
+        indexes.pop("written_at")
+    if "written_at" not in indexes:
+        options = {"expireAfterSeconds": seconds} if seconds else {}
+        collection.create_index([("written_at", ASCENDING)], name="written_at", **options)
+    if not days:
+        return
+    start_image_expiry(days, collection)
+    logger.info(f"[Stats] Raw records and their images expire after {days} days")
+
+_stats = None
+_stats_lock = threading.Lock()
+
+def get_traffic_stats(db=None) -> TrafficStats:
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            if db is None:
+                from database import get_client
+                from config import DB_NAME
+                db = get_client()[DB_NAME]
+            _stats = TrafficStats(db[STATS_COLLECTION], db[PLATE_STATS_COLLECTION])
+            _stats.ensure_indexes()
+        return _stats
+
+if __name__ == "__main__":
+    import argparse
+    from database import get_collection
+    parser = argparse.ArgumentParser(description="Traffic statistics rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recount the rollups from the raw records")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.rebuild:
+        get_traffic_stats().rebuild(get_collection())
@@ -0,0 +1,355 @@
+import argparse
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import cv2
+from config import BATCH_PROCESSES, BATCH_SEGMENT_SECONDS, BATCH_OUTPUT_DIR, BATCH_VIDEO_EXTENSIONS, FFPROBE_BIN
+from stream_context import StreamContext
+from video_processor import process_video
+from vehicle_detection import create_tracker
+from database import close_writer, get_client
+from models import warmup
+from main import setup_logging, init_database
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------- inputs
+
+def load_inputs(path: str) -> list[dict]:
+    """Videos under a directory, or listed in a manifest.
+
+    A manifest is a text file with one path per line, or a JSON list of
+    paths or of ``{"path", "camera_id", "start_time", "roi"}`` objects, where
+    ``start_time`` (ISO 8601) is the wall-clock time the recording starts
+    and ``roi`` the camera's ROI polygon.
+    Relative paths are resolved against the manifest's directory. Without a
+    ``camera_id`` the camera is named after the file's directory, see
+    ``camera_from_path``.
+    """
+    if os.path.isdir(path):
+        entries = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(BATCH_VIDEO_EXTENSIONS):
+                    full = os.path.join(root, name)
+                    entries.append({"path": full, "name": os.path.relpath(full, path)})
+        return [_complete(e, path) for e in entries]
+
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            items = json.load(f)
+        else:
+            items = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    entries = []
+    for i, item in enumerate(items):
+        entry = {"path": item} if isinstance(item, str) else dict(item)
+        if "path" not in entry:
+            raise ValueError(f"Manifest entry #{i} in {path} has no 'path'")
+        entry.setdefault("name", os.path.normpath(entry["path"]))
+        entry["path"] = os.path.join(base, entry["path"])
+        entries.append(_complete(entry, base))
+    return entries
+
+def camera_from_path(path: str, root: str) -> str:
+    """Camera of a recording: ``<root>/<camera>/.../<file>``, or the file's own directory outside ``root``.
+
+    A file directly in ``root`` is a camera of its own, named after the file.
+    """
+    path, root = os.path.abspath(path), os.path.abspath(root)
+    rel = os.path.relpath(os.path.dirname(path), root)
+    if rel == os.curdir:
+        camera = os.path.splitext(os.path.basename(path))[0]
+    elif rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        camera = os.path.basename(os.path.dirname(path))
+    else:
+        camera = rel.split(os.sep)[0]
+    if camera in ("", os.curdir, os.pardir):
+        raise ValueError(f"Cannot name the camera of {path}, give it a camera_id")
+    return camera
+
+def _complete(entry: dict, root: str) -> dict:
+    entry["path"] = os.path.abspath(entry["path"])
+    if not entry.get("camera_id"):
+        entry["camera_id"] = camera_from_path(entry["path"], root)
+    return entry
+
+# ---------------------------------------------------------------- segments
+
+def stream_start_time(path: str) -> float:
+    """``start_time`` of the video stream, 0 when ffprobe does not report one."""
+    proc = subprocess.run(
+        [FFPROBE_BIN, "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=start_time",
+         "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True,
+    )
+    value = proc.stdout.strip().split(",")[0] if proc.stdout.strip() else ""
+    return float(value) if value not in ("", "N/A") else 0.0
+
+def keyframe_times(path: str) -> list[float]:
+    """Keyframe times from the packet flags without decoding, relative to the stream's start.
+
+    ffprobe reports absolute ``pts_time`` while OpenCV seeks and reports
+    positions from the stream's ``start_time``, which is not 0 for most
+    MPEG-TS and NVR recordings.
+    """
+    offset = stream_start_time(path)
+    proc = subprocess.run(
+        [FFPROBE_BIN, "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+         "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True,
+    )
+    times = []
+    for line in proc.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            times.append(max(float(pts) - offset, 0.0))
+    return sorted(times)
+
+def plan_segments(keyframes: list[float], segment_seconds: float) -> list[tuple]:
+    """``(start, end)`` seconds, each segment starting at the first keyframe after ``segment_seconds``."""
+    if not segment_seconds or not keyframes:
+        return [(0.0, None)]
+    bounds = [0.0]
+    for t in keyframes:
+        if t - bounds[-1] >= segment_seconds:
+            bounds.append(t)
+    return list(zip(bounds, bounds[1:] + [None]))
+
+def segment_id(entry: dict, start: float) -> str:
+    return f"{entry['name']}@{start:.3f}"
+
+# ---------------------------------------------------------------- checkpoint
+
+class Checkpoint:
+    """Batch progress in a JSON file, rewritten atomically after every segment.
+
+    Holds the segment plan of every file (reused while the file's size and
+    mtime are unchanged, so a resumed run does not probe again) and the
+    status of every segment. Only the parent process writes it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = {"files": {}, "segments": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def plan(self, entry: dict) -> list:
+        stat = os.stat(entry["path"])
+        known = self.data["files"].get(entry["path"])
+        if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+            return [tuple(s) for s in known["segments"]]
+        return None
+
+    def set_plan(self, entry: dict, segments: list[tuple]) -> None:
+        stat = os.stat(entry["path"])
+        self.data["files"][entry["path"]] = {"size": stat.st_size, "mtime": stat.st_mtime, "segments": segments}
+
+    def is_done(self, seg_id: str) -> bool:
+        return self.data["segments"].get(seg_id, {}).get("status") == "done"
+
+    def mark(self, seg_id: str, status: str, **info) -> None:
+        self.data["segments"][seg_id] = {"status": status, **info}
+
+# ---------------------------------------------------------------- workers
+
+def _init_worker(threads: int) -> None:
+    setup_logging()
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    # one model set per worker, loaded before its first segment
+    warmup()
+
+def run_segment(segment: dict) -> dict:
+    """Processes one segment and writes its records to ``segment["part"]``; runs in a worker process."""
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(segment["path"])
+    if not cap.isOpened():
+        raise IOError(f"Cannot open {segment['path']}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+
+    recorded_at = datetime.datetime.fromisoformat(segment["start_time"]) if segment.get("start_time") else None
+    lock = threading.Lock()
+    count = 0
+    tmp = segment["part"] + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        def on_result(result: dict) -> None:
+            nonlocal count
+            video_time = segment["start"] + (result.get("frame_idx") or 0) / fps
+            record = {
+                "segment": segment["id"],
+                "source": segment["path"],
+                "camera_id": result["camera_id"],
+                "track_id": result["track_id"],
+                "plate": result["plate_text"],
+                "vehicle_type": result["vehicle_type"],
+                "vehicle_confidence": result["vehicle_conf"],
+                "ocr_confidence": result["ocr_conf"],
+                "video_time": round(video_time, 3),
+            }
+            if recorded_at is not None:
+                record["recorded_at"] = recorded_at + datetime.timedelta(seconds=video_time)
+            extra = result.get("extra") or {}
+            for key in ("ocr_attempts", "plate_consensus"):
+                if key in extra:
+                    record[key] = extra[key]
+            with lock:
+                f.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+                count += 1
+
+        ctx = StreamContext(camera_id=segment["camera_id"], tracker=create_tracker(int(round(fps)) or 30),
+                            segment=segment["id"], on_result=on_result, roi=segment.get("roi"),
+                            recorded_at=recorded_at)
+        errors = process_video(segment["path"], None, "block", ctx, segment["start"], segment["end"])
+    # the segment only counts as done once its records are in the database
+    unwritten = close_writer()
+    if unwritten:
+        raise IOError(f"{unwritten} records of {segment['id']} could not be written to the database")
+    if errors is None:
+        raise IOError(f"Cannot open {segment['path']}")
+    # frames that failed detection or OCR left no records: retry the segment rather than mark it done
+    failed = {stage: n for stage, n in errors.items() if n}
+    if failed:
+        raise RuntimeError(f"{segment['id']} had errors in " + ", ".join(f"{stage} ({n})" for stage, n in failed.items()))
+    os.replace(tmp, segment["part"])
+    return {"records": count, "seconds": round(time.perf_counter() - started, 2)}
+
+# ---------------------------------------------------------------- driver
+
+def plan_batch(entries: list[dict], checkpoint: Checkpoint, segment_seconds: float, parts_dir: str) -> list[dict]:
+    def probe(entry: dict) -> tuple[dict, list]:
+        planned = checkpoint.plan(entry)
+        if planned is not None:
+            return entry, planned
+        try:
+            keyframes = keyframe_times(entry["path"]) if segment_seconds else []
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.warning(f"[Batch] No keyframes for {entry['name']} ({e}), processing it whole")
+            keyframes = []
+        return entry, plan_segments(keyframes, segment_seconds)
+
+    segments = []
+    # ffprobe only reads packet headers, a few in parallel keep the disks busy
+    with ThreadPoolExecutor(4) as pool:
+        for entry, planned in pool.map(probe, entries):
+            checkpoint.set_plan(entry, planned)
+            for start, end in planned:
+                seg_id = segment_id(entry, start)
+                segments.append({
+                    "id": seg_id,
+                    "path": entry["path"],
+                    "name": entry["name"],
+                    "camera_id": entry["camera_id"],
+                    "start_time": entry.get("start_time"),
+                    "roi": entry.get("roi"),
+                    "start": start,
+                    "end": end,
+                    "part": os.path.join(parts_dir, hashlib.sha1(seg_id.encode()).hexdigest()[:16] + ".jsonl"),
+                })
+    checkpoint.save()
+    return segments
+
+def merge_parts(segments: list[dict], checkpoint: Checkpoint, output_path: str) -> int:
+    """Concatenates the records of every finished segment, in file and time order, into ``output_path``."""
+    lines = 0
+    tmp = output_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        for segment in sorted(segments, key=lambda s: (s["name"], s["start"])):
+            if not checkpoint.is_done(segment["id"]) or not os.path.exists(segment["part"]):
+                continue
+            with open(segment["part"], encoding="utf-8") as f:
+                for line in f:
+                    out.write(line)
+                    lines += 1
+    os.replace(tmp, output_path)
+    return lines
+
+def run_batch(entries: list[dict], output_dir: str = BATCH_OUTPUT_DIR, processes: int = BATCH_PROCESSES,
+              segment_seconds: float = BATCH_SEGMENT_SECONDS, checkpoint_path: str = None, threads: int = None) -> dict:
+    parts_dir = os.path.join(output_dir, "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(output_dir, "checkpoint.json"))
+    segments = plan_batch(entries, checkpoint, segment_seconds, parts_dir)
+    pending = [s for s in segments if not checkpoint.is_done(s["id"])]
+
+    cpus = os.cpu_count() or 1
+    processes = max(1, min(processes or max(1, cpus // 4), len(pending) or 1))
+    threads = threads or max(1, cpus // processes)
+    logger.info(f"[Batch] {len(entries)} files, {len(segments)} segments, {len(segments) - len(pending)} already done; "
+                f"{processes} workers x {threads} threads")
+
+    done, failed = len(segments) - len(pending), 0
+    if pending:
+        mp = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(processes, mp_context=mp, initializer=_init_worker, initargs=(threads,)) as pool:
+            futures = {pool.submit(run_segment, s): s for s in pending}
+            for future in as_completed(futures):
+                segment = futures[future]
+                try:
+                    summary = future.result()
+                    checkpoint.mark(segment["id"], "done", **summary)
+                    done += 1
+                    logger.info(f"[Batch] {done}/{len(segments)} {segment['id']}: "
+                                f"{summary['records']} records in {summary['seconds']}s")
+                except Exception as e:
+                    # a crashed worker fails its segment; the next run picks it up again
+                    checkpoint.mark(segment["id"], "failed", error=f"{type(e).__name__}: {e}")
+                    failed += 1
+                    logger.error(f"[Batch] Lỗi segment {segment['id']}: {e}")
+                checkpoint.save()
+
+    records = merge_parts(segments, checkpoint, os.path.join(output_dir, "plates.jsonl"))
+    files_done = sum(
+        all(checkpoint.is_done(s["id"]) for s in segments if s["path"] == entry["path"]) for entry in entries
+    )
+    logger.info(f"[Batch] {files_done}/{len(entries)} files complete, {failed} segments failed, "
+                f"{records} records in {os.path.join(output_dir, 'plates.jsonl')}")
+    return {"files": len(entries), "files_done": files_done, "segments": len(segments), "failed": failed,
+            "records": records}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reprocess recorded video archives on a pool of worker processes")
+    parser.add_argument("input", help="directory of recordings, or a manifest (.txt or .json)")
+    parser.add_argument("--processes", type=int, default=BATCH_PROCESSES, help="worker processes")
+    parser.add_argument("--threads", type=int, default=None, help="inference threads per worker")
+    parser.add_argument("--segment-seconds", type=float, default=BATCH_SEGMENT_SECONDS,
+                        help="split recordings at keyframes into segments of about this length, 0 disables")
+    parser.add_argument("--output-dir", default=BATCH_OUTPUT_DIR, help="checkpoint, segment parts and plates.jsonl")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: <output-dir>/checkpoint.json)")
+    args = parser.parse_args()
+
+    entries = load_inputs(args.input)
+    if not entries:
+        logger.error(f"[Batch] No videos found in {args.input}")
+        return 1
+    init_database()
+    try:
+        summary = run_batch(entries, args.output_dir, args.processes, args.segment_seconds, args.checkpoint,
+                            args.threads)
+    finally:
+        get_client().close()
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    setup_logging()
+    raise SystemExit(main())
@@ -1,18 +1,150 @@
-from ultralytics import YOLO
+import os
 
 # Model paths
 MODEL_VEHICLE_PATH = "../models/best.pt"
 MODEL_LPR_PATH = "../models/yolov8sLPR.pt"
 MODEL_OCR_PATH = "../models/ocr.pt"
 
+# Inference backends (models.py): "torch" | "onnx" | "openvino", exported from the .pt files on first use
+MODEL_BACKENDS = {"vehicle": "torch", "lpr": "torch", "ocr": "torch"}
+MODEL_INT8 = False              # ONNX: dynamic quantization, OpenVINO: NNCF calibration on MODEL_INT8_DATA
+MODEL_INT8_DATA = None          # dataset yaml for OpenVINO INT8 calibration
+MODEL_DEVICE = "cpu"
+MODEL_IMGSZ = {"vehicle": 640, "lpr": 640, "ocr": 640}
+INFERENCE_THREADS = None        # intra-op threads per model, None = library default
+MODEL_WARMUP_RUNS = 2
+
 # Vehicle classes
 VEHICLE_CLASSES = ["car", "motorcycle", "truck", "person", "bus"]
 
+# Per-frame box filtering
+DETECTION_MARGIN = 10           # pixels, boxes touching the frame border are cut off vehicles
+DETECTION_ROI = None            # default ROI polygon [[x, y], ...] (pixels or 0-1 fractions); cameras.json "roi" per camera
+RIDER_IOU_THRESHOLD = 0.5       # a person overlapping a motorcycle this much is its rider
+
 MONGO_URI = 'mongodb://localhost:27017/'
 DB_NAME = 'vehicle_db'
 COLLECTION_NAME = 'vehicle_plates'
+# MONGO_URI = 'memory://' uses the in-process stand-in (memory_db.py)
+MONGO_POOL_SIZE = 20
+MONGO_BATCH_SIZE = 200          # flush when this many upserts are pending
+MONGO_FLUSH_INTERVAL = 1.0      # seconds
+MONGO_MAX_BUFFER = 20000
+
+# Vehicle snapshots are kept outside the plate documents
+IMAGE_STORE = "disk"            # "disk" | "gridfs"
+IMAGE_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "images")
+IMAGE_JPEG_QUALITY = 90
+THUMBNAIL_SIZE = (320, 240)
+THUMBNAIL_JPEG_QUALITY = 75
+
+# Plate search API
+SEARCH_PAGE_SIZE = 100
+SEARCH_MAX_PAGE_SIZE = 500
+SINCE_SETTLE_SECONDS = 2.0      # ?since= only returns records flushed at least this long ago, longer than any bulk write
+
+# API server (app.py): waitress when installed, otherwise the threaded Werkzeug server
+API_HOST = "127.0.0.1"
+API_PORT = 5000
+API_THREADS = 16
+API_CACHE_SIZE = 256            # cached /api/plates responses
+API_CACHE_TTL = 2.0             # seconds, short enough for a live dashboard
+API_CACHE_MAX_BODY = 256 * 1024 # bytes; larger /api/plates bodies are streamed without being cached
+API_GZIP_LEVEL = 6
+
+# Traffic statistics (/api/stats): counters rolled up when records are first written
+STATS_ENABLED = True
+STATS_COLLECTION = "traffic_stats"
+PLATE_STATS_COLLECTION = "plate_stats"
+STATS_RETENTION = {"minute": 7 * 86400, "hour": 400 * 86400, "day": None}   # seconds, None keeps forever
+RECORD_RETENTION_DAYS = None    # delete raw plate records (and their images) this many days after they were written, None keeps them
+IMAGE_EXPIRY_INTERVAL = 3600    # seconds between sweeps of images older than RECORD_RETENTION_DAYS
+
+# Live plate feed (/api/plates/stream)
+PLATE_FEED_POLL_INTERVAL = 1.0  # seconds, used when change streams are not available
+PLATE_FEED_LOOKBACK = 5.0       # seconds, covers records stamped before the bulk writer flushed them
+PLATE_FEED_QUEUE_SIZE = 256     # events buffered per client
+PLATE_FEED_MAX_SUBSCRIBERS = 8  # open live streams; each holds an API thread, keep well below API_THREADS
+SSE_KEEPALIVE = 15              # seconds between keep-alive comments
+
+# Pipeline
+PIPELINE_QUEUE_SIZE = 32
+# "block" | "drop_oldest" | "drop_newest"; None = block for files, drop_oldest for live streams
+PIPELINE_DROP_POLICY = None
+OCR_WORKERS = 2
+PIPELINE_STATS_INTERVAL = 10
+# Vehicles from one or more frames are gathered into a single LPR/OCR batch
+OCR_BATCH_SIZE = 16
+OCR_BATCH_WINDOW = 0.05
+BATCH_IMGSZ = MODEL_IMGSZ["lpr"]
+
+# Video I/O: decoded frames live in a pool of reused buffers
+FRAME_POOL_SIZE = 96            # covers the frames, OCR and encode queues plus frames held by OCR jobs
+FRAME_POOL_TIMEOUT = 0.5        # seconds to wait for a free buffer before allocating a one-off frame
+# Annotated output video (process_video(output_path=...)), encoded on its own stage
+OUTPUT_SCALE = 1.0              # 0.5 writes at half resolution
+OUTPUT_FRAME_STRIDE = 1         # write every n-th frame
+OUTPUT_FOURCC = "XVID"
+
+# Plate crop cache: near-identical plate crops reuse the earlier OCR reading
+PLATE_CACHE_SIZE = 512          # entries, 0 disables the cache
+PLATE_CACHE_TTL = 30.0          # seconds
+PLATE_CACHE_HASH_SIZE = (16, 8) # dHash grid (w, h), 128 bits
+PLATE_CACHE_MAX_DISTANCE = 8    # Hamming distance in bits that still counts as the same crop
+PLATE_CACHE_MAX_SCALE_CHANGE = 0.1  # a crop that grew or shrank more than this is read again
+PLATE_CACHE_CROSS_TRACK = False # also reuse readings of other tracks (re-issued ids); plates one character apart hash alike
+
+# Motion gate: skip the vehicle detector on static scenes
+MOTION_GATE_ENABLED = True
+MOTION_METHOD = "diff"          # "diff" (frame differencing) | "mog2" (background subtraction)
+MOTION_DOWNSCALE_WIDTH = 160
+MOTION_PIXEL_THRESHOLD = 25     # gray level change counted as motion
+MOTION_MIN_AREA = 0.002         # share of changed pixels that counts as an active scene
+MOTION_IDLE_FRAMES = 10         # quiet frames before the detection stride doubles
+MOTION_MAX_STRIDE = 25          # detect at least once per this many frames
+
+# Watchlist: alert when a recognized plate is on the hotlist
+WATCHLIST_PATH = None           # CSV of plate[,label] lines, reloaded when it changes; None disables matching
+WATCHLIST_MAX_COST = 1.0        # weighted edit distance for fuzzy hits, a confused pair (0/O, 8/B, ...) costs 0.5
+WATCHLIST_RELOAD_INTERVAL = 5.0 # seconds between checks of the file
+WATCHLIST_ALERT_COOLDOWN = 60.0 # seconds before the same track raises the same entry again
+WATCHLIST_QUEUE_SIZE = 1024
+
+# Plate alignment: "contour" | "min_area_rect" | "hough" | "paddle"
+PLATE_ALIGN_METHOD = "contour"
+PLATE_ALIGN_FALLBACK = ()       # e.g. ("paddle",), PaddleOCR is only loaded when used
+PLATE_ALIGN_MIN_AREA = 0.3      # quad must cover this share of the plate crop
+
+# Per-track plate voting
+OCR_MAX_ATTEMPTS = 8            # hard cap of OCR calls per track
+OCR_MAX_READINGS = 5            # best readings kept for voting
+OCR_MIN_READINGS = 2
+OCR_RETRY_INTERVAL = 3          # frames between two OCR attempts of a track
+PLATE_CONSENSUS_THRESHOLD = 0.75
+PLATE_RETRY_QUALITY_RATIO = 0.8 # retry only on frames close to the best seen so far
+# Invalid readings are fixed by swapping confused characters (0/O, 8/B, 1/I, 5/S, ...)
+PLATE_CORRECTION_MAX_COST = 1.5
+PLATE_CORRECTION_MAX_EDITS = 2
+
+# Track state, per stream
+TRACK_MAX_ENTRIES = 2000
+TRACK_TTL = 300                 # seconds since the last sighting
+TRACK_MAX_MISSING_FRAMES = 50
+# "on_close": one final record per vehicle when its track closes
+# "on_change": upsert whenever the voted plate changes
+PERSIST_MODE = "on_close"
+
+# Metrics: Prometheus text format on http://<host>:METRICS_PORT/metrics, None disables the sidecar.
+# With stream_runner --processes N, worker i listens on METRICS_PORT + i + 1.
+METRICS_PORT = 9108
+
+# Multi-camera runner (stream_runner.py)
+CAMERAS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cameras.json")
+TRACKER_CONFIG = "bytetrack.yaml"
 
-# Global variables
-vehicle_plates = {}
-logged_track_ids = set()
-track_classes = {}
\ No newline at end of file
+# Offline batch mode (batch.py)
+BATCH_PROCESSES = None          # worker processes, None = one per 4 CPU cores
+BATCH_SEGMENT_SECONDS = 600     # split longer recordings at the first keyframe after every 10 min, 0 disables
+BATCH_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output", "batch")
+BATCH_VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".ts", ".flv")
+FFPROBE_BIN = "ffprobe"
@@ -1,13 +1,37 @@
-import cv2
-import base64
+import atexit
 import datetime
-from pymongo import MongoClient
-from config import MONGO_URI, DB_NAME, COLLECTION_NAME
+import threading
+from pymongo import MongoClient, UpdateOne
+from config import (
+    MONGO_URI, DB_NAME, COLLECTION_NAME, MONGO_POOL_SIZE, MONGO_BATCH_SIZE, MONGO_FLUSH_INTERVAL, MONGO_MAX_BUFFER,
+    STATS_ENABLED,
+)
+from memory_db import InMemoryClient
+from image_store import get_image_store
+from plate_search import normalize_plate, utc_now
+from metrics import STAGE_SECONDS
 import logging
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> MongoClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            if MONGO_URI.startswith("memory://"):
+                _client = InMemoryClient()
+                logger.info("[MongoDB] Using in-memory stand-in database")
+            else:
+                _client = MongoClient(MONGO_URI, maxPoolSize=MONGO_POOL_SIZE)
+        return _client
+
+def get_collection(name: str = COLLECTION_NAME):
+    return get_client()[DB_NAME][name]
+
 def create_collection_if_not_exist(db, collection_name: str) -> None:
     if collection_name not in db.list_collection_names():
         db.create_collection(collection_name)
@@ -15,28 +39,163 @@ def create_collection_if_not_exist(db, collection_name: str) -> None:
     else:
         logger.info(f"[MongoDB] Collection '{collection_name}' already exists")
 
-def save_to_mongo(track_id: int, vehicle_img: np.ndarray, plate_text: str, vehicle_type: str, vehicle_conf: float, ocr_conf: float) -> None:
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    collection = db[COLLECTION_NAME]
-    
-    _, buffer = cv2.imencode('.jpg', vehicle_img)
-    img_base64 = base64.b64encode(buffer.tobytes()).decode('utf-8')
+class BulkWriter:
+    """Buffers upserts and writes them with ``bulk_write``.
+
+    Upserts for the same key are coalesced while they wait in the buffer.
+    A background thread flushes every ``flush_interval`` seconds or as soon
+    as ``batch_size`` keys are pending; ``close`` drains the buffer and
+    returns how many upserts could not be written. Every record is stamped
+    with the time (UTC) of the flush that writes it in ``written_field``,
+    the ``since`` cursor of the search API and what retention expires on.
+    ``on_inserted`` receives the fields of the records a flush created.
+    """
+
+    def __init__(self, collection, batch_size: int = MONGO_BATCH_SIZE, flush_interval: float = MONGO_FLUSH_INTERVAL,
+                 max_buffer: int = MONGO_MAX_BUFFER, on_inserted=None, written_field: str = "written_at"):
+        self.collection = collection
+        self.written_field = written_field
+        self.on_inserted = on_inserted
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.written = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._buffer = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def start(self) -> "BulkWriter":
+        self._thread = threading.Thread(target=self._run, name="mongo-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def add(self, key: tuple, filter_query: dict, update: dict) -> None:
+        with self._lock:
+            pending = self._buffer.get(key)
+            if pending is None:
+                if len(self._buffer) >= self.max_buffer:
+                    self._buffer.pop(next(iter(self._buffer)))
+                    self.dropped += 1
+                    logger.warning("[MongoDB] Write buffer full, dropped oldest pending upsert")
+                self._buffer[key] = (filter_query, update)
+            else:
+                merged = {op: dict(fields) for op, fields in pending[1].items()}
+                for op, fields in update.items():
+                    merged.setdefault(op, {}).update(fields)
+                self._buffer[key] = (pending[0], merged)
+                self.coalesced += 1
+            size = len(self._buffer)
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, {}
+            if not batch:
+                return 0
+
+            written_at = {self.written_field: utc_now()} if self.written_field else {}
+            ops = [UpdateOne(f, {**u, "$set": {**u.get("$set", {}), **written_at}}, upsert=True)
+                   for f, u in batch.values()]
+            try:
+                with STAGE_SECONDS.time(stage="mongo_flush"):
+                    result = self.collection.bulk_write(ops, ordered=False)
+            except Exception as e:
+                logger.error(f"[MongoDB] Lỗi khi ghi {len(ops)} bản ghi: {e}")
+                with self._lock:
+                    # keep newer updates that arrived meanwhile
+                    for key, pending in batch.items():
+                        self._buffer.setdefault(key, pending)
+                return 0
 
-    filter_query = {"track_id": track_id, "vehicle_type": vehicle_type}
+            self.written += len(ops)
+            if self.on_inserted is not None and result.upserted_ids:
+                pending = list(batch.values())
+                inserted = [{**pending[i][0], **pending[i][1].get("$set", {})} for i in result.upserted_ids]
+                try:
+                    self.on_inserted(inserted)
+                except Exception as e:
+                    logger.error(f"[MongoDB] Lỗi khi cập nhật thống kê: {e}")
+            logger.info(
+                f"[MongoDB] Flushed {len(ops)} upserts "
+                f"(inserted {result.upserted_count}, updated {result.matched_count})"
+            )
+            return len(ops)
+
+    def _run(self) -> None:
+        while not self._closed.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self) -> int:
+        self._closed.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        unwritten = self.pending()
+        if unwritten:
+            logger.error(f"[MongoDB] {unwritten} bản ghi chưa được ghi khi đóng")
+        return unwritten
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer() -> BulkWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            on_inserted = None
+            if STATS_ENABLED:
+                from analytics import get_traffic_stats
+                on_inserted = get_traffic_stats(get_client()[DB_NAME]).record
+            _writer = BulkWriter(get_collection(), on_inserted=on_inserted).start()
+        return _writer
+
+def close_writer() -> int:
+    """Drains and stops the shared writer, returns the number of upserts left unwritten."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    return writer.close() if writer is not None else 0
+
+atexit.register(close_writer)
+
+def save_to_mongo(track_id: int, vehicle_img: np.ndarray, plate_text: str, vehicle_type: str, vehicle_conf: float, ocr_conf: float,
+                  camera_id: str = None, extra: dict = None, segment: str = None,
+                  timestamp: datetime.datetime = None) -> None:
+    image_id = get_image_store().put(vehicle_img) if vehicle_img is not None and vehicle_img.size > 0 else None
+
+    filter_query = {"camera_id": camera_id, "track_id": track_id, "vehicle_type": vehicle_type}
+    if segment is not None:
+        # batch mode: every segment of a recording restarts the track ids
+        filter_query["segment"] = segment
     update_data = {
         "$set": {
             "plate": plate_text,
+            "plate_key": normalize_plate(plate_text),
             "vehicle_type": vehicle_type,
             "vehicle_confidence": vehicle_conf,
             "ocr_confidence": ocr_conf,
-            "image_base64": img_base64,
-            "timestamp": datetime.datetime.now()
+            "image_id": image_id,
+            "timestamp": timestamp or datetime.datetime.now()
         }
     }
+    if segment is not None and timestamp is None:
+        # reprocessed footage of unknown recording time: stamped when processed, not live traffic
+        update_data["$set"]["archived"] = True
+    if extra:
+        update_data["$set"].update(extra)
 
-    result = collection.update_one(filter_query, update_data, upsert=True)
-    if result.matched_count > 0:
-        logger.info(f"[MongoDB] Updated record for track_id {track_id} with plate {plate_text}")
-    else:
-        logger.info(f"[MongoDB] Inserted new record for track_id {track_id} with plate {plate_text}")
\ No newline at end of file
+    get_writer().add((camera_id, segment, track_id, vehicle_type), filter_query, update_data)
@@ -0,0 +1,124 @@
+import threading
+from typing import NamedTuple
+import cv2
+import numpy as np
+from config import DETECTION_MARGIN, DETECTION_ROI, RIDER_IOU_THRESHOLD
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Detection(NamedTuple):
+    box: tuple          # (x1, y1, x2, y2) in whole pixels
+    conf: float
+    cls: int
+    name: str
+    track_id: int       # -1 when the box is not tracked
+
+class DetectionBatch:
+    """Boxes of one frame as parallel numpy arrays.
+
+    Built from an ultralytics ``Boxes`` with a single device-to-host copy;
+    filters select rows with boolean masks, and iterating yields plain
+    ``Detection`` tuples for the per-vehicle stages.
+    """
+
+    __slots__ = ("xyxy", "conf", "cls", "track_id", "names")
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, track_id: np.ndarray, names: dict):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.track_id = track_id
+        self.names = names
+
+    @classmethod
+    def from_boxes(cls, boxes: object, names: dict) -> "DetectionBatch":
+        data = boxes.data.cpu().numpy() if boxes is not None else np.zeros((0, 6), dtype=np.float32)
+        # rows are x1, y1, x2, y2, [track id,] conf, cls
+        if data.shape[1] == 7:
+            track_id = data[:, 4].astype(np.int64)
+        else:
+            track_id = np.full(len(data), -1, dtype=np.int64)
+        return cls(data[:, :4], data[:, -2], data[:, -1].astype(np.int64), track_id, names)
+
+    def __len__(self) -> int:
+        return len(self.xyxy)
+
+    def __iter__(self):
+        boxes = self.xyxy.astype(int).tolist()
+        for box, conf, cls_id, track_id in zip(boxes, self.conf.tolist(), self.cls.tolist(), self.track_id.tolist()):
+            yield Detection(tuple(box), conf, cls_id, self.names[cls_id], track_id)
+
+    def select(self, mask: np.ndarray) -> "DetectionBatch":
+        return DetectionBatch(self.xyxy[mask], self.conf[mask], self.cls[mask], self.track_id[mask], self.names)
+
+    def class_mask(self, name: str) -> np.ndarray:
+        ids = [cls_id for cls_id, cls_name in self.names.items() if cls_name == name]
+        return np.isin(self.cls, ids)
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU of every box in ``a`` (N, 4) against every box in ``b`` (M, 4), as an (N, M) array."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter, dtype=np.float64), where=union > 0)
+
+def rider_mask(batch: DetectionBatch, iou_thresh: float = RIDER_IOU_THRESHOLD) -> np.ndarray:
+    """Persons overlapping a motorcycle by more than ``iou_thresh``: the rider, not a pedestrian."""
+    riders = np.zeros(len(batch), dtype=bool)
+    persons = batch.class_mask("person")
+    motorcycles = batch.class_mask("motorcycle")
+    if persons.any() and motorcycles.any():
+        riders[persons] = (iou_matrix(batch.xyxy[persons], batch.xyxy[motorcycles]) > iou_thresh).any(axis=1)
+    return riders
+
+class RoiFilter:
+    """Region of interest of one camera.
+
+    Keeps boxes at least ``margin`` pixels inside the frame and, with a
+    ``polygon``, whose bottom centre (where the vehicle meets the road)
+    falls inside it. Polygon points are pixels, or fractions of the frame
+    size when every coordinate is at most 1. The polygon is rasterized
+    once per frame size, so the test is a mask lookup per box.
+    """
+
+    def __init__(self, polygon: list = DETECTION_ROI, margin: int = DETECTION_MARGIN):
+        self.polygon = np.asarray(polygon, dtype=np.float64) if polygon else None
+        if self.polygon is not None and (self.polygon.ndim != 2 or self.polygon.shape[1] != 2 or len(self.polygon) < 3):
+            raise ValueError(f"ROI polygon needs at least 3 [x, y] points, got {polygon}")
+        self.margin = margin
+        self._masks = {}
+        self._lock = threading.Lock()
+
+    def _mask(self, w: int, h: int) -> np.ndarray:
+        mask = self._masks.get((w, h))
+        if mask is None:
+            points = self.polygon * (w, h) if self.polygon.max() <= 1.0 else self.polygon
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, [np.round(points).astype(np.int32)], 1)
+            with self._lock:
+                self._masks[(w, h)] = mask = mask.astype(bool)
+        return mask
+
+    def __call__(self, xyxy: np.ndarray, w: int, h: int) -> np.ndarray:
+        m = self.margin
+        keep = (xyxy[:, 0] >= m) & (xyxy[:, 1] >= m) & (xyxy[:, 2] <= w - m) & (xyxy[:, 3] <= h - m)
+        if self.polygon is not None and keep.any():
+            cx = np.clip(((xyxy[:, 0] + xyxy[:, 2]) / 2).astype(int), 0, w - 1)
+            by = np.clip(xyxy[:, 3].astype(int) - 1, 0, h - 1)
+            keep &= self._mask(w, h)[by, cx]
+        return keep
+
+def filter_detections(boxes: object, w: int, h: int, names: dict, roi: RoiFilter = None,
+                      rider_iou: float = RIDER_IOU_THRESHOLD) -> DetectionBatch:
+    """Frame-level post-processing: one host copy, rider suppression and ROI filtering as masks."""
+    batch = DetectionBatch.from_boxes(boxes, names)
+    if not len(batch):
+        return batch
+    keep = (roi or RoiFilter())(batch.xyxy, w, h) & ~rider_mask(batch, rider_iou)
+    return batch.select(keep)
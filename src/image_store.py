@@ -0,0 +1,218 @@
+import cv2
+import os
+import re
+import time
+import shutil
+import datetime
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from config import (
+    IMAGE_STORE, IMAGE_STORE_DIR, IMAGE_JPEG_QUALITY, THUMBNAIL_SIZE, THUMBNAIL_JPEG_QUALITY, IMAGE_EXPIRY_INTERVAL,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+_IMAGE_ID_RE = re.compile(r'^[0-9a-f]{40}$')
+
+def is_valid_image_id(image_id: str) -> bool:
+    return bool(image_id) and _IMAGE_ID_RE.match(image_id) is not None
+
+def encode_jpeg(image: np.ndarray, quality: int = IMAGE_JPEG_QUALITY) -> bytes:
+    ok, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise ValueError("Không thể mã hóa ảnh JPEG")
+    return buffer.tobytes()
+
+def make_thumbnail(image: np.ndarray, size: tuple = THUMBNAIL_SIZE) -> bytes:
+    h, w = image.shape[:2]
+    scale = min(size[0] / max(w, 1), size[1] / max(h, 1), 1.0)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+    return encode_jpeg(image, THUMBNAIL_JPEG_QUALITY)
+
+def _expire_ids(old: set, in_use, delete, batch_size: int = 1000) -> int:
+    """Deletes the image ids in ``old`` that ``in_use`` (ids -> ids still referenced) does not keep."""
+    old = sorted(old)
+    removed = 0
+    for i in range(0, len(old), batch_size):
+        batch = old[i:i + batch_size]
+        keep = in_use(batch) if in_use is not None else set()
+        for image_id in batch:
+            if image_id not in keep:
+                delete(image_id)
+                removed += 1
+    return removed
+
+class DiskImageStore:
+    """Content-addressed JPEG store: ``<root>/<id[:2]>/<id>.jpg`` plus ``<id>_thumb.jpg``.
+
+    Storing an image that already exists refreshes its mtime, so ``expire``
+    only removes images no record has stored since ``before``.
+    """
+
+    def __init__(self, root: str = IMAGE_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, image_id: str, thumbnail: bool = False) -> str:
+        suffix = "_thumb" if thumbnail else ""
+        return os.path.join(self.root, image_id[:2], f"{image_id}{suffix}.jpg")
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def put(self, image: np.ndarray) -> str:
+        data = encode_jpeg(image)
+        image_id = hashlib.sha1(data).hexdigest()
+        path = self._path(image_id)
+        if not os.path.exists(path):
+            self._write(self._path(image_id, thumbnail=True), make_thumbnail(image))
+            self._write(path, data)
+        else:
+            for p in (path, self._path(image_id, thumbnail=True)):
+                try:
+                    os.utime(p)
+                except FileNotFoundError:
+                    pass
+        return image_id
+
+    def get(self, image_id: str, thumbnail: bool = False) -> bytes:
+        if not is_valid_image_id(image_id):
+            return None
+        try:
+            with open(self._path(image_id, thumbnail), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def expire(self, before: datetime.datetime, in_use=None) -> int:
+        """Deletes the images last stored before ``before``, returns how many (with their thumbnails).
+
+        ``in_use`` maps a list of those image ids to the ones still
+        referenced, which are kept.
+        """
+        cutoff = before.timestamp()
+        old = set()
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            for f in os.scandir(entry.path):
+                try:
+                    if f.name.endswith(".jpg") and f.stat().st_mtime < cutoff:
+                        old.add(f.name[:40])
+                except FileNotFoundError:
+                    pass
+        return _expire_ids(old, in_use, self._delete)
+
+    def _delete(self, image_id: str) -> None:
+        for path in (self._path(image_id), self._path(image_id, thumbnail=True)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+class GridFSImageStore:
+    """Same layout as DiskImageStore, kept in a GridFS bucket of the plates database.
+
+    Storing an image that already exists refreshes its ``uploadDate``, see
+    ``DiskImageStore``.
+    """
+
+    def __init__(self, db, bucket: str = "vehicle_images"):
+        import gridfs
+        self.fs = gridfs.GridFS(db, collection=bucket)
+        self.files = db[f"{bucket}.files"]
+
+    def put(self, image: np.ndarray) -> str:
+        data = encode_jpeg(image)
+        image_id = hashlib.sha1(data).hexdigest()
+        if not self.fs.exists(image_id):
+            self.fs.put(make_thumbnail(image), _id=f"{image_id}_thumb", contentType="image/jpeg")
+            self.fs.put(data, _id=image_id, contentType="image/jpeg")
+        else:
+            self.files.update_many({"_id": {"$in": [image_id, f"{image_id}_thumb"]}},
+                                   {"$set": {"uploadDate": datetime.datetime.now(datetime.timezone.utc)}})
+        return image_id
+
+    def get(self, image_id: str, thumbnail: bool = False) -> bytes:
+        if not is_valid_image_id(image_id):
+            return None
+        import gridfs
+        try:
+            return self.fs.get(f"{image_id}_thumb" if thumbnail else image_id).read()
+        except gridfs.errors.NoFile:
+            return None
+
+    def expire(self, before: datetime.datetime, in_use=None) -> int:
+        # GridFS keeps chunks in a second collection, a TTL index on the files would orphan them
+        cutoff = before.astimezone(datetime.timezone.utc)
+        old = {str(doc["_id"])[:40] for doc in self.files.find({"uploadDate": {"$lt": cutoff}}, {"_id": 1})}
+        return _expire_ids(old, in_use, self._delete)
+
+    def _delete(self, image_id: str) -> None:
+        for file_id in (image_id, f"{image_id}_thumb"):
+            self.fs.delete(file_id)
+
+    def clear(self) -> None:
+        for doc in self.files.find({}, {"_id": 1}):
+            self.fs.delete(doc["_id"])
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_image_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if IMAGE_STORE == "gridfs":
+                from database import get_client
+                from config import DB_NAME
+                _store = GridFSImageStore(get_client()[DB_NAME])
+            else:
+                _store = DiskImageStore(IMAGE_STORE_DIR)
+            logger.info(f"[ImageStore] Using '{IMAGE_STORE}' image store")
+        return _store
+
+_expiry = None
+
+def start_image_expiry(days: float, collection=None, interval: float = IMAGE_EXPIRY_INTERVAL) -> threading.Thread:
+    """Deletes the images stored more than ``days`` ago that no record refers to, every ``interval`` seconds.
+
+    ``collection`` holds the records, which expire ``days`` after they were
+    written (see ``analytics.ensure_retention``); without it every old image goes.
+    """
+    global _expiry
+
+    def in_use(image_ids: list) -> set:
+        if collection is None:
+            return set()
+        return {doc["image_id"] for doc in collection.find({"image_id": {"$in": image_ids}}, {"image_id": 1})}
+
+    def sweep() -> None:
+        while True:
+            try:
+                before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+                removed = get_image_store().expire(before, in_use)
+                if removed:
+                    logger.info(f"[ImageStore] Expired {removed} images older than {days} days")
+            except Exception as e:
+                logger.error(f"[ImageStore] Lỗi khi xóa ảnh cũ: {e}")
+            time.sleep(interval)
+
+    with _store_lock:
+        if _expiry is None:
+            _expiry = threading.Thread(target=sweep, name="image-expiry", daemon=True)
+            _expiry.start()
+        return _expiry
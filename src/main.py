@@ -1,34 +1,45 @@
 import logging
-from pymongo import MongoClient
 from video_processor import process_video
-from database import create_collection_if_not_exist
-from config import MONGO_URI, DB_NAME, COLLECTION_NAME
+from database import create_collection_if_not_exist, get_client, close_writer
+from plate_search import ensure_indexes
+from analytics import ensure_retention
+from config import DB_NAME, COLLECTION_NAME, METRICS_PORT
+from metrics import start_metrics_server
+from models import warmup
 import os
 import logging
 import sys
 
-os.makedirs("logs", exist_ok=True)
+def setup_logging() -> None:
+    os.makedirs("logs", exist_ok=True)
 
-sys.stdout.reconfigure(encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
 
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler("logs/app.log", encoding="utf-8"),
-        logging.StreamHandler(sys.stdout) 
-    ]
-)
+    logging.basicConfig(
+        level=logging.INFO,
+        handlers=[
+            logging.FileHandler("logs/app.log", encoding="utf-8"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 
 
 logger = logging.getLogger(__name__)
 
+def init_database() -> None:
+    db = get_client()[DB_NAME]
+    create_collection_if_not_exist(db, COLLECTION_NAME)
+    ensure_indexes(db[COLLECTION_NAME])
+    ensure_retention(db[COLLECTION_NAME])
+
 def main():
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
-        create_collection_if_not_exist(db, COLLECTION_NAME)
-        
+        init_database()
+        if METRICS_PORT:
+            start_metrics_server(METRICS_PORT)
+        warmup()
+
         video_path = "../video/261374963_3734554484420037573.mp4"
         output_path = "../output/out2.avi"
     
@@ -40,7 +51,9 @@ def main():
         logger.error(f"Lỗi trong chương trình chính: {str(e)}")
         raise
     finally:
-        client.close()  
+        close_writer()
+        get_client().close()
 
 if __name__ == "__main__":
+    setup_logging()
     main()
\ No newline at end of file
@@ -0,0 +1,322 @@
+import copy
+import re
+import threading
+from bson import ObjectId
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-process stand-in for the small part of the pymongo API used by this
+# project. Selected with MONGO_URI = "memory://" for tests, benchmarks and
+# local development without a MongoDB server.
+
+_MISSING = object()
+
+def _get_field(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _compare(value, op: str, operand) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator {op}")
+
+def _match_condition(value, condition) -> bool:
+    if isinstance(condition, re.Pattern):
+        return isinstance(value, str) and condition.search(value) is not None
+    if condition is None:
+        # like MongoDB, {field: None} also matches documents without the field
+        return value is _MISSING or value is None
+    if not isinstance(condition, dict) or not any(k.startswith("$") for k in condition):
+        return value is not _MISSING and value == condition
+
+    for op, operand in condition.items():
+        if op == "$options":
+            continue
+        if op == "$regex":
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            pattern = operand if isinstance(operand, re.Pattern) else re.compile(operand, flags)
+            if not isinstance(value, str) or pattern.search(value) is None:
+                return False
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            if not _compare(value, op, operand):
+                return False
+        elif op == "$eq":
+            if value is _MISSING or value != operand:
+                return False
+        elif op == "$ne":
+            if value is not _MISSING and value == operand:
+                return False
+        elif op == "$in":
+            if value is _MISSING or value not in operand:
+                return False
+        elif op == "$nin":
+            if value is not _MISSING and value in operand:
+                return False
+        elif op == "$exists":
+            if (value is not _MISSING) != bool(operand):
+                return False
+        else:
+            raise ValueError(f"Unsupported operator {op}")
+    return True
+
+def match_filter(doc: dict, query: dict) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(match_filter(doc, q) for q in condition):
+                return False
+        elif key == "$or":
+            if not any(match_filter(doc, q) for q in condition):
+                return False
+        elif not _match_condition(_get_field(doc, key), condition):
+            return False
+    return True
+
+def _apply_projection(doc: dict, projection) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {k: 1 for k in projection}
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {k: copy.deepcopy(doc[k]) for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+
+def _sort_key(value):
+    # None/missing sort first like MongoDB
+    if value is _MISSING or value is None:
+        return (0, 0)
+    return (1, value)
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+
+class BulkWriteResult:
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.upserted_count = 0
+        self.upserted_ids = {}
+
+class InMemoryCursor:
+    def __init__(self, collection: "InMemoryCollection", query: dict, projection=None):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: int = 1) -> "InMemoryCursor":
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count: int) -> "InMemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "InMemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "InMemoryCursor":
+        return self
+
+    def __iter__(self):
+        docs = self._collection._matching(self._query)
+        for key, direction in reversed(self._sort):
+            docs.sort(key=lambda d: _sort_key(_get_field(d, key)), reverse=direction < 0)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return iter([_apply_projection(d, self._projection) for d in docs])
+
+class InMemoryCollection:
+    def __init__(self, name: str, database: "InMemoryDatabase" = None):
+        self.name = name
+        self.database = database
+        self._docs = {}
+        self._indexes = {"_id_": {"key": [("_id", 1)]}}
+        self._lock = threading.RLock()
+
+    def _matching(self, query: dict) -> list:
+        with self._lock:
+            return [d for d in self._docs.values() if match_filter(d, query)]
+
+    def _apply_update(self, doc: dict, update: dict, inserting: bool) -> None:
+        for op, fields in update.items():
+            if op == "$set":
+                doc.update(copy.deepcopy(fields))
+            elif op == "$setOnInsert":
+                if inserting:
+                    doc.update(copy.deepcopy(fields))
+            elif op == "$inc":
+                for k, v in fields.items():
+                    doc[k] = doc.get(k, 0) + v
+            elif op == "$max":
+                for k, v in fields.items():
+                    doc[k] = v if k not in doc else max(doc[k], v)
+            elif op == "$min":
+                for k, v in fields.items():
+                    doc[k] = v if k not in doc else min(doc[k], v)
+            elif op == "$unset":
+                for k in fields:
+                    doc.pop(k, None)
+            else:
+                raise ValueError(f"Unsupported update operator {op}")
+
+    def insert_one(self, document: dict) -> InsertOneResult:
+        with self._lock:
+            doc = copy.deepcopy(document)
+            doc.setdefault("_id", ObjectId())
+            self._docs[doc["_id"]] = doc
+            document.setdefault("_id", doc["_id"])
+            return InsertOneResult(doc["_id"])
+
+    def insert_many(self, documents: list) -> list:
+        return [self.insert_one(d).inserted_id for d in documents]
+
+    def update_one(self, query: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        with self._lock:
+            for doc in self._docs.values():
+                if match_filter(doc, query):
+                    self._apply_update(doc, update, inserting=False)
+                    return UpdateResult(1, 1)
+            if not upsert:
+                return UpdateResult(0, 0)
+            doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+            self._apply_update(doc, update, inserting=True)
+            doc.setdefault("_id", ObjectId())
+            self._docs[doc["_id"]] = doc
+            return UpdateResult(0, 0, doc["_id"])
+
+    def update_many(self, query: dict, update: dict) -> UpdateResult:
+        with self._lock:
+            docs = self._matching(query)
+            for doc in docs:
+                self._apply_update(doc, update, inserting=False)
+            return UpdateResult(len(docs), len(docs))
+
+    def bulk_write(self, requests: list, ordered: bool = True) -> BulkWriteResult:
+        result = BulkWriteResult()
+        with self._lock:
+            for i, op in enumerate(requests):
+                name = type(op).__name__
+                if name == "UpdateOne":
+                    res = self.update_one(op._filter, op._doc, upsert=bool(op._upsert))
+                    result.matched_count += res.matched_count
+                    result.modified_count += res.modified_count
+                    if res.upserted_id is not None:
+                        result.upserted_count += 1
+                        result.upserted_ids[i] = res.upserted_id
+                elif name == "InsertOne":
+                    self.insert_one(op._doc)
+                    result.inserted_count += 1
+                else:
+                    raise ValueError(f"Unsupported bulk operation {name}")
+        return result
+
+    def find(self, filter: dict = None, projection=None) -> InMemoryCursor:
+        return InMemoryCursor(self, filter or {}, projection)
+
+    def find_one(self, filter: dict = None, projection=None):
+        for doc in self.find(filter, projection).limit(1):
+            return doc
+        return None
+
+    def count_documents(self, filter: dict = None) -> int:
+        return len(self._matching(filter or {}))
+
+    def estimated_document_count(self) -> int:
+        return len(self._docs)
+
+    def delete_many(self, filter: dict = None) -> DeleteResult:
+        with self._lock:
+            ids = [d["_id"] for d in self._matching(filter or {})]
+            for _id in ids:
+                del self._docs[_id]
+            return DeleteResult(len(ids))
+
+    def create_index(self, keys, name: str = None, **kwargs) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = list(keys)
+        name = name or "_".join(f"{k}_{d}" for k, d in keys)
+        # options such as expireAfterSeconds are reported back, not enforced
+        self._indexes[name] = {"key": keys, **kwargs}
+        return name
+
+    def index_information(self) -> dict:
+        return {name: dict(info) for name, info in self._indexes.items()}
+
+    def drop_index(self, name: str) -> None:
+        self._indexes.pop(name, None)
+
+    def drop(self) -> None:
+        with self._lock:
+            self._docs.clear()
+
+class InMemoryDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = InMemoryCollection(name, self)
+            return self._collections[name]
+
+    def list_collection_names(self) -> list:
+        return list(self._collections)
+
+    def create_collection(self, name: str) -> InMemoryCollection:
+        return self[name]
+
+class InMemoryClient:
+    def __init__(self, *args, **kwargs):
+        self._databases = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = InMemoryDatabase(name)
+            return self._databases[name]
+
+    def close(self) -> None:
+        pass
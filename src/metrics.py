@@ -0,0 +1,230 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Minimal Prometheus-style metrics, rendered in the text exposition format.
+# Metrics live in one process-wide registry; each worker process of the
+# stream runner exposes its own.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def remove(self, **labels) -> None:
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def samples(self) -> list[tuple[str, tuple, dict, float]]:
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in self._values.items()]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+class Gauge(Metric):
+    """Gauge set directly, or read from a callback at scrape time with ``set_function``."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._functions = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, func, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = func
+
+    def remove(self, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+            self._functions.pop(key, None)
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        func = self._functions.get(key)
+        return func() if func is not None else self._values.get(key, 0)
+
+    def samples(self) -> list[tuple[str, tuple, dict, float]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, func in functions.items():
+            try:
+                values[key] = func()
+            except Exception as e:
+                logger.debug(f"[Metrics] Gauge '{self.name}' callback failed: {e}")
+        return [(self.name, key, None, value) for key, value in values.items()]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS,
+                 registry: "Registry" = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state["count"] if state else 0
+
+    def samples(self) -> list[tuple[str, tuple, dict, float]]:
+        out = []
+        with self._lock:
+            for key, state in self._values.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, state["buckets"]):
+                    cumulative += n
+                    out.append((f"{self.name}_bucket", key, {"le": _format_value(float(bound))}, cumulative))
+                out.append((f"{self.name}_bucket", key, {"le": "+Inf"}, state["count"]))
+                out.append((f"{self.name}_sum", key, None, state["sum"]))
+                out.append((f"{self.name}_count", key, None, state["count"]))
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Metric:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# Pipeline metrics, recorded by pipeline.py, ocr.py and database.py
+STAGE_SECONDS = Histogram("lpr_stage_seconds", "Time spent per item in a processing stage.", ("stage",))
+STAGE_ERRORS = Counter("lpr_stage_errors_total", "Items that raised in a processing stage.", ("stage",))
+QUEUE_DEPTH = Gauge("lpr_queue_depth", "Items waiting in a pipeline queue.", ("stream", "queue"))
+QUEUE_DROPPED = Gauge("lpr_queue_dropped_total", "Items dropped by a pipeline queue.", ("stream", "queue"))
+ACTIVE_TRACKS = Gauge("lpr_active_tracks", "Open vehicle tracks.", ("stream",))
+OCR_OUTCOMES = Counter("lpr_ocr_outcomes_total", "Plate recognition results by outcome.", ("outcome",))
+PLATE_CACHE_LOOKUPS = Counter("lpr_plate_cache_lookups_total", "Plate crop cache lookups by result.", ("result",))
+WATCHLIST_ALERTS = Counter("lpr_watchlist_alerts_total", "Watchlist alerts raised by match kind.", ("match",))
+WATCHLIST_ENTRIES = Gauge("lpr_watchlist_entries", "Plates on the loaded watchlist.")
+
+def ocr_outcome(plate_text: str) -> str:
+    if plate_text in ("N/A", "None1", "None4"):
+        return plate_text
+    return "valid" if plate_text else "empty"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"[Metrics] Serving http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,138 @@
+import os
+import time
+import threading
+import numpy as np
+from config import (
+    MODEL_VEHICLE_PATH, MODEL_LPR_PATH, MODEL_OCR_PATH, MODEL_BACKENDS, MODEL_INT8, MODEL_INT8_DATA, MODEL_DEVICE,
+    MODEL_IMGSZ, INFERENCE_THREADS, MODEL_WARMUP_RUNS,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Model registry: YOLO models are built on first use, optionally from an
+# ONNX Runtime or OpenVINO export of the .pt weights.
+
+MODEL_PATHS = {
+    "vehicle": MODEL_VEHICLE_PATH,
+    "lpr": MODEL_LPR_PATH,
+    "ocr": MODEL_OCR_PATH,
+}
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+_models = {}
+_lock = threading.Lock()
+_threads_configured = False
+
+def _configure_threads() -> None:
+    global _threads_configured
+    if _threads_configured or not INFERENCE_THREADS:
+        return
+    import torch
+    # pre/post-processing and the torch backend; ONNX Runtime and OpenVINO are set per session below
+    torch.set_num_threads(INFERENCE_THREADS)
+    os.environ.setdefault("OMP_NUM_THREADS", str(INFERENCE_THREADS))
+    _threads_configured = True
+
+def _is_fresh(target: str, source: str) -> bool:
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source)
+
+def export_path(name: str, backend: str, int8: bool = MODEL_INT8) -> str:
+    pt_path = MODEL_PATHS[name]
+    if backend == "torch":
+        return pt_path
+    stem = os.path.splitext(pt_path)[0]
+    if backend == "onnx":
+        return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino":
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+def export_model(name: str, backend: str, int8: bool = MODEL_INT8) -> str:
+    """Exports the .pt weights of ``name`` for ``backend`` unless an up-to-date export exists."""
+    from ultralytics import YOLO
+    pt_path = MODEL_PATHS[name]
+    target = export_path(name, backend, int8)
+    if backend == "torch" or _is_fresh(target, pt_path):
+        return target
+
+    imgsz = MODEL_IMGSZ[name]
+    logger.info(f"[Models] Exporting '{name}' to {backend}{' int8' if int8 else ''}: {target}")
+    if backend == "onnx":
+        onnx_path = export_path(name, "onnx", int8=False)
+        if not _is_fresh(onnx_path, pt_path):
+            YOLO(pt_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            # dynamic quantization needs no calibration data
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(onnx_path, target, weight_type=QuantType.QUInt8)
+    else:
+        kwargs = {"data": MODEL_INT8_DATA} if int8 and MODEL_INT8_DATA else {}
+        YOLO(pt_path).export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8, **kwargs)
+    return target
+
+def _tune_backend(model, backend: str, path: str) -> None:
+    # ultralytics builds its runtime session with default threading, rebuild it with ours
+    if not INFERENCE_THREADS or backend == "torch":
+        return
+    runtime = getattr(getattr(model, "predictor", None), "model", None)
+    try:
+        if backend == "onnx" and hasattr(runtime, "session"):
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = INFERENCE_THREADS
+            options.inter_op_num_threads = 1
+            runtime.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        elif backend == "openvino" and hasattr(runtime, "ov_compiled_model"):
+            import openvino as ov
+            core = ov.Core()
+            xml = next(f for f in os.listdir(path) if f.endswith(".xml"))
+            runtime.ov_compiled_model = core.compile_model(
+                core.read_model(os.path.join(path, xml)), device_name="CPU",
+                config={"PERFORMANCE_HINT": "LATENCY", "INFERENCE_NUM_THREADS": INFERENCE_THREADS},
+            )
+    except Exception as e:
+        logger.warning(f"[Models] Could not set {INFERENCE_THREADS} threads on the {backend} runtime: {e}")
+
+def _run_dummy(model, name: str) -> None:
+    imgsz = MODEL_IMGSZ[name]
+    model.predict(source=np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, device=MODEL_DEVICE,
+                  verbose=False)
+
+def load_model(name: str, backend: str = None, int8: bool = MODEL_INT8):
+    from ultralytics import YOLO
+    backend = backend or MODEL_BACKENDS.get(name, "torch")
+    _configure_threads()
+    start = time.perf_counter()
+    path = export_model(name, backend, int8)
+    model = YOLO(path, task="detect")
+    # the first call builds the predictor and the runtime session
+    _run_dummy(model, name)
+    _tune_backend(model, backend, path)
+    logger.info(f"[Models] Loaded '{name}' ({backend}) from {path} in {time.perf_counter() - start:.2f}s")
+    return model
+
+def get_model(name: str):
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = load_model(name)
+    return model
+
+def warmup(names: tuple = tuple(MODEL_PATHS), runs: int = MODEL_WARMUP_RUNS) -> dict:
+    """Loads ``names`` and runs ``runs`` dummy inferences each, returns the seconds spent per model."""
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        model = get_model(name)
+        for _ in range(runs):
+            _run_dummy(model, name)
+        timings[name] = time.perf_counter() - start
+    logger.info("[Models] Warmup " + ", ".join(f"{n}={t:.2f}s" for n, t in timings.items()))
+    return timings
+
+def loaded_models() -> list[str]:
+    return list(_models)
@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+from config import (
+    MOTION_METHOD, MOTION_DOWNSCALE_WIDTH, MOTION_PIXEL_THRESHOLD, MOTION_MIN_AREA, MOTION_MAX_STRIDE,
+    MOTION_IDLE_FRAMES,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MotionScheduler:
+    """Decides per frame whether the vehicle detector has to run.
+
+    Motion is measured on a small grayscale copy of the frame, by
+    differencing with the previous frame ("diff") or with a MOG2
+    background model ("mog2"). While the scene moves the detector runs on
+    every frame; after ``idle_frames`` quiet frames the stride doubles up
+    to ``max_stride``, and any new motion drops it back to 1 immediately.
+    """
+
+    def __init__(self, method: str = MOTION_METHOD, downscale_width: int = MOTION_DOWNSCALE_WIDTH,
+                 pixel_threshold: int = MOTION_PIXEL_THRESHOLD, min_area: float = MOTION_MIN_AREA,
+                 max_stride: int = MOTION_MAX_STRIDE, idle_frames: int = MOTION_IDLE_FRAMES):
+        if method not in ("diff", "mog2"):
+            raise ValueError(f"Unknown motion method '{method}'")
+        self.method = method
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.max_stride = max_stride
+        self.idle_frames = idle_frames
+        self.stride = 1
+        self.idle = 0
+        self.last_detect = None
+        self.detected = 0
+        self.skipped = 0
+        self._prev = None
+        self._bg = cv2.createBackgroundSubtractorMOG2(history=200, detectShadows=False) if method == "mog2" else None
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        scale = self.downscale_width / max(w, 1)
+        small = cv2.resize(frame, (self.downscale_width, max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion_score(self, frame: np.ndarray) -> float:
+        gray = self._small_gray(frame)
+        if self._bg is not None:
+            mask = self._bg.apply(gray)
+            return float(np.count_nonzero(mask)) / mask.size
+        prev, self._prev = self._prev, gray
+        if prev is None or prev.shape != gray.shape:
+            return 1.0
+        diff = cv2.absdiff(gray, prev)
+        return float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+    def should_detect(self, frame: np.ndarray, frame_idx: int) -> bool:
+        if self.motion_score(frame) >= self.min_area:
+            self.idle = 0
+            self.stride = 1
+        else:
+            self.idle += 1
+            if self.idle >= self.idle_frames:
+                self.idle = 0
+                self.stride = min(self.stride * 2, self.max_stride)
+
+        run = self.last_detect is None or frame_idx - self.last_detect >= self.stride
+        if run:
+            self.last_detect = frame_idx
+            self.detected += 1
+        else:
+            self.skipped += 1
+        return run
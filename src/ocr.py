@@ -1,96 +1,126 @@
 import cv2
 import numpy as np
-import re
-from ultralytics import YOLO
-from config import MODEL_LPR_PATH, MODEL_OCR_PATH
-from utils import is_valid_plate, align_plate_with_paddle
+from config import BATCH_IMGSZ, MODEL_DEVICE
+from models import get_model
+from plate_decode import decode_plate_text
+from plate_align import align_plate
+from plate_cache import get_plate_cache
+from plate_voting import INVALID_READINGS
+from metrics import STAGE_SECONDS, OCR_OUTCOMES, ocr_outcome
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
-model_lpr = YOLO(MODEL_LPR_PATH)  # Có thể thêm .to('cuda') nếu dùng GPU
-model_ocr = YOLO(MODEL_OCR_PATH)  # Có thể thêm .to('cuda') nếu dùng GPU
+# YOLO predictors are not thread-safe, OCR workers take turns per model
+lpr_lock = threading.Lock()
+ocr_lock = threading.Lock()
 
 def ocr_license_plate(track_id: int, plate_crop: np.ndarray, vehicle_type: str = "car") -> tuple[str, float]:
     plate_resized = cv2.resize(plate_crop, None, fx=4, fy=4, interpolation=cv2.INTER_CUBIC)
-    ocr_results = model_ocr.predict(source=plate_resized, conf=0.5, iou=0.7, device='cpu', verbose=False)
-    chars, confs = [], []
-    
+    model_ocr = get_model("ocr")
+    with ocr_lock, STAGE_SECONDS.time(stage="ocr_inference"):
+        ocr_results = model_ocr.predict(source=plate_resized, conf=0.5, iou=0.7, device=MODEL_DEVICE, verbose=False)
     for ocr_res in ocr_results:
-        for char_box in ocr_res.boxes:
-            cx1, cy1, cx2, cy2 = char_box.xyxy[0].cpu().numpy().astype(int)
-            conf_char = float(char_box.conf[0].cpu().numpy())
-            if conf_char < 0.5:
-                continue
-            label_id = int(char_box.cls[0])
-            label_name = ocr_res.names[label_id]
-            cx = (cx1 + cx2) / 2
-            cy = (cy1 + cy2) / 2
-            h = cy2 - cy1
-            chars.append((cx, cy, h, label_name))
-            confs.append(conf_char)
+        return decode_plate_text(ocr_res, vehicle_type)
+    return "None4", 0.0
 
-    if not chars:
-        return "None4", 0.0
+def crop_plate(vehicle_crop: np.ndarray, pbox: object) -> np.ndarray:
+    px1, py1, px2, py2 = pbox.xyxy[0].cpu().numpy().astype(int)
+    w, h = px2 - px1, py2 - py1
+    pad_w, pad_h = int(w * 0.1), int(h * 0.15)
+    px1, py1 = max(px1 - pad_w, 0), max(py1 - pad_h, 0)
+    px2, py2 = min(px2 + pad_w, vehicle_crop.shape[1]), min(py2 + pad_h, vehicle_crop.shape[0])
+    return vehicle_crop[py1:py2, px1:px2]
 
-    chars.sort(key=lambda x: (x[1], x[0]))
-    lines, current_line = [], [chars[0]]
-    for ch in chars[1:]:
-        avg_h = np.mean([c[2] for c in current_line])
-        if abs(ch[1] - current_line[-1][1]) < avg_h * 0.7:
-            current_line.append(ch)
-        else:
-            lines.append(current_line)
-            current_line = [ch]
-    lines.append(current_line)
-    for li in range(len(lines)):
-        lines[li] = sorted(lines[li], key=lambda x: x[0])
+def detect_plate_from_vehicle(track_id: int, vehicle_crop: np.ndarray, vehicle_type: str = "car",
+                              scope: tuple = None) -> tuple[str, float, bool]:
+    """``(plate_text, ocr_conf, cached)``, ``cached`` when the text came from the plate cache instead of OCR.
 
-    recognized_text = ""
-    if vehicle_type in ["car", "bus", "truck"]:
-        if len(lines) == 2:
-            recognized_text = ''.join([c[3] for c in lines[0]]) + "-" + ''.join([c[3] for c in lines[1]])
-        else:
-            recognized_text = ''.join([c[3] for c in lines[0]])
-    elif vehicle_type == "motorcycle":
-        if len(lines) == 2:
-            line1 = ''.join([c[3] for c in lines[0]])
-            line2 = ''.join([c[3] for c in lines[1]])
-            candidate = f"{line1}-{line2}"
-            if 6 <= len(line1 + line2) <= 10:
-                recognized_text = candidate
+    ``scope`` is the stream ``track_id`` belongs to, see ``StreamContext.scope``.
+    """
+    model_lpr = get_model("lpr")
+    with lpr_lock, STAGE_SECONDS.time(stage="plate_detection"):
+        lpr_results = model_lpr.predict(source=vehicle_crop, conf=0.6, iou=0.7, device=MODEL_DEVICE, verbose=False)
+    for pr in lpr_results:
+        for pbox in pr.boxes:
+            plate_crop = crop_plate(vehicle_crop, pbox)
+            cache = get_plate_cache() if plate_crop.size > 0 else None
+            signature = cache.signature(plate_crop) if cache is not None else None
+            cached = cache.get(signature, track_id, vehicle_type, scope) if cache is not None else None
+            if cached is not None:
+                (plate_text, ocr_conf), cached = cached, True
             else:
-                recognized_text = line1 + line2 
-        else:
-            recognized_text = ''.join([c[3] for line in lines for c in line])
+                with STAGE_SECONDS.time(stage="align"):
+                    plate_crop = align_plate(plate_crop, output_size=(240, 80))
+                plate_text, ocr_conf = ocr_license_plate(track_id, plate_crop, vehicle_type)
+                if cache is not None and plate_text not in INVALID_READINGS:
+                    cache.put(signature, track_id, vehicle_type, (plate_text, ocr_conf), scope)
+                cached = False
+            if plate_text:
+                OCR_OUTCOMES.inc(outcome=ocr_outcome(plate_text))
+                return plate_text, ocr_conf, cached
+    OCR_OUTCOMES.inc(outcome="None1")
+    return "None1", 0.0, False
 
-    else:
-        recognized_text = ''.join([c[3] for line in lines for c in line])
+def detect_plates_batch(vehicles: list[tuple[int, np.ndarray, str]],
+                        scope: tuple = None) -> list[tuple[str, float, bool]]:
+    """Plate detection + OCR for many vehicle crops with one forward pass per model.
 
-    recognized_text = re.sub(r'[^A-Z0-9]', '', recognized_text)
-    avg_conf = sum(confs) / len(confs) if confs else 0.0
+    ``vehicles`` is a list of ``(track_id, vehicle_crop, vehicle_type)``; the
+    result list of ``(plate_text, ocr_conf, cached)`` is aligned with it. Crops are letterboxed to ``BATCH_IMGSZ``
+    by ultralytics so crops of different sizes share one batch. ``scope``
+    is the stream the vehicles come from, as for ``detect_plate_from_vehicle``.
+    """
+    results = [("None1", 0.0, False) if crop.size > 0 else ("", 0.0, False) for _, crop, _ in vehicles]
+    crops = [(i, crop) for i, (_, crop, _) in enumerate(vehicles) if crop.size > 0]
+    if not crops:
+        return _count_outcomes(results)
 
-    if (
-        not recognized_text
-        or not is_valid_plate(recognized_text, vehicle_type)
-        or not (7 <= len(recognized_text.replace("-", "")) <= 10)
-    ):
-        recognized_text = "N/A"
-        avg_conf = 0.0
-    return recognized_text, avg_conf
+    model_lpr = get_model("lpr")
+    with lpr_lock, STAGE_SECONDS.time(stage="plate_detection"):
+        lpr_results = model_lpr.predict(
+            source=[crop for _, crop in crops], conf=0.6, iou=0.7, imgsz=BATCH_IMGSZ, device=MODEL_DEVICE,
+            verbose=False
+        )
 
-def detect_plate_from_vehicle(track_id: int, vehicle_crop: np.ndarray, vehicle_type: str = "car") -> tuple[str, float]:
-    lpr_results = model_lpr.predict(source=vehicle_crop, conf=0.6, iou=0.7, device='cpu', verbose=False)
-    for pr in lpr_results:
-        for pbox in pr.boxes:
-            px1, py1, px2, py2 = pbox.xyxy[0].cpu().numpy().astype(int)
-            w, h = px2 - px1, py2 - py1
-            pad_w, pad_h = int(w * 0.1), int(h * 0.15)
-            px1, py1 = max(px1 - pad_w, 0), max(py1 - pad_h, 0)
-            px2, py2 = min(px2 + pad_w, vehicle_crop.shape[1]), min(py2 + pad_h, vehicle_crop.shape[0])
-            plate_crop = vehicle_crop[py1:py2, px1:px2]
-            plate_crop=align_plate_with_paddle(plate_crop, output_size=(240, 80))
-            plate_text, ocr_conf = ocr_license_plate(track_id, plate_crop, vehicle_type)
-            if plate_text:
-                return plate_text, ocr_conf
-    return "None1", 0.0
\ No newline at end of file
+    cache = get_plate_cache()
+    plates, signatures = [], {}
+    for (i, crop), pr in zip(crops, lpr_results):
+        if len(pr.boxes) == 0:
+            continue
+        plate_crop = crop_plate(crop, pr.boxes[0])
+        if plate_crop.size == 0:
+            continue
+        if cache is not None:
+            # a near-identical crop of the same vehicle was read recently: skip align and OCR
+            track_id, _, vehicle_type = vehicles[i]
+            signatures[i] = cache.signature(plate_crop)
+            cached = cache.get(signatures[i], track_id, vehicle_type, scope)
+            if cached is not None:
+                results[i] = (*cached, True)
+                continue
+        with STAGE_SECONDS.time(stage="align"):
+            plate_crop = align_plate(plate_crop, output_size=(240, 80))
+        plates.append((i, cv2.resize(plate_crop, None, fx=4, fy=4, interpolation=cv2.INTER_CUBIC)))
+    if not plates:
+        return _count_outcomes(results)
+
+    model_ocr = get_model("ocr")
+    with ocr_lock, STAGE_SECONDS.time(stage="ocr_inference"):
+        ocr_results = model_ocr.predict(
+            source=[plate for _, plate in plates], conf=0.5, iou=0.7, imgsz=BATCH_IMGSZ, device=MODEL_DEVICE,
+            verbose=False
+        )
+
+    for (i, _), ocr_res in zip(plates, ocr_results):
+        plate_text, ocr_conf = decode_plate_text(ocr_res, vehicles[i][2])
+        results[i] = (plate_text, ocr_conf, False)
+        if cache is not None and plate_text not in INVALID_READINGS:
+            cache.put(signatures[i], vehicles[i][0], vehicles[i][2], (plate_text, ocr_conf), scope)
+    return _count_outcomes(results)
+
+def _count_outcomes(results: list[tuple[str, float, bool]]) -> list[tuple[str, float, bool]]:
+    for plate_text, _, _ in results:
+        OCR_OUTCOMES.inc(outcome=ocr_outcome(plate_text))
+    return results
@@ -0,0 +1,319 @@
+import queue
+import threading
+import time
+from metrics import STAGE_SECONDS, STAGE_ERRORS, QUEUE_DEPTH, QUEUE_DROPPED
+import logging
+
+logger = logging.getLogger(__name__)
+
+STOP = object()
+
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class StageQueue:
+    """Bounded queue between two stages.
+
+    ``block`` applies backpressure to the producer, ``drop_oldest`` and
+    ``drop_newest`` keep a live source running by discarding items instead.
+    ``on_drop`` receives every discarded item.
+    """
+
+    def __init__(self, name: str, maxsize: int, drop_policy: str = "block", on_drop=None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{drop_policy}', expected one of {DROP_POLICIES}")
+        self.name = name
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+
+    def put(self, item) -> bool:
+        if item is STOP or self.drop_policy == "block":
+            self._queue.put(item)
+            return True
+        if self.drop_policy == "drop_newest":
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                self._drop(item)
+                return False
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    return True
+                except queue.Full:
+                    try:
+                        old = self._queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    if old is STOP:
+                        self._queue.put(old)
+                        self._drop(item)
+                        return False
+                    self._drop(old)
+
+    def _drop(self, item) -> None:
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def get(self, timeout: float = None):
+        return self._queue.get(timeout=timeout)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+
+class Stage:
+    """Runs ``func`` on every item of ``inbox`` in one or more worker threads.
+
+    With ``batch_size > 1`` ``func`` receives a list of up to ``batch_size``
+    items gathered within ``batch_window`` seconds of the first one.
+    ``func`` is responsible for pushing its results to downstream queues.
+    When the inbox is exhausted, STOP is forwarded to every queue in
+    ``outputs`` once all workers of this stage have finished, right after
+    the optional ``on_stop`` callback. Exceptions of ``func`` and
+    ``on_stop`` are logged and counted in ``errors``.
+    """
+
+    def __init__(self, name: str, func, inbox: StageQueue, outputs: tuple = (), workers: int = 1,
+                 batch_size: int = 1, batch_window: float = 0.0, on_stop=None):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outputs = outputs
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.on_stop = on_stop
+        self.processed = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        self._threads = []
+        self._lock = threading.Lock()
+        self._alive = workers
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def join(self, timeout: float = None) -> None:
+        for t in self._threads:
+            t.join(timeout)
+
+    def is_alive(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def _next_batch(self) -> tuple[list, bool]:
+        items = []
+        deadline = None
+        while len(items) < self.batch_size:
+            try:
+                timeout = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                item = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is STOP:
+                return items, True
+            items.append(item)
+            if deadline is None:
+                deadline = time.perf_counter() + self.batch_window
+        return items, False
+
+    def _run(self) -> None:
+        while True:
+            if self.batch_size > 1:
+                item, stopped = self._next_batch()
+            else:
+                item = self.inbox.get()
+                stopped = item is STOP
+            if stopped:
+                # let sibling workers see the sentinel too
+                self.inbox.put(STOP)
+                if not item or item is STOP:
+                    break
+            start = time.perf_counter()
+            try:
+                self.func(item)
+            except Exception as e:
+                self._error()
+                logger.error(f"[Pipeline] Lỗi ở stage '{self.name}': {e}")
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, stage=self.name)
+            with self._lock:
+                self.processed += 1
+                self.total_latency += elapsed
+                self.last_latency = elapsed
+                self.max_latency = max(self.max_latency, elapsed)
+            if stopped:
+                break
+
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last:
+            if self.on_stop is not None:
+                try:
+                    self.on_stop()
+                except Exception as e:
+                    self._error()
+                    logger.error(f"[Pipeline] Lỗi khi dừng stage '{self.name}': {e}")
+            for out in self.outputs:
+                out.put(STOP)
+
+    def _error(self) -> None:
+        with self._lock:
+            self.errors += 1
+        STAGE_ERRORS.inc(stage=self.name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg = self.total_latency / self.processed if self.processed else 0.0
+            return {
+                "stage": self.name,
+                "queue": self.inbox.name,
+                "queue_depth": self.inbox.depth(),
+                "queue_size": self.inbox.maxsize,
+                "dropped": self.inbox.dropped,
+                "processed": self.processed,
+                "errors": self.errors,
+                "avg_latency": avg,
+                "last_latency": self.last_latency,
+                "max_latency": self.max_latency,
+            }
+
+
+class Source:
+    """Feeds items from an iterator into ``outbox`` on its own thread."""
+
+    def __init__(self, name: str, iterator, outbox: StageQueue):
+        self.name = name
+        self.iterator = iterator
+        self.outbox = outbox
+        self.produced = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def join(self, timeout: float = None) -> None:
+        self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        try:
+            start = time.perf_counter()
+            for item in self.iterator:
+                elapsed = time.perf_counter() - start
+                self.total_latency += elapsed
+                STAGE_SECONDS.observe(elapsed, stage=self.name)
+                if self._stop_event.is_set():
+                    break
+                self.outbox.put(item)
+                self.produced += 1
+                start = time.perf_counter()
+        except Exception as e:
+            self.errors += 1
+            STAGE_ERRORS.inc(stage=self.name)
+            logger.error(f"[Pipeline] Lỗi ở nguồn '{self.name}': {e}")
+        finally:
+            self.outbox.put(STOP)
+
+    def stats(self) -> dict:
+        avg = self.total_latency / self.produced if self.produced else 0.0
+        return {
+            "stage": self.name,
+            "produced": self.produced,
+            "errors": self.errors,
+            "avg_latency": avg,
+        }
+
+
+class Pipeline:
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.sources = []
+        self.stages = []
+
+    def add_source(self, name: str, iterator, outbox: StageQueue) -> Source:
+        source = Source(name, iterator, outbox)
+        self.sources.append(source)
+        return source
+
+    def add_stage(self, name: str, func, inbox: StageQueue, outputs: tuple = (), workers: int = 1,
+                  batch_size: int = 1, batch_window: float = 0.0, on_stop=None) -> Stage:
+        stage = Stage(name, func, inbox, outputs, workers, batch_size, batch_window, on_stop)
+        self.stages.append(stage)
+        return stage
+
+    def _queues(self) -> list[StageQueue]:
+        return [stage.inbox for stage in self.stages]
+
+    def start(self) -> None:
+        for q in self._queues():
+            QUEUE_DEPTH.set_function(q.depth, stream=self.name, queue=q.name)
+            QUEUE_DROPPED.set_function(lambda q=q: q.dropped, stream=self.name, queue=q.name)
+        for stage in self.stages:
+            stage.start()
+        for source in self.sources:
+            source.start()
+
+    def stop(self) -> None:
+        for source in self.sources:
+            source.stop()
+
+    def is_alive(self) -> bool:
+        return any(s.is_alive() for s in self.sources) or any(s.is_alive() for s in self.stages)
+
+    def join(self, stats_interval: float = 0) -> dict:
+        """Waits for every source and stage to finish; returns ``errors()``."""
+        last_log = time.time()
+        while self.is_alive():
+            time.sleep(0.1)
+            if stats_interval and time.time() - last_log >= stats_interval:
+                self.log_stats()
+                last_log = time.time()
+        self.log_stats()
+        for q in self._queues():
+            QUEUE_DEPTH.remove(stream=self.name, queue=q.name)
+            QUEUE_DROPPED.remove(stream=self.name, queue=q.name)
+        return self.errors()
+
+    def errors(self) -> dict:
+        """Exceptions raised so far, per source and stage name."""
+        return {s.name: s.errors for s in self.sources + self.stages}
+
+    def stats(self) -> list:
+        return [s.stats() for s in self.sources] + [s.stats() for s in self.stages]
+
+    def log_stats(self) -> None:
+        for s in self.stats():
+            if "queue_depth" in s:
+                logger.info(
+                    f"[Pipeline:{self.name}] {s['stage']}: queue={s['queue_depth']}/{s['queue_size']} "
+                    f"dropped={s['dropped']} processed={s['processed']} errors={s['errors']} "
+                    f"avg={s['avg_latency'] * 1000:.1f}ms max={s['max_latency'] * 1000:.1f}ms"
+                )
+            else:
+                logger.info(
+                    f"[Pipeline:{self.name}] {s['stage']}: produced={s['produced']} errors={s['errors']} "
+                    f"avg={s['avg_latency'] * 1000:.1f}ms"
+                )
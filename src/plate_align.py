@@ -0,0 +1,174 @@
+import cv2
+import time
+import threading
+import numpy as np
+from config import PLATE_ALIGN_METHOD, PLATE_ALIGN_FALLBACK, PLATE_ALIGN_MIN_AREA
+import logging
+
+logger = logging.getLogger(__name__)
+
+# name -> function(plate_crop) returning a 4x2 float32 quad or None
+ALIGNERS = {}
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+def register_aligner(name: str):
+    def wrap(func):
+        ALIGNERS[name] = func
+        return func
+    return wrap
+
+def order_quad(pts: np.ndarray) -> np.ndarray:
+    pts = np.asarray(pts, dtype=np.float32).reshape(4, 2)
+    s = pts.sum(axis=1)
+    d = np.diff(pts, axis=1).ravel()
+    return np.array([pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]], dtype=np.float32)
+
+def _is_valid_quad(quad: np.ndarray, shape: tuple) -> bool:
+    if quad is None or len(np.unique(quad, axis=0)) < 4:
+        return False
+    area = cv2.contourArea(quad.reshape(-1, 1, 2))
+    return area >= PLATE_ALIGN_MIN_AREA * shape[0] * shape[1] and cv2.isContourConvex(quad.reshape(-1, 1, 2))
+
+def _largest_contour(plate_crop: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(plate_crop, cv2.COLOR_BGR2GRAY) if plate_crop.ndim == 3 else plate_crop
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Vietnamese plates are dark text on a light background, the plate is the largest bright blob
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    return max(contours, key=cv2.contourArea)
+
+@register_aligner("contour")
+def quad_from_contour(plate_crop: np.ndarray) -> np.ndarray:
+    contour = _largest_contour(plate_crop)
+    if contour is None:
+        return None
+    hull = cv2.convexHull(contour)
+    approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+    if len(approx) == 4:
+        return order_quad(approx)
+    return order_quad(cv2.boxPoints(cv2.minAreaRect(contour)))
+
+@register_aligner("min_area_rect")
+def quad_from_min_area_rect(plate_crop: np.ndarray) -> np.ndarray:
+    contour = _largest_contour(plate_crop)
+    if contour is None:
+        return None
+    return order_quad(cv2.boxPoints(cv2.minAreaRect(contour)))
+
+def _line_intersection(l1: tuple, l2: tuple) -> tuple:
+    x1, y1, x2, y2 = l1
+    x3, y3, x4, y4 = l2
+    den = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+    if abs(den) < 1e-6:
+        return None
+    a = x1 * y2 - y1 * x2
+    b = x3 * y4 - y3 * x4
+    return ((a * (x3 - x4) - (x1 - x2) * b) / den, (a * (y3 - y4) - (y1 - y2) * b) / den)
+
+@register_aligner("hough")
+def quad_from_hough(plate_crop: np.ndarray) -> np.ndarray:
+    h, w = plate_crop.shape[:2]
+    gray = cv2.cvtColor(plate_crop, cv2.COLOR_BGR2GRAY) if plate_crop.ndim == 3 else plate_crop
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (3, 3), 0), 50, 150)
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=max(w, h) // 4,
+                            minLineLength=min(w, h) // 2, maxLineGap=5)
+    if lines is None:
+        return None
+
+    horizontal, vertical = [], []
+    for x1, y1, x2, y2 in lines.reshape(-1, 4):
+        angle = abs(np.degrees(np.arctan2(y2 - y1, x2 - x1))) % 180
+        if angle < 30 or angle > 150:
+            horizontal.append((x1, y1, x2, y2))
+        elif 60 < angle < 120:
+            vertical.append((x1, y1, x2, y2))
+    if len(horizontal) < 2:
+        return None
+
+    top = min(horizontal, key=lambda l: l[1] + l[3])
+    bottom = max(horizontal, key=lambda l: l[1] + l[3])
+    # plate borders are often cut by the crop padding, fall back to the crop edges
+    left = min(vertical, key=lambda l: l[0] + l[2]) if vertical else (0, 0, 0, h - 1)
+    right = max(vertical, key=lambda l: l[0] + l[2]) if vertical else (w - 1, 0, w - 1, h - 1)
+
+    corners = [_line_intersection(top, left), _line_intersection(top, right),
+               _line_intersection(bottom, right), _line_intersection(bottom, left)]
+    if any(c is None for c in corners):
+        return None
+    return order_quad(np.clip(np.array(corners, dtype=np.float32), [0, 0], [w - 1, h - 1]))
+
+_paddle = None
+_paddle_lock = threading.Lock()
+
+def get_paddle_detector():
+    global _paddle
+    with _paddle_lock:
+        if _paddle is None:
+            from paddleocr import PaddleOCR
+            logger.info("[Align] Loading PaddleOCR text detector")
+            _paddle = PaddleOCR(use_angle_cls=False, lang='en')
+        return _paddle
+
+@register_aligner("paddle")
+def quad_from_paddle(plate_crop: np.ndarray) -> np.ndarray:
+    detector = get_paddle_detector()
+    with _paddle_lock:
+        results = detector.ocr(plate_crop)
+    logger.debug(f"Aligning plate with PaddleOCR, results: {results}")
+    if not results or not results[0]:
+        logger.info("Không tìm thấy text box nào")
+        return None
+    try:
+        # Lấy box đầu tiên
+        return np.array(results[0][0][0], dtype=np.float32)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy box từ PaddleOCR: {e}")
+        return None
+
+def _record(method: str, elapsed: float, found: bool) -> None:
+    with _stats_lock:
+        s = _stats.setdefault(method, {"calls": 0, "found": 0, "total_time": 0.0, "max_time": 0.0})
+        s["calls"] += 1
+        s["found"] += int(found)
+        s["total_time"] += elapsed
+        s["max_time"] = max(s["max_time"], elapsed)
+
+def align_stats() -> dict:
+    with _stats_lock:
+        return {
+            method: {**s, "avg_ms": s["total_time"] / s["calls"] * 1000 if s["calls"] else 0.0}
+            for method, s in _stats.items()
+        }
+
+def reset_align_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+def warp_plate(plate_crop: np.ndarray, quad: np.ndarray, output_size: tuple = (240, 80)) -> np.ndarray:
+    dst = np.array([
+        [0, 0],
+        [output_size[0] - 1, 0],
+        [output_size[0] - 1, output_size[1] - 1],
+        [0, output_size[1] - 1]
+    ], dtype=np.float32)
+    M = cv2.getPerspectiveTransform(quad, dst)
+    return cv2.warpPerspective(plate_crop, M, output_size)
+
+def align_plate(plate_crop: np.ndarray, output_size: tuple = (240, 80), method: str = PLATE_ALIGN_METHOD,
+                fallback: tuple = PLATE_ALIGN_FALLBACK) -> np.ndarray:
+    if plate_crop is None or plate_crop.size == 0:
+        return plate_crop
+    for name in (method, *fallback):
+        start = time.perf_counter()
+        quad = ALIGNERS[name](plate_crop)
+        # PaddleOCR boxes follow the text, not the plate border, so skip the area check for it
+        found = quad is not None and (name == "paddle" or _is_valid_quad(quad, plate_crop.shape))
+        _record(name, time.perf_counter() - start, found)
+        if found:
+            return warp_plate(plate_crop, quad, output_size)
+    return plate_crop
@@ -0,0 +1,146 @@
+import time
+import threading
+import cv2
+import numpy as np
+from config import (
+    PLATE_CACHE_SIZE, PLATE_CACHE_TTL, PLATE_CACHE_HASH_SIZE, PLATE_CACHE_MAX_DISTANCE, PLATE_CACHE_MAX_SCALE_CHANGE,
+    PLATE_CACHE_CROSS_TRACK,
+)
+from metrics import PLATE_CACHE_LOOKUPS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# set bits per byte value, for Hamming distances over packed hashes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+def plate_hash(plate_crop: np.ndarray, hash_size: tuple = PLATE_CACHE_HASH_SIZE) -> np.ndarray:
+    """dHash of the crop: the sign of horizontal gradients on a ``hash_size`` (w, h) grayscale thumbnail, packed."""
+    w, h = hash_size
+    gray = cv2.cvtColor(plate_crop, cv2.COLOR_BGR2GRAY) if plate_crop.ndim == 3 else plate_crop
+    small = cv2.resize(gray, (w + 1, h), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+class PlateCache:
+    """Plate readings of recent crops, looked up by perceptual hash.
+
+    A crop whose dHash is within ``max_distance`` bits of a cached one, and
+    whose size changed by at most ``max_scale_change``, gets the cached
+    text and confidence back without alignment or OCR. A 1-2 bit hash
+    difference is all that separates plates differing in one character,
+    so hits are limited to the same track unless ``cross_track`` is set
+    (re-issued track ids at a barrier). Track ids restart with every
+    tracker, so every lookup also names its ``scope`` (the stream's
+    ``(camera_id, segment)``) and never matches another stream; a scope is
+    forgotten once none of its entries is left. Bounded to ``maxsize`` entries,
+    least recently used first, each valid for ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize: int = PLATE_CACHE_SIZE, ttl: float = PLATE_CACHE_TTL,
+                 max_distance: int = PLATE_CACHE_MAX_DISTANCE, hash_size: tuple = PLATE_CACHE_HASH_SIZE,
+                 max_scale_change: float = PLATE_CACHE_MAX_SCALE_CHANGE, cross_track: bool = PLATE_CACHE_CROSS_TRACK):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.max_scale_change = max_scale_change
+        self.cross_track = cross_track
+        self.hits = 0
+        self.misses = 0
+        nbytes = (hash_size[0] * hash_size[1] + 7) // 8
+        # fixed slots so a lookup is one vectorized pass over all entries
+        self._hashes = np.zeros((maxsize, nbytes), dtype=np.uint8)
+        self._sizes = np.zeros((maxsize, 2), dtype=np.float32)
+        self._expires = np.zeros(maxsize, dtype=np.float64)
+        self._used = np.zeros(maxsize, dtype=np.float64)
+        self._tracks = np.full(maxsize, -1, dtype=np.int64)
+        self._scopes = np.full(maxsize, -1, dtype=np.int64)
+        self._scope_ids = {}
+        self._next_scope = 0
+        self._types = np.full(maxsize, None, dtype=object)
+        self._values = [None] * maxsize
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int((self._expires > time.monotonic()).sum())
+
+    def signature(self, plate_crop: np.ndarray) -> tuple:
+        return plate_hash(plate_crop, self.hash_size), plate_crop.shape[:2]
+
+    def _scope_id(self, scope: tuple) -> int:
+        scope_id = self._scope_ids.get(scope)
+        if scope_id is None:
+            # ids are never reused, so a stale slot cannot match a later scope
+            scope_id = self._scope_ids[scope] = self._next_scope
+            self._next_scope += 1
+        return scope_id
+
+    def _prune_scopes(self, now: float) -> None:
+        live = set(self._scopes[self._expires > now].tolist())
+        for scope, scope_id in list(self._scope_ids.items()):
+            if scope_id not in live:
+                del self._scope_ids[scope]
+
+    def get(self, signature: tuple, track_id: int, vehicle_type: str, scope: tuple = None) -> tuple:
+        """Cached ``(plate_text, ocr_conf)`` for a near-identical crop, or None."""
+        bits, (h, w) = signature
+        now = time.monotonic()
+        with self._lock:
+            # -1 marks never used slots, none of them is live
+            scope_id = self._scope_ids.get(scope, -1)
+            candidates = (self._expires > now) & (self._types == vehicle_type) & (self._scopes == scope_id)
+            if not self.cross_track:
+                candidates &= self._tracks == track_id
+            if candidates.any():
+                scale = np.abs(self._sizes - (w, h)).max(axis=1) / np.maximum(self._sizes.max(axis=1), 1)
+                candidates &= scale <= self.max_scale_change
+            slot = None
+            if candidates.any():
+                idx = np.flatnonzero(candidates)
+                distances = _POPCOUNT[self._hashes[idx] ^ bits].sum(axis=1)
+                best = int(distances.argmin())
+                if distances[best] <= self.max_distance:
+                    slot = int(idx[best])
+            if slot is None:
+                self.misses += 1
+                PLATE_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self._used[slot] = now
+            self.hits += 1
+            PLATE_CACHE_LOOKUPS.inc(result="hit")
+            return self._values[slot]
+
+    def put(self, signature: tuple, track_id: int, vehicle_type: str, value: tuple, scope: tuple = None) -> None:
+        bits, (h, w) = signature
+        now = time.monotonic()
+        with self._lock:
+            expired = np.flatnonzero(self._expires <= now)
+            slot = int(expired[0]) if expired.size else int(self._used.argmin())
+            self._expires[slot] = 0
+            self._prune_scopes(now)
+            self._hashes[slot] = bits
+            self._sizes[slot] = (w, h)
+            self._expires[slot] = now + self.ttl
+            self._used[slot] = now
+            self._tracks[slot] = track_id
+            self._scopes[slot] = self._scope_id(scope)
+            self._types[slot] = vehicle_type
+            self._values[slot] = value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expires[:] = 0
+            self._values = [None] * self.maxsize
+            self._scope_ids.clear()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_plate_cache() -> PlateCache:
+    """Process-wide plate cache, or None when ``PLATE_CACHE_SIZE`` is 0."""
+    global _cache
+    if _cache is None and PLATE_CACHE_SIZE:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PlateCache()
+    return _cache
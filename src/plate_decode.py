@@ -0,0 +1,80 @@
+import re
+import numpy as np
+from plate_format import is_valid_plate, correct_plate
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Turns the character boxes of the OCR model into plate text. Kept free of
+# the models so it can be exercised with plain arrays.
+
+MIN_CHAR_CONF = 0.5
+# two characters are on the same line when their centers are closer than this share of the char height
+LINE_GAP_RATIO = 0.7
+
+def group_chars(boxes: np.ndarray, names: dict, min_conf: float = MIN_CHAR_CONF) -> list[list[tuple[str, float]]]:
+    """Groups OCR character boxes into plate lines.
+
+    ``boxes`` is an ``(n, 6+)`` array laid out like ``Results.boxes.data``:
+    ``x1, y1, x2, y2, [track_id,] conf, cls``. Returns the lines top to
+    bottom, each a left-to-right list of ``(char, conf)``.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    if boxes.ndim != 2 or len(boxes) == 0:
+        return []
+    boxes = boxes[boxes[:, -2] >= min_conf]
+    if len(boxes) == 0:
+        return []
+
+    xyxy = boxes[:, :4].astype(int)
+    cx = (xyxy[:, 0] + xyxy[:, 2]) / 2
+    cy = (xyxy[:, 1] + xyxy[:, 3]) / 2
+    height = xyxy[:, 3] - xyxy[:, 1]
+
+    # rows: sort by center y, start a new line wherever the vertical gap exceeds the typical char height
+    order = np.lexsort((cx, cy))
+    gaps = np.diff(cy[order])
+    breaks = gaps >= np.median(height) * LINE_GAP_RATIO
+    line_of = np.empty(len(order), dtype=int)
+    line_of[order] = np.concatenate(([0], np.cumsum(breaks)))
+
+    order = np.lexsort((cx, line_of))
+    labels = [names[int(c)] for c in boxes[order, -1]]
+    confs = boxes[order, -2].tolist()
+    line_sizes = np.bincount(line_of)
+    lines, start = [], 0
+    for size in line_sizes:
+        lines.append(list(zip(labels[start:start + size], confs[start:start + size])))
+        start += size
+    return lines
+
+def assemble_plate(lines: list[list[tuple[str, float]]], vehicle_type: str = "car") -> tuple[str, float]:
+    if not lines:
+        return "None4", 0.0
+
+    texts = [''.join(c for c, _ in line) for line in lines]
+    if vehicle_type in ["car", "bus", "truck"]:
+        recognized_text = f"{texts[0]}-{texts[1]}" if len(lines) == 2 else texts[0]
+    elif vehicle_type == "motorcycle" and len(lines) == 2 and 6 <= len(texts[0] + texts[1]) <= 10:
+        recognized_text = f"{texts[0]}-{texts[1]}"
+    else:
+        recognized_text = ''.join(texts)
+
+    recognized_text = re.sub(r'[^A-Z0-9]', '', recognized_text)
+    confs = [conf for line in lines for _, conf in line]
+    avg_conf = sum(confs) / len(confs)
+
+    if not (7 <= len(recognized_text) <= 10):
+        return "N/A", 0.0
+    if not is_valid_plate(recognized_text, vehicle_type):
+        recognized_text, cost = correct_plate(recognized_text, vehicle_type)
+        if recognized_text is None:
+            return "N/A", 0.0
+        # a corrected reading counts less than a clean one in the vote
+        avg_conf /= 1.0 + cost
+    return recognized_text, avg_conf
+
+def decode_plate_text(ocr_res: object, vehicle_type: str = "car") -> tuple[str, float]:
+    # one device-to-host copy for every box of the result
+    data = ocr_res.boxes.data.cpu().numpy()
+    return assemble_plate(group_chars(data, ocr_res.names), vehicle_type)
@@ -0,0 +1,144 @@
+import datetime
+import queue
+import threading
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+from plate_search import SEARCH_PROJECTION, utc_now
+from config import PLATE_FEED_POLL_INTERVAL, PLATE_FEED_LOOKBACK, PLATE_FEED_QUEUE_SIZE, PLATE_FEED_MAX_SUBSCRIBERS
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PlateFeed:
+    """Fans out plate records to subscriber queues as they are written.
+
+    Uses a MongoDB change stream when the server supports one (replica set
+    or sharded cluster), otherwise polls the collection by ``written_at``.
+    The poller looks back ``lookback`` seconds on every pass because
+    concurrent bulk writes become visible out of order; records already
+    sent with the same ``written_at`` are skipped. Records of reprocessed recordings (batch mode,
+    with a ``segment``) are not live traffic and are never published.
+    Every subscriber holds a server thread for as long as it is connected,
+    so at most ``max_subscribers`` are accepted.
+    """
+
+    def __init__(self, collection, poll_interval: float = PLATE_FEED_POLL_INTERVAL,
+                 lookback: float = PLATE_FEED_LOOKBACK, queue_size: int = PLATE_FEED_QUEUE_SIZE,
+                 max_subscribers: int = PLATE_FEED_MAX_SUBSCRIBERS):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.lookback = datetime.timedelta(seconds=lookback)
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.rejected = 0
+        self.mode = None
+        self.published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "PlateFeed":
+        self._thread = threading.Thread(target=self._run, name="plate-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def subscribe(self) -> queue.Queue:
+        """Event queue of a new subscriber, None when ``max_subscribers`` are already connected."""
+        q = queue.Queue(self.queue_size)
+        with self._lock:
+            if self.max_subscribers and len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, doc: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(doc)
+                    break
+                except queue.Full:
+                    # slow client: drop its oldest event rather than stall the others
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+        self.published += 1
+
+    def _run(self) -> None:
+        if hasattr(self.collection, "watch"):
+            try:
+                self.mode = "change_stream"
+                self._watch()
+                return
+            except PyMongoError as e:
+                logger.info(f"[PlateFeed] Change streams unavailable ({e}), polling instead")
+        self.mode = "poll"
+        self._poll()
+
+    def _watch(self) -> None:
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        with self.collection.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+            logger.info(f"[PlateFeed] Watching '{self.collection.name}' with a change stream")
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is None or not change.get("fullDocument") \
+                        or change["fullDocument"].get("segment") is not None:
+                    continue
+                doc = {k: v for k, v in change["fullDocument"].items() if k not in SEARCH_PROJECTION}
+                self.publish(doc)
+
+    def _poll(self) -> None:
+        logger.info(f"[PlateFeed] Polling '{self.collection.name}' every {self.poll_interval}s")
+        latest = next(iter(self.collection.find({}, {"written_at": 1}).sort("written_at", -1).limit(1)), None)
+        since = latest.get("written_at") if latest else None
+        since = since or utc_now()
+        # records already in the lookback window when the feed starts are not news
+        sent = {doc["_id"]: doc["written_at"]
+                for doc in self.collection.find({"written_at": {"$gt": since - self.lookback}}, {"written_at": 1})}
+        while not self._stop.wait(self.poll_interval):
+            try:
+                docs = list(
+                    self.collection.find({"written_at": {"$gt": since - self.lookback}}, SEARCH_PROJECTION)
+                    .sort([("written_at", ASCENDING), ("_id", ASCENDING)])
+                )
+            except Exception as e:
+                logger.error(f"[PlateFeed] Lỗi khi đọc bản ghi mới: {e}")
+                continue
+            for doc in docs:
+                if sent.get(doc["_id"]) == doc["written_at"] or doc.get("segment") is not None:
+                    continue
+                sent[doc["_id"]] = doc["written_at"]
+                since = max(since, doc["written_at"])
+                self.publish(doc)
+            horizon = since - self.lookback
+            sent = {k: ts for k, ts in sent.items() if ts > horizon}
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_plate_feed(collection=None) -> PlateFeed:
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            if collection is None:
+                from database import get_collection
+                collection = get_collection()
+            _feed = PlateFeed(collection).start()
+        return _feed
@@ -0,0 +1,94 @@
+import re
+import itertools
+from config import PLATE_CORRECTION_MAX_COST, PLATE_CORRECTION_MAX_EDITS
+import logging
+
+logger = logging.getLogger(__name__)
+
+_CAR_PATTERNS = [
+    r'\d{2}[A-Z0-9]{1,2}\d{4,5}',
+    r'\d{2}C\d{5}',
+    r'\d{2}[AB]\d{5}',
+    r'[A-Z]{2}\d{4,5}',
+    r'80NG\d{3}\d{2}',
+    r'80NN\d{3}\d{2}',
+    r'80QT\d{3}\d{2}',
+    r'80LD\d{3}\d{2}',
+    r'80CD\d{3}\d{2}',
+]
+
+# Vietnamese plate formats per vehicle type
+PLATE_PATTERNS = {
+    "car": _CAR_PATTERNS,
+    "motorcycle": [
+        r'\d{2}[A-Z]{1,2}\d?-?\d{4,5}',
+    ],
+    "bus": _CAR_PATTERNS[:3],
+    "truck": _CAR_PATTERNS[:3],
+}
+
+# one alternation per vehicle type, compiled at import
+_COMPILED = {
+    vehicle_type: re.compile("(?:" + "|".join(patterns) + ")")
+    for vehicle_type, patterns in PLATE_PATTERNS.items()
+}
+
+# Characters the OCR model mixes up, with the cost of swapping them.
+# Vietnamese plates never use I, O, Q or W, so those are always misreads.
+_CONFUSION_PAIRS = {
+    ("0", "O"): 0.5, ("0", "D"): 0.8, ("0", "Q"): 0.8, ("0", "U"): 1.0,
+    ("1", "I"): 0.5, ("1", "L"): 1.0, ("1", "T"): 1.0,
+    ("2", "Z"): 0.5,
+    ("4", "A"): 0.8,
+    ("5", "S"): 0.5,
+    ("6", "G"): 0.6,
+    ("7", "T"): 0.8,
+    ("8", "B"): 0.5, ("8", "S"): 1.0,
+}
+
+CONFUSIONS = {}
+for (a, b), cost in _CONFUSION_PAIRS.items():
+    CONFUSIONS.setdefault(a, []).append((b, cost))
+    CONFUSIONS.setdefault(b, []).append((a, cost))
+
+def _normalize(plate: str) -> str:
+    return (plate or "").upper().strip()
+
+def is_valid_plate(plate: str, vehicle_type: str = "car") -> bool:
+    pattern = _COMPILED.get((vehicle_type or "").lower())
+    return pattern is not None and pattern.fullmatch(_normalize(plate)) is not None
+
+def correct_plate(plate: str, vehicle_type: str = "car", max_cost: float = PLATE_CORRECTION_MAX_COST,
+                  max_edits: int = PLATE_CORRECTION_MAX_EDITS) -> tuple[str, float]:
+    """Nearest valid plate reachable by swapping commonly confused characters.
+
+    Returns ``(plate, cost)`` with cost 0 when the input is already valid,
+    or ``(None, inf)`` when no valid plate is within ``max_cost`` using at
+    most ``max_edits`` substitutions.
+    """
+    plate = _normalize(plate).replace("-", "")
+    pattern = _COMPILED.get((vehicle_type or "").lower())
+    if pattern is None or not plate:
+        return None, float("inf")
+    if pattern.fullmatch(plate):
+        return plate, 0.0
+
+    options = [(i, alt, cost) for i, ch in enumerate(plate) for alt, cost in CONFUSIONS.get(ch, ())]
+    candidates = []
+    for edits in range(1, max_edits + 1):
+        for combo in itertools.combinations(options, edits):
+            if len({i for i, _, _ in combo}) < edits:
+                continue
+            cost = sum(c for _, _, c in combo)
+            if cost <= max_cost:
+                candidates.append((cost, combo))
+    candidates.sort(key=lambda c: c[0])
+
+    for cost, combo in candidates:
+        chars = list(plate)
+        for i, alt, _ in combo:
+            chars[i] = alt
+        fixed = "".join(chars)
+        if pattern.fullmatch(fixed):
+            return fixed, cost
+    return None, float("inf")
@@ -0,0 +1,195 @@
+import re
+import base64
+import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from config import VEHICLE_CLASSES, SEARCH_PAGE_SIZE, SINCE_SETTLE_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# image bytes never leave the database through the search API
+SEARCH_PROJECTION = {"image_base64": 0}
+
+INDEXES = [
+    ([("timestamp", DESCENDING)], "timestamp_desc"),
+    ([("vehicle_type", ASCENDING), ("timestamp", DESCENDING)], "vehicle_type_timestamp"),
+    ([("track_id", ASCENDING), ("vehicle_type", ASCENDING)], "track_vehicle_type"),
+    ([("camera_id", ASCENDING), ("track_id", ASCENDING), ("vehicle_type", ASCENDING)], "camera_track_vehicle_type"),
+    ([("camera_id", ASCENDING), ("timestamp", DESCENDING)], "camera_timestamp"),
+    ([("plate_key", ASCENDING), ("timestamp", DESCENDING)], "plate_key_timestamp"),
+    # with expireAfterSeconds while RECORD_RETENTION_DAYS is set, see analytics.ensure_retention
+    ([("written_at", ASCENDING)], "written_at"),
+    ([("image_id", ASCENDING)], "image_id"),
+]
+
+def utc_now() -> datetime.datetime:
+    """Naive UTC, the form pymongo stores and reads back; ``written_at`` and the TTL on it use it."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def normalize_plate(text: str) -> str:
+    return re.sub(r'[^A-Z0-9]', '', (text or "").upper())
+
+def ensure_indexes(collection) -> None:
+    existing = collection.index_information()
+    for keys, name in INDEXES:
+        # an existing index keeps its options (the retention TTL on written_at)
+        if name not in existing:
+            collection.create_index(keys, name=name)
+    logger.info(f"[MongoDB] Ensured {len(INDEXES)} indexes on '{collection.name}'")
+    backfill_plate_keys(collection)
+    backfill_written_at(collection)
+
+def backfill_plate_keys(collection, batch_size: int = 1000) -> int:
+    ops, updated = [], 0
+    for doc in collection.find({"plate_key": {"$exists": False}}, {"plate": 1}):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"plate_key": normalize_plate(doc.get("plate"))}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    if updated:
+        logger.info(f"[MongoDB] Backfilled plate_key on {updated} records")
+    return updated
+
+def backfill_written_at(collection, batch_size: int = 1000) -> int:
+    """Stamps records written before ``written_at`` existed with their (local) timestamp, in UTC."""
+    ops, updated = [], 0
+    for doc in collection.find({"written_at": {"$exists": False}, "timestamp": {"$exists": True}}, {"timestamp": 1}):
+        written_at = doc["timestamp"].astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"written_at": written_at}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    if updated:
+        logger.info(f"[MongoDB] Backfilled written_at on {updated} records")
+    return updated
+
+def encode_cursor(doc: dict) -> str:
+    raw = f"{doc['timestamp'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+# ``since`` tokens follow ``written_at``, stamped by the bulk writer when it flushes a record. Several
+# writers flush concurrently, so a record may show up after one written later: ``since`` fetches stop
+# at records written ``SINCE_SETTLE_SECONDS`` ago, by which time everything older is visible.
+
+def settle_horizon() -> datetime.datetime:
+    return utc_now() - datetime.timedelta(seconds=SINCE_SETTLE_SECONDS)
+
+def encode_since(doc: dict) -> str:
+    return encode_cursor({"timestamp": doc.get("written_at") or doc["timestamp"], "_id": doc["_id"]})
+
+def settled_since() -> str:
+    """``since`` token covering every record already settled, for clients that have not fetched any yet."""
+    return encode_cursor({"timestamp": settle_horizon(), "_id": ObjectId("0" * 24)})
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, ObjectId]:
+    try:
+        ts, _id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(ts), ObjectId(_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+def build_query(search: str = "", vehicle_type: str = "", start: datetime.datetime = None,
+                end: datetime.datetime = None, exact: bool = False, cursor: str = None,
+                camera_id: str = None, since: str = None, lookback: float = 0, settled: bool = True) -> dict:
+    conditions = []
+
+    if camera_id:
+        conditions.append({"camera_id": camera_id})
+
+    if search:
+        key = normalize_plate(search)
+        plate_cond = {"plate_key": key} if exact else {"plate_key": {"$regex": f"^{re.escape(key)}"}}
+        if search.lower() in VEHICLE_CLASSES:
+            conditions.append({"$or": [plate_cond, {"vehicle_type": search.lower()}]})
+        elif key:
+            conditions.append(plate_cond)
+
+    if vehicle_type:
+        conditions.append({"vehicle_type": vehicle_type})
+
+    if start or end:
+        time_range = {}
+        if start:
+            time_range["$gte"] = start
+        if end:
+            time_range["$lt"] = end
+        conditions.append({"timestamp": time_range})
+
+    if cursor:
+        ts, _id = decode_cursor(cursor)
+        conditions.append({"$or": [
+            {"timestamp": {"$lt": ts}},
+            {"timestamp": ts, "_id": {"$lt": _id}},
+        ]})
+
+    if since:
+        ts, _id = decode_cursor(since)
+        # incremental fetches follow live traffic, reprocessed recordings are not part of it
+        conditions.append({"segment": None})
+        if lookback:
+            # the token came from the live feed, which sends records before they settle
+            conditions.append({"written_at": {"$gt": ts - datetime.timedelta(seconds=lookback)}})
+        else:
+            conditions.append({"$or": [
+                {"written_at": {"$gt": ts}},
+                {"written_at": ts, "_id": {"$gt": _id}},
+            ]})
+        if settled:
+            conditions.append({"written_at": {"$lte": settle_horizon()}})
+
+    return {"$and": conditions} if conditions else {}
+
+def find_plates(collection, search: str = "", vehicle_type: str = "", start: datetime.datetime = None,
+                end: datetime.datetime = None, exact: bool = False, cursor: str = None,
+                limit: int = SEARCH_PAGE_SIZE, camera_id: str = None):
+    """Database cursor over one page of results, newest first, with one extra record to detect a next page."""
+    query = build_query(search, vehicle_type, start, end, exact, cursor, camera_id)
+    return (
+        collection.find(query, SEARCH_PROJECTION)
+        .sort([("timestamp", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit + 1)
+        .batch_size(min(limit + 1, 101))
+    )
+
+def find_since(collection, since: str, search: str = "", vehicle_type: str = "", exact: bool = False,
+               limit: int = SEARCH_PAGE_SIZE, camera_id: str = None, lookback: float = 0, settled: bool = True):
+    query = build_query(search, vehicle_type, exact=exact, camera_id=camera_id, since=since, lookback=lookback,
+                        settled=settled)
+    return (
+        collection.find(query, SEARCH_PROJECTION)
+        .sort([("written_at", ASCENDING), ("_id", ASCENDING)])
+        .limit(limit)
+    )
+
+def search_plates(collection, search: str = "", vehicle_type: str = "", start: datetime.datetime = None,
+                  end: datetime.datetime = None, exact: bool = False, cursor: str = None,
+                  limit: int = SEARCH_PAGE_SIZE, camera_id: str = None) -> tuple[list, str]:
+    docs = list(find_plates(collection, search, vehicle_type, start, end, exact, cursor, limit, camera_id))
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+    return docs, next_cursor
+
+def search_since(collection, since: str, search: str = "", vehicle_type: str = "", exact: bool = False,
+                 limit: int = SEARCH_PAGE_SIZE, camera_id: str = None, lookback: float = 0,
+                 settled: bool = True) -> tuple[list, str]:
+    """Settled records written after the ``since`` token, oldest first.
+
+    Returns the records and the token to pass as ``since`` next time. With
+    ``lookback`` the records of the last ``lookback`` seconds before the
+    token are returned again, to be deduplicated by id; ``settled=False``
+    also returns records too recent to have settled, for callers that
+    follow the live feed afterwards.
+    """
+    docs = list(find_since(collection, since, search, vehicle_type, exact, limit, camera_id, lookback, settled))
+    return docs, encode_since(docs[-1]) if docs else since
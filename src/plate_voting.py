@@ -0,0 +1,118 @@
+import cv2
+import numpy as np
+from collections import defaultdict
+from config import (
+    OCR_MAX_ATTEMPTS, OCR_MAX_READINGS, OCR_MIN_READINGS, OCR_RETRY_INTERVAL,
+    PLATE_CONSENSUS_THRESHOLD, PLATE_RETRY_QUALITY_RATIO,
+)
+from plate_format import is_valid_plate, correct_plate
+import logging
+
+logger = logging.getLogger(__name__)
+
+INVALID_READINGS = {"N/A", "None1", "None4", "None6", ""}
+
+def frame_quality(vehicle_crop: np.ndarray, vehicle_conf: float = 1.0) -> float:
+    if vehicle_crop is None or vehicle_crop.size == 0:
+        return 0.0
+    h, w = vehicle_crop.shape[:2]
+    scale = min(1.0, 128.0 / max(w, 1))
+    small = cv2.resize(vehicle_crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else vehicle_crop
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    sharpness = cv2.Laplacian(gray, cv2.CV_32F).var()
+    return float(np.sqrt(w * h) * np.log1p(sharpness) * vehicle_conf)
+
+class PlateVote:
+    """Plate readings of one track, combined by character-level weighted voting.
+
+    OCR is requested until the voted text reaches ``threshold`` consensus
+    over at least ``min_readings`` readings, or ``max_attempts`` OCR calls
+    have been spent on the track. A ``cached`` reading (a plate cache hit
+    on a near-identical crop) is neither a vote nor an attempt: a parked
+    vehicle would otherwise spend its whole budget on the first reading.
+    """
+
+    def __init__(self, max_attempts: int = OCR_MAX_ATTEMPTS, max_readings: int = OCR_MAX_READINGS,
+                 min_readings: int = OCR_MIN_READINGS, threshold: float = PLATE_CONSENSUS_THRESHOLD):
+        self.max_attempts = max_attempts
+        self.max_readings = max_readings
+        self.min_readings = min_readings
+        self.threshold = threshold
+        self.readings = []
+        self.attempts = 0
+        self.cached = 0
+        self.best_quality = 0.0
+        self.last_attempt_frame = None
+        self.text = None
+        self.confidence = 0.0
+        self.consensus = 0.0
+        self.done = False
+
+    def wants_ocr(self, quality: float, frame_idx: int = None) -> bool:
+        if self.done or self.attempts >= self.max_attempts:
+            return False
+        if self.attempts == 0:
+            return True
+        if frame_idx is not None and self.last_attempt_frame is not None \
+                and frame_idx - self.last_attempt_frame < OCR_RETRY_INTERVAL:
+            return False
+        return quality >= self.best_quality * PLATE_RETRY_QUALITY_RATIO
+
+    def mark_attempt(self, frame_idx: int = None) -> None:
+        self.last_attempt_frame = frame_idx
+
+    def add_reading(self, plate_text: str, ocr_conf: float, quality: float, vehicle_type: str = "car",
+                    cached: bool = False) -> None:
+        if cached:
+            # the text of an earlier reading of the same crop, no new evidence
+            self.cached += 1
+            return
+        self.attempts += 1
+        self.best_quality = max(self.best_quality, quality)
+        if plate_text not in INVALID_READINGS:
+            self.readings.append((plate_text.replace("-", ""), ocr_conf, quality))
+            # keep the best frames only
+            self.readings.sort(key=lambda r: r[1] * r[2], reverse=True)
+            del self.readings[self.max_readings:]
+            self.text, self.confidence, self.consensus = self.vote(vehicle_type)
+
+        if self.text is not None and len(self.readings) >= self.min_readings and self.consensus >= self.threshold:
+            self.done = True
+        elif self.attempts >= self.max_attempts:
+            self.done = True
+
+    def vote(self, vehicle_type: str = "car") -> tuple[str, float, float]:
+        if not self.readings:
+            return None, 0.0, 0.0
+        max_quality = max(r[2] for r in self.readings) or 1.0
+        weighted = [(text, conf, conf * (quality / max_quality)) for text, conf, quality in self.readings]
+        total_weight = sum(w for _, _, w in weighted)
+        if total_weight <= 0:
+            text, conf, _ = self.readings[0]
+            return text, conf, 0.0
+
+        length_weight = defaultdict(float)
+        for text, _, w in weighted:
+            length_weight[len(text)] += w
+        length = max(length_weight, key=length_weight.get)
+        group = [(text, conf, w) for text, conf, w in weighted if len(text) == length]
+        group_weight = length_weight[length]
+
+        chars = []
+        agreement = 1.0
+        for pos in range(length):
+            votes = defaultdict(float)
+            for text, _, w in group:
+                votes[text[pos]] += w
+            char = max(votes, key=votes.get)
+            chars.append(char)
+            agreement = min(agreement, votes[char] / group_weight)
+
+        text = "".join(chars)
+        if not is_valid_plate(text, vehicle_type):
+            # mixing readings produced an impossible plate: fix confused characters,
+            # or else trust the best single reading
+            text = correct_plate(text, vehicle_type)[0] or max(group, key=lambda r: r[2])[0]
+        agreeing = [conf for t, conf, _ in group if t == text]
+        conf = sum(agreeing) / len(agreeing) if agreeing else sum(c for _, c, _ in group) / len(group)
+        return text, conf, agreement * group_weight / total_weight
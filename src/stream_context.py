@@ -0,0 +1,39 @@
+import datetime
+from track_store import TrackStore
+from detections import RoiFilter
+import logging
+
+logger = logging.getLogger(__name__)
+
+class StreamContext:
+    """Tracker and track state of one camera.
+
+    Each camera handled by the same process gets its own context so track
+    ids and plate votes of different streams never mix; the models stay
+    shared. ``tracker`` is a per-stream ByteTrack instance, None means the
+    tracker built into the shared vehicle model (single-stream mode).
+    ``segment`` names the part of a recording being processed (batch mode),
+    it is part of the record key so track ids of different segments of the
+    same camera never collide, and ``recorded_at`` is the wall-clock time
+    the recording starts, records are stamped with the time they were
+    filmed instead of the time they were processed. ``on_result`` receives
+    every stored result. ``roi`` is the camera's ROI polygon (or a ready
+    ``RoiFilter``).
+    """
+
+    def __init__(self, camera_id: str = None, tracker: object = None, tracks: TrackStore = None,
+                 segment: str = None, on_result=None, roi=None, recorded_at: datetime.datetime = None):
+        self.camera_id = camera_id
+        self.tracker = tracker
+        self.tracks = tracks if tracks is not None else TrackStore()
+        self.segment = segment
+        self.recorded_at = recorded_at
+        self.on_result = on_result
+        self.roi = roi if isinstance(roi, RoiFilter) else RoiFilter(roi) if roi else RoiFilter()
+
+    @property
+    def scope(self) -> tuple:
+        """What track ids are unique within: every stream and batch segment has its own tracker."""
+        return self.camera_id, self.segment
+
+default_context = StreamContext()
@@ -0,0 +1,98 @@
+import argparse
+import json
+import multiprocessing
+import threading
+from config import CAMERAS_CONFIG, METRICS_PORT
+from metrics import start_metrics_server
+from models import warmup
+from stream_context import StreamContext
+from video_processor import process_video
+from vehicle_detection import create_tracker
+from database import close_writer, get_client
+from main import setup_logging, init_database
+import logging
+
+logger = logging.getLogger(__name__)
+
+def load_cameras(path: str = CAMERAS_CONFIG) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    cameras = data["cameras"] if isinstance(data, dict) else data
+    seen = set()
+    for i, cam in enumerate(cameras):
+        if "source" not in cam:
+            raise ValueError(f"Camera #{i} in {path} has no 'source'")
+        cam.setdefault("camera_id", f"cam{i + 1}")
+        if cam["camera_id"] in seen:
+            raise ValueError(f"Duplicate camera_id '{cam['camera_id']}' in {path}")
+        seen.add(cam["camera_id"])
+    return cameras
+
+def run_camera(cam: dict) -> None:
+    ctx = StreamContext(camera_id=cam["camera_id"], tracker=create_tracker(cam.get("frame_rate", 30)), roi=cam.get("roi"))
+    logger.info(f"[Stream {ctx.camera_id}] Start {cam['source']}")
+    try:
+        process_video(cam["source"], cam.get("output"), cam.get("drop_policy"), ctx)
+    except Exception as e:
+        logger.error(f"[Stream {ctx.camera_id}] Lỗi: {e}")
+    logger.info(f"[Stream {ctx.camera_id}] End")
+
+def run_threads(cameras: list[dict]) -> None:
+    # load the models before the streams start, not on their first frames
+    warmup()
+    # one thread per camera, models and the Mongo writer are shared
+    threads = [threading.Thread(target=run_camera, args=(cam,), name=cam["camera_id"], daemon=True) for cam in cameras]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            t.join()
+    finally:
+        close_writer()
+
+def _run_group(cameras: list[dict], metrics_port: int = None) -> None:
+    setup_logging()
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    run_threads(cameras)
+
+def run_streams(cameras: list[dict], processes: int = 1) -> None:
+    processes = max(1, min(processes, len(cameras)))
+    if processes == 1:
+        run_threads(cameras)
+        return
+
+    # each process loads its own models and serves its share of the cameras
+    groups = [cameras[i::processes] for i in range(processes)]
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=_run_group, args=(group, METRICS_PORT and METRICS_PORT + i + 1), name=f"streams-{i}")
+        for i, group in enumerate(groups)
+    ]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run LPR on several cameras at once")
+    parser.add_argument("--config", default=CAMERAS_CONFIG, help="JSON list of cameras")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="worker processes, cameras are spread across them (default: 1, all threads)")
+    args = parser.parse_args()
+
+    cameras = load_cameras(args.config)
+    init_database()
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    logger.info(f"==============>>>>>Start LPR on {len(cameras)} cameras<<<<<===============")
+    try:
+        run_streams(cameras, args.processes)
+    finally:
+        close_writer()
+        get_client().close()
+    logger.info("==============>>>>>End LPR<<<<<===============")
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
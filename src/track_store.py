@@ -0,0 +1,115 @@
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from config import TRACK_MAX_ENTRIES, TRACK_TTL, TRACK_MAX_MISSING_FRAMES
+from plate_voting import PlateVote
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TrackState:
+    def __init__(self, track_id: int, frame_idx: int = None):
+        self.track_id = track_id
+        self.vehicle_type = None
+        self.vote = PlateVote()
+        self.pending = False
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        self.last_frame = frame_idx
+        self.last_reading = None
+        # snapshot of the best frame that went through OCR, used for the final record
+        self.best_img = None
+        self.best_quality = -1.0
+        self.vehicle_conf = 0.0
+
+    def keep_snapshot(self, vehicle_img: np.ndarray, quality: float, vehicle_conf: float) -> None:
+        if quality > self.best_quality and vehicle_img is not None and vehicle_img.size > 0:
+            # copy: the crop is a view into a frame that is about to be released
+            self.best_img = np.ascontiguousarray(vehicle_img).copy()
+            self.best_quality = quality
+            self.vehicle_conf = vehicle_conf
+
+class TrackStore:
+    """Per-stream track states, bounded in size and evicted when tracks go stale.
+
+    A track is closed when it has not been seen for ``max_missing_frames``
+    frames or ``ttl`` seconds, or when the store exceeds ``max_entries``
+    (least recently seen first). ``on_close`` receives every closed track.
+    Tracks with an OCR request in flight are never closed that way, their
+    last reading is still to come.
+    """
+
+    def __init__(self, max_entries: int = TRACK_MAX_ENTRIES, ttl: float = TRACK_TTL,
+                 max_missing_frames: int = TRACK_MAX_MISSING_FRAMES, on_close=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_missing_frames = max_missing_frames
+        self.on_close = on_close
+        self.closed = 0
+        self._tracks = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def __contains__(self, track_id: int) -> bool:
+        return track_id in self._tracks
+
+    def get(self, track_id: int) -> TrackState:
+        return self._tracks.get(track_id)
+
+    def touch(self, track_id: int, frame_idx: int = None) -> TrackState:
+        with self._lock:
+            state = self._tracks.get(track_id)
+            if state is None:
+                while len(self._tracks) >= self.max_entries and self._evict_oldest():
+                    pass
+                state = self._tracks[track_id] = TrackState(track_id, frame_idx)
+            else:
+                self._tracks.move_to_end(track_id)
+                state.last_seen = time.time()
+                if frame_idx is not None:
+                    state.last_frame = frame_idx
+            return state
+
+    def _evict_oldest(self) -> bool:
+        oldest = next((tid for tid, state in self._tracks.items() if not state.pending), None)
+        if oldest is None:
+            # every track waits on OCR: grow past max_entries until one comes back
+            return False
+        self._close(oldest)
+        return True
+
+    def _is_stale(self, state: TrackState, frame_idx: int, now: float) -> bool:
+        if self.ttl and now - state.last_seen > self.ttl:
+            return True
+        return (frame_idx is not None and state.last_frame is not None
+                and frame_idx - state.last_frame > self.max_missing_frames)
+
+    def evict_stale(self, frame_idx: int = None, now: float = None) -> list[TrackState]:
+        now = time.time() if now is None else now
+        closed = []
+        with self._lock:
+            # entries are ordered by last sighting, stop at the first fresh one
+            for track_id, state in list(self._tracks.items()):
+                if not self._is_stale(state, frame_idx, now):
+                    break
+                if state.pending:
+                    continue
+                closed.append(self._close(track_id))
+        return closed
+
+    def close_all(self) -> list[TrackState]:
+        with self._lock:
+            return [self._close(track_id) for track_id in list(self._tracks)]
+
+    def _close(self, track_id: int) -> TrackState:
+        state = self._tracks.pop(track_id)
+        self.closed += 1
+        if self.on_close is not None:
+            try:
+                self.on_close(state)
+            except Exception as e:
+                logger.error(f"[TrackStore] Lỗi khi đóng track {track_id}: {e}")
+        return state
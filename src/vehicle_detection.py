@@ -1,88 +1,190 @@
 import cv2
+import datetime
+import threading
 import numpy as np
-from ultralytics import YOLO
-from config import MODEL_VEHICLE_PATH, VEHICLE_CLASSES, vehicle_plates, track_classes
-from ocr import detect_plate_from_vehicle
+import torch
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+from config import VEHICLE_CLASSES, TRACKER_CONFIG, PERSIST_MODE, MODEL_DEVICE
+from models import get_model
+from stream_context import StreamContext, default_context
+from ocr import detect_plate_from_vehicle, detect_plates_batch
 from database import save_to_mongo
-from utils import draw_label, in_rectangle
+from utils import draw_label
+from plate_voting import frame_quality, INVALID_READINGS
+from watchlist import get_watchlist
+from track_store import TrackState
+from detections import Detection, DetectionBatch
+from metrics import STAGE_SECONDS
 import logging
 
 logger = logging.getLogger(__name__)
 
-model_vehicle = YOLO(MODEL_VEHICLE_PATH)  # Có thể thêm .to('cuda') nếu dùng GPU
-vehicle_class_ids = [k for k, v in model_vehicle.names.items() if v in VEHICLE_CLASSES]
-
-def detect_vehicles(frame: np.ndarray) -> list:
-    return model_vehicle.track(
-        source=frame,
-        conf=0.6,
-        iou=0.6,
-        device='cpu',
-        persist=True,
-        verbose=False
-    )
+# the model is shared by every stream of the process
+vehicle_lock = threading.Lock()
+
+def vehicle_names() -> dict:
+    return get_model("vehicle").names
+
+def create_tracker(frame_rate: int = 30) -> BYTETracker:
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(TRACKER_CONFIG)))
+    return BYTETracker(args=cfg, frame_rate=frame_rate)
+
+def detect_vehicles(frame: np.ndarray, ctx: StreamContext = None) -> list:
+    if ctx is None or ctx.tracker is None:
+        model = get_model("vehicle")
+        with vehicle_lock, STAGE_SECONDS.time(stage="vehicle_detection"):
+            return model.track(
+                source=frame,
+                conf=0.6,
+                iou=0.6,
+                device=MODEL_DEVICE,
+                persist=True,
+                verbose=False
+            )
 
-def is_person_on_motorcycle(person_box: tuple, motorcycle_box: tuple, iou_thresh: float = 0.5) -> bool:
-    x1 = max(person_box[0], motorcycle_box[0])
-    y1 = max(person_box[1], motorcycle_box[1])
-    x2 = min(person_box[2], motorcycle_box[2])
-    y2 = min(person_box[3], motorcycle_box[3])
-    inter_area = max(0, x2 - x1) * max(0, y2 - y1)
-    person_area = (person_box[2] - person_box[0]) * (person_box[3] - person_box[1])
-    motorcycle_area = (motorcycle_box[2] - motorcycle_box[0]) * (motorcycle_box[3] - motorcycle_box[1])
-    union_area = person_area + motorcycle_area - inter_area
-    if union_area == 0:
-        return False
-    iou = inter_area / union_area
-    return iou > iou_thresh
-
-def process_vehicle(frame: np.ndarray, frame_clone: np.ndarray, box: object, track_id: int) -> tuple[np.ndarray, dict]:
-    cls_id = int(box.cls[0])
-    vehicle_type = model_vehicle.names[cls_id]
-
-    if track_id in track_classes:
-        prev_type = track_classes[track_id]
+    # same steps as ultralytics' track(persist=True), with the stream's own tracker
+    model = get_model("vehicle")
+    with vehicle_lock, STAGE_SECONDS.time(stage="vehicle_detection"):
+        results = model.predict(source=frame, conf=0.6, iou=0.6, device=MODEL_DEVICE, verbose=False)
+    for i, result in enumerate(results):
+        tracks = ctx.tracker.update(result.boxes.cpu().numpy(), frame)
+        if len(tracks) == 0:
+            continue
+        idx = tracks[:, -1].astype(int)
+        results[i] = result[idx]
+        results[i].update(boxes=torch.as_tensor(tracks[:, :-1]))
+    return results
+
+def resolve_vehicle_type(vehicle_type: str, state: TrackState) -> str:
+
+    if state.vehicle_type is not None:
+        prev_type = state.vehicle_type
         if prev_type == "motorcycle" and vehicle_type == "person":
-            return frame, None
+            return None
         if prev_type == "person" and vehicle_type == "motorcycle":
             vehicle_type = "person"
-    track_classes[track_id] = vehicle_type
+    state.vehicle_type = vehicle_type
 
-    if cls_id not in vehicle_class_ids:
-        return frame, None
+    if vehicle_type not in VEHICLE_CLASSES:
+        return None
+    return vehicle_type
+
+def prepare_vehicle(frame_clone: np.ndarray, det: Detection, ctx: StreamContext = default_context,
+                    frame_idx: int = None) -> dict:
+    if det.track_id < 0:
+        # not (yet) confirmed by the tracker: every such box shares id -1, voting on it would mix vehicles
+        return None
+    state = ctx.tracks.touch(det.track_id, frame_idx)
+    vehicle_type = resolve_vehicle_type(det.name, state)
+    if vehicle_type is None:
+        return None
 
-    vx1, vy1, vx2, vy2 = box.xyxy[0].cpu().numpy().astype(int)
-    vehicle_crop = frame[vy1:vy2, vx1:vx2]
-    vehicle_crop_clone = frame_clone[vy1:vy2, vx1:vx2]
-    conf_vehicle = float(box.conf[0].cpu().numpy())
+    vx1, vy1, vx2, vy2 = det.box
+    vehicle_crop = frame_clone[vy1:vy2, vx1:vx2]
+    conf_vehicle = det.conf
+    return {
+        "ctx": ctx,
+        "track": state,
+        "track_id": det.track_id,
+        "box": (vx1, vy1, vx2, vy2),
+        "vehicle_img": vehicle_crop,
+        "vehicle_type": vehicle_type,
+        "vehicle_conf": conf_vehicle,
+        "quality": 0.0 if state.vote.done else frame_quality(vehicle_crop, conf_vehicle),
+    }
 
-    plate_text_final = vehicle_plates.get(track_id)
-    plate_ocr_conf = 0.0
+def build_result(job: dict, plate_text: str, plate_ocr_conf: float, cached: bool = False) -> dict:
+    state = job["track"]
+    if not plate_text:
+        plate_text = "None6"
+    vote = state.vote
+    previous = vote.text
+    vote.add_reading(plate_text, plate_ocr_conf, job["quality"], job["vehicle_type"], cached)
+    state.last_reading = (plate_text, plate_ocr_conf)
+    state.keep_snapshot(job["vehicle_img"], job["quality"], job["vehicle_conf"])
+    watchlist = get_watchlist()
+    if watchlist is not None:
+        # alert on the raw reading and on the voted text, before anything is stored
+        readings = {text for text in (plate_text, vote.text) if text and text not in INVALID_READINGS}
+        watchlist.check(readings, job["ctx"].camera_id, job["track_id"], job["vehicle_type"])
+    if PERSIST_MODE == "on_close":
+        # stored once by final_result when the track closes
+        return None
+    if (cached or vote.attempts > 1) and vote.text == previous:
+        # nothing new to store for this track
+        return None
+    if vote.text is not None:
+        plate_text, plate_ocr_conf = vote.text, vote.confidence
+    return {
+        "camera_id": job["ctx"].camera_id,
+        "track_id": job["track_id"],
+        "frame_idx": state.last_frame,
+        "vehicle_img": job["vehicle_img"],
+        # the crop is a view into this pooled frame, see video_io.FrameRef
+        "frame": job.get("frame"),
+        "plate_text": plate_text,
+        "vehicle_type": job["vehicle_type"],
+        "vehicle_conf": job["vehicle_conf"],
+        "ocr_conf": plate_ocr_conf
+    }
+
+def final_result(ctx: StreamContext, state: TrackState) -> dict:
+    if state.best_img is None or state.last_reading is None:
+        # the track never went through OCR
+        return None
+    vote = state.vote
+    plate_text, plate_ocr_conf = (vote.text, vote.confidence) if vote.text else state.last_reading
+    return {
+        "camera_id": ctx.camera_id,
+        "track_id": state.track_id,
+        "frame_idx": state.last_frame,
+        "vehicle_img": state.best_img,
+        "plate_text": plate_text,
+        "vehicle_type": state.vehicle_type,
+        "vehicle_conf": state.vehicle_conf,
+        "ocr_conf": plate_ocr_conf,
+        "extra": {
+            "first_seen": datetime.datetime.fromtimestamp(state.first_seen),
+            "last_seen": datetime.datetime.fromtimestamp(state.last_seen),
+            "ocr_attempts": vote.attempts,
+            "plate_consensus": vote.consensus,
+        },
+    }
+
+def recognize_vehicle(job: dict) -> dict:
+    plate_text, plate_ocr_conf, cached = "None6", 0.0, False
+    if job["vehicle_img"].size > 0:
+        plate_text, plate_ocr_conf, cached = detect_plate_from_vehicle(
+            job["track_id"], job["vehicle_img"], job["vehicle_type"], job["ctx"].scope
+        )
+    return build_result(job, plate_text, plate_ocr_conf, cached)
+
+def recognize_vehicles(jobs: list[dict]) -> list[dict]:
+    if not jobs:
+        return []
+    # the jobs of one OCR batch come from the same pipeline, hence the same stream
+    plates = detect_plates_batch(
+        [(job["track_id"], job["vehicle_img"], job["vehicle_type"]) for job in jobs], jobs[0]["ctx"].scope
+    )
+    results = [build_result(job, *plate) for job, plate in zip(jobs, plates)]
+    return [result for result in results if result is not None]
+
+def process_vehicle(frame: np.ndarray, frame_clone: np.ndarray, box: object, track_id: int, frame_idx: int = None,
+                    ctx: StreamContext = default_context) -> tuple[np.ndarray, dict]:
+    det = next(iter(DetectionBatch.from_boxes(box, vehicle_names())))._replace(track_id=track_id)
+    job = prepare_vehicle(frame_clone, det, ctx, frame_idx)
+    if job is None:
+        if det.track_id < 0:
+            draw_label(frame, det.box, None, (track_id, det.conf))
+        return frame, None
 
     result = None
-    if plate_text_final is None and vehicle_crop.size > 0:
-        plate_text_detected, plate_ocr_conf = detect_plate_from_vehicle(track_id, vehicle_crop, vehicle_type)
-        if plate_text_detected:
-            plate_text_final = plate_text_detected
-            vehicle_plates[track_id] = plate_text_final
-            result = {
-                "track_id": track_id,
-                "vehicle_img": vehicle_crop_clone,
-                "plate_text": plate_text_final,
-                "vehicle_type": vehicle_type,
-                "vehicle_conf": conf_vehicle,
-                "ocr_conf": plate_ocr_conf
-            }
-        else:
-            vehicle_plates[track_id] = None
-            result = {
-                "track_id": track_id,
-                "vehicle_img": vehicle_crop_clone,
-                "plate_text": "None6",
-                "vehicle_type": vehicle_type,
-                "vehicle_conf": conf_vehicle,
-                "ocr_conf": plate_ocr_conf
-            }
-
-    draw_label(frame, (vx1, vy1, vx2, vy2), plate_text_final, (track_id, conf_vehicle))
-    return frame, result
\ No newline at end of file
+    vote = job["track"].vote
+    if vote.wants_ocr(job["quality"], frame_idx):
+        vote.mark_attempt(frame_idx)
+        result = recognize_vehicle(job)
+
+    draw_label(frame, job["box"], vote.text, (track_id, job["vehicle_conf"]))
+    return frame, result
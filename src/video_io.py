@@ -0,0 +1,136 @@
+import cv2
+import threading
+import numpy as np
+from config import FRAME_POOL_SIZE, FRAME_POOL_TIMEOUT, OUTPUT_SCALE, OUTPUT_FRAME_STRIDE, OUTPUT_FOURCC
+from utils import draw_label
+import logging
+
+logger = logging.getLogger(__name__)
+
+class FrameRef:
+    """Reference-counted handle on a pooled frame buffer.
+
+    Whoever keeps a view into ``image`` past the current stage (an OCR job,
+    a pending persist, the encoder) calls ``retain`` and later ``release``;
+    the buffer goes back to the pool when the count drops to zero.
+    """
+
+    __slots__ = ("pool", "slot", "image", "_refs")
+
+    def __init__(self, pool: "FramePool", slot: int, image: np.ndarray):
+        self.pool = pool
+        self.slot = slot
+        self.image = image
+        self._refs = 1
+
+    def retain(self) -> "FrameRef":
+        with self.pool._lock:
+            self._refs += 1
+        return self
+
+    def release(self) -> None:
+        with self.pool._lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+            if self.slot is not None:
+                self.pool._free.append(self.slot)
+                self.pool._available.notify()
+
+class FramePool:
+    """Reusable frame buffers, allocated on demand up to ``size``.
+
+    When every buffer is in use ``acquire`` waits up to ``timeout`` seconds
+    for one to come back, then hands out a one-off buffer instead of
+    stalling the decoder.
+    """
+
+    def __init__(self, size: int = FRAME_POOL_SIZE, timeout: float = FRAME_POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.overflow = 0
+        self._buffers = []
+        self._free = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+    def in_use(self) -> int:
+        with self._lock:
+            return len(self._buffers) - len(self._free)
+
+    def acquire(self) -> FrameRef:
+        with self._lock:
+            if not self._free and len(self._buffers) < self.size:
+                self._buffers.append(None)
+                self._free.append(len(self._buffers) - 1)
+            if not self._free:
+                self._available.wait_for(lambda: self._free, self.timeout)
+            if not self._free:
+                self.overflow += 1
+                return FrameRef(self, None, None)
+            slot = self._free.pop()
+            return FrameRef(self, slot, self._buffers[slot])
+
+    def store(self, ref: FrameRef, image: np.ndarray) -> None:
+        # the decoder reallocates when the stream changes resolution, keep the new buffer
+        ref.image = image
+        if ref.slot is not None:
+            self._buffers[ref.slot] = image
+
+class FrameReader:
+    """Decodes ``cap`` into pooled buffers, yielding ``(frame_idx, FrameRef)``.
+
+    With ``end`` (seconds) decoding stops at the first frame stamped at or
+    after it, the next segment starts there.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, pool: FramePool, end: float = None):
+        self.cap = cap
+        self.pool = pool
+        self.end = end
+
+    def __iter__(self):
+        frame_idx = 0
+        while True:
+            ref = self.pool.acquire()
+            ok, image = self.cap.read(ref.image) if ref.image is not None else self.cap.read()
+            if not ok or (self.end is not None and self.cap.get(cv2.CAP_PROP_POS_MSEC) >= self.end * 1000 - 0.5):
+                ref.release()
+                break
+            if image is not ref.image:
+                self.pool.store(ref, image)
+            yield frame_idx, ref
+            frame_idx += 1
+
+class AnnotatedWriter:
+    """Writes every ``stride``-th frame, scaled by ``scale``, with the track labels drawn on.
+
+    ``write`` runs on the encode stage, the hot path only hands over the
+    frame reference and the labels.
+    """
+
+    def __init__(self, path: str, fps: float, frame_size: tuple, scale: float = OUTPUT_SCALE,
+                 stride: int = OUTPUT_FRAME_STRIDE, fourcc: str = OUTPUT_FOURCC):
+        self.scale = scale
+        self.stride = max(1, stride)
+        self.size = (max(int(frame_size[0] * scale), 1), max(int(frame_size[1] * scale), 1))
+        self.written = 0
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps / self.stride, self.size)
+
+    def wants(self, frame_idx: int) -> bool:
+        return frame_idx % self.stride == 0
+
+    def write(self, image: np.ndarray, labels: list) -> None:
+        if self.scale != 1.0:
+            canvas = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+        else:
+            # never draw on the pooled buffer, crops of it may still be waiting for OCR
+            canvas = image.copy()
+        for box, plate_text, track_id, vehicle_conf in labels:
+            scaled = tuple(int(v * self.scale) for v in box)
+            draw_label(canvas, scaled, plate_text, (track_id, vehicle_conf))
+        self._writer.write(canvas)
+        self.written += 1
+
+    def release(self) -> None:
+        self._writer.release()
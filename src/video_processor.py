@@ -1,128 +1,200 @@
 import cv2
-import time
-import queue
-import concurrent.futures
-from vehicle_detection import detect_vehicles, process_vehicle, is_person_on_motorcycle, model_vehicle
+import datetime
+from vehicle_detection import detect_vehicles, prepare_vehicle, recognize_vehicles, final_result, vehicle_names
 from database import save_to_mongo
-from utils import in_rectangle
-from ocr import ocr_license_plate
-import numpy as np
-from config import track_classes
+from detections import filter_detections
+from pipeline import Pipeline, StageQueue
+from stream_context import StreamContext, default_context
+from motion_gate import MotionScheduler
+from metrics import ACTIVE_TRACKS
+from video_io import FramePool, FrameReader, AnnotatedWriter
+from config import (
+    PIPELINE_QUEUE_SIZE, PIPELINE_DROP_POLICY, OCR_WORKERS, OCR_BATCH_SIZE, OCR_BATCH_WINDOW,
+    PIPELINE_STATS_INTERVAL, PERSIST_MODE, MOTION_GATE_ENABLED,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
-ocr_queue = queue.Queue()
+def is_live_source(video_path: str) -> bool:
+    return str(video_path).isdigit() or str(video_path).lower().startswith(("rtsp://", "rtmp://", "http://", "https://"))
 
-def ocr_task(track_id: int, plate_crop: np.ndarray, vehicle_type: str) -> tuple[int, str, float]:
-    plate_crop_sharp = cv2.resize(plate_crop, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-    plate_text, conf = ocr_license_plate(track_id, plate_crop_sharp, vehicle_type)
-    if plate_text:
-        logger.info(f"[Background OCR] Track {track_id}: {plate_text} (conf={conf:.2f})")
-    return track_id, plate_text, conf
+def process_video(video_path: str, output_path: str, drop_policy: str = None,
+                  ctx: StreamContext = default_context, start: float = None, end: float = None) -> dict:
+    """Runs the pipeline over ``video_path``, or over ``start`` to ``end`` seconds of a recording.
 
-def process_video(video_path: str, output_path: str) -> None:
+    Returns the number of exceptions per pipeline stage (see ``Pipeline.errors``),
+    or None when the video cannot be opened.
+    """
     try:
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             logger.error("Không thể mở video/camera!")
-            return
+            return None
 
         frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = min(cap.get(cv2.CAP_PROP_FPS), 25)
-        out = cv2.VideoWriter(
-            output_path,
-            cv2.VideoWriter_fourcc(*'XVID'),
-            fps,
-            (frame_width, frame_height)
-        )
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                frame_clone = frame.copy()
-                start_vehicle = time.time()
-                vehicle_results = detect_vehicles(frame)
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        fps = min(source_fps, 25)
+        out = None
+        if output_path:
+            out = AnnotatedWriter(output_path, fps, (frame_width, frame_height))
+        pool = FramePool()
+
+        if drop_policy is None:
+            drop_policy = PIPELINE_DROP_POLICY
+        if drop_policy is None:
+            drop_policy = "drop_oldest" if is_live_source(video_path) else "block"
+
+        # frames travel as pooled FrameRefs, dropped ones go back to the pool
+        release_frame = lambda item: item[1].release()
+        frame_q = StageQueue("frames", PIPELINE_QUEUE_SIZE, drop_policy, on_drop=release_frame)
+        ocr_q = StageQueue("ocr", PIPELINE_QUEUE_SIZE)
+        persist_q = StageQueue("persist", PIPELINE_QUEUE_SIZE * 4)
+        encode_q = StageQueue("encode", PIPELINE_QUEUE_SIZE, drop_policy, on_drop=release_frame)
+
+        def close_track(state) -> None:
+            result = final_result(ctx, state)
+            if result is not None:
+                persist_q.put(result)
+
+        if PERSIST_MODE == "on_close":
+            ctx.tracks.on_close = close_track
+
+        scheduler = MotionScheduler() if MOTION_GATE_ENABLED else None
+        # (box, track_id, vehicle_conf) of the last detector run, carried over skipped frames
+        last_labels = []
+
+        def encode(frame_idx: int, ref) -> None:
+            if out is not None and out.wants(frame_idx):
+                # labels are drawn by the encoder, the hot path only snapshots them
+                labels = []
+                for box, track_id, vehicle_conf in last_labels:
+                    state = ctx.tracks.get(track_id) if track_id >= 0 else None
+                    labels.append((box, state.vote.text if state else None, track_id, vehicle_conf))
+                encode_q.put((frame_idx, ref.retain(), labels))
+
+        def track_stage(item: tuple) -> None:
+            frame_idx, ref = item
+            try:
+                frame = ref.image
+                if scheduler is not None and not scheduler.should_detect(frame, frame_idx):
+                    # static scene: keep the tracks alive, no detection and no OCR
+                    for _, track_id, _ in last_labels:
+                        if track_id >= 0:
+                            ctx.tracks.touch(track_id, frame_idx)
+                    ctx.tracks.evict_stale(frame_idx)
+                    encode(frame_idx, ref)
+                    return
+
+                vehicle_results = detect_vehicles(frame, ctx)
                 h, w, _ = frame.shape
 
+                last_labels.clear()
                 if vehicle_results:
-                    boxes = vehicle_results[0].boxes
-                    ids = boxes.id.cpu().numpy().astype(int) if boxes.id is not None else []
-
-                    motorcycles = []
-                    persons = []
-                    for i, box in enumerate(boxes):
-                        cls_id = int(box.cls[0])
-                        if model_vehicle.names[cls_id] == "motorcycle":
-                            motorcycles.append((i, box))
-                        elif model_vehicle.names[cls_id] == "person":
-                            persons.append((i, box))
-
-                    ignore_person_idx = set()
-                    for pid, pbox in persons:
-                        px1, py1, px2, py2 = pbox.xyxy[0].cpu().numpy().astype(int)
-                        for mid, mbox in motorcycles:
-                            mx1, my1, mx2, my2 = mbox.xyxy[0].cpu().numpy().astype(int)
-                            if is_person_on_motorcycle((px1, py1, px2, py2), (mx1, my1, mx2, my2)):
-                                ignore_person_idx.add(pid)
-
-                    futures = []
-                    results = []
-
-                    for i, box in enumerate(boxes):
-                        if i in ignore_person_idx:
-                            continue 
-
-                        track_id = int(ids[i]) if i < len(ids) else -1
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        if not in_rectangle(x1, y1, x2, y2, w, h, margin=10):
+                    detections = filter_detections(vehicle_results[0].boxes, w, h, vehicle_names(), ctx.roi)
+                    for det in detections:
+                        if det.track_id < 0:
+                            # untracked box: drawn, but it has no track to vote in
+                            last_labels.append((det.box, det.track_id, det.conf))
                             continue
-
-                        frame, result = process_vehicle(frame, frame_clone, box, track_id)
-                        if result:
-                            results.append(result)
-                            if result["plate_text"] is None:
-                                futures.append(
-                                    executor.submit(
-                                        ocr_task,
-                                        track_id,
-                                        result["vehicle_img"],
-                                        result["vehicle_type"], 
-                                    )
-                                )
-
-                    for result in results:
-                        save_to_mongo(
-                            result["track_id"],
-                            result["vehicle_img"],
-                            result["plate_text"],
-                            result["vehicle_type"],
-                            result["vehicle_conf"],
-                            result["ocr_conf"],
-                        )
-
-                    for future in concurrent.futures.as_completed(futures):
-                        track_id, plate_text, conf = future.result()
-                        if plate_text and plate_text != "N/A":
-                            save_to_mongo(
-                                track_id,
-                                frame_clone,
-                                plate_text,
-                                track_classes.get(track_id, "unknown"),
-                                0.0,
-                                conf,
-                            )
-
-                end_vehicle = time.time()
-                logger.info(f"[Vehicle Detection] Thời gian phát hiện xe: {end_vehicle - start_vehicle:.2f} giây")
-                out.write(frame)
+                        # crops are views into the pooled frame, no per-frame copy
+                        job = prepare_vehicle(frame, det, ctx, frame_idx)
+                        if job is None:
+                            continue
+                        state = job["track"]
+                        if not state.pending and state.vote.wants_ocr(job["quality"], frame_idx):
+                            state.pending = True
+                            state.vote.mark_attempt(frame_idx)
+                            job["frame"] = ref.retain()
+                            ocr_q.put(job)
+                        last_labels.append((job["box"], det.track_id, job["vehicle_conf"]))
+
+                ctx.tracks.evict_stale(frame_idx)
+                encode(frame_idx, ref)
+            finally:
+                ref.release()
+
+        def ocr_stage(jobs: list[dict]) -> None:
+            try:
+                results = recognize_vehicles(jobs)
+                for result in results:
+                    # persistence encodes the crop straight from the frame buffer
+                    if result.get("frame") is not None:
+                        result["frame"].retain()
+            finally:
+                for job in jobs:
+                    job["track"].pending = False
+                    job["frame"].release()
+            for result in results:
+                persist_q.put(result)
+
+        def persist_stage(result: dict) -> None:
+            timestamp = None
+            if ctx.recorded_at is not None:
+                # a recording: stamp the record with the time it was filmed
+                video_time = (start or 0) + (result.get("frame_idx") or 0) / source_fps
+                timestamp = ctx.recorded_at + datetime.timedelta(seconds=video_time)
+            try:
+                save_to_mongo(
+                    result["track_id"],
+                    result["vehicle_img"],
+                    result["plate_text"],
+                    result["vehicle_type"],
+                    result["vehicle_conf"],
+                    result["ocr_conf"],
+                    result["camera_id"],
+                    result.get("extra"),
+                    ctx.segment,
+                    timestamp,
+                )
+                if ctx.on_result is not None:
+                    ctx.on_result(result)
+            finally:
+                if result.get("frame") is not None:
+                    result["frame"].release()
+
+        def encode_stage(item: tuple) -> None:
+            _, ref, labels = item
+            try:
+                out.write(ref.image, labels)
+            finally:
+                ref.release()
+
+        pipeline = Pipeline(ctx.camera_id or str(video_path))
+        if start:
+            # batch segments start on a keyframe, so the seek does not decode ahead
+            cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+        pipeline.add_source("decode", FrameReader(cap, pool, end), frame_q)
+        pipeline.add_stage("track", track_stage, frame_q, outputs=(ocr_q, encode_q))
+        pipeline.add_stage(
+            "ocr", ocr_stage, ocr_q, outputs=(persist_q,), workers=OCR_WORKERS,
+            batch_size=OCR_BATCH_SIZE, batch_window=OCR_BATCH_WINDOW,
+            # flush the tracks still open once their last OCR results are in
+            on_stop=ctx.tracks.close_all,
+        )
+        pipeline.add_stage("persist", persist_stage, persist_q)
+        if out is not None:
+            pipeline.add_stage("encode", encode_stage, encode_q)
+
+        ACTIVE_TRACKS.set_function(lambda: len(ctx.tracks), stream=pipeline.name)
+        pipeline.start()
+        try:
+            errors = pipeline.join(stats_interval=PIPELINE_STATS_INTERVAL)
+        except KeyboardInterrupt:
+            pipeline.stop()
+            errors = pipeline.join()
 
         cap.release()
-        out.release()
+        if out is not None:
+            out.release()
+        ctx.tracks.on_close = None
+        ACTIVE_TRACKS.remove(stream=pipeline.name)
+        if pool.overflow:
+            logger.info(f"[VideoIO] Frame pool of {pool.size} was exhausted {pool.overflow} times")
+        if scheduler is not None:
+            logger.info(f"[Motion] Detector ran on {scheduler.detected} frames, skipped {scheduler.skipped}")
+        return errors
     except Exception as e:
         logger.error(f"Lỗi khi xử lý video: {str(e)}")
         raise
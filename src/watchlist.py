@@ -0,0 +1,261 @@
+import csv
+import datetime
+import os
+import queue
+import threading
+from plate_format import CONFUSIONS
+from plate_search import normalize_plate
+from ttl_cache import TTLCache
+from metrics import STAGE_SECONDS, WATCHLIST_ALERTS, WATCHLIST_ENTRIES
+from config import (
+    WATCHLIST_PATH, WATCHLIST_MAX_COST, WATCHLIST_RELOAD_INTERVAL, WATCHLIST_ALERT_COOLDOWN, WATCHLIST_QUEUE_SIZE,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# insertions and deletions cost 1, substitutions 1 unless the OCR confuses the pair
+_SUB_COSTS = {ch: dict(alts) for ch, alts in CONFUSIONS.items()}
+
+def plate_distance(a: str, b: str) -> float:
+    """Weighted Levenshtein distance where confused characters (0/O, 8/B, ...) are cheap to swap."""
+    prev = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        costs = _SUB_COSTS.get(ca, {})
+        row = [float(i)]
+        for j, cb in enumerate(b, 1):
+            sub = 0.0 if ca == cb else costs.get(cb, 1.0)
+            row.append(min(row[j - 1] + 1.0, prev[j] + 1.0, prev[j - 1] + sub))
+        prev = row
+    return prev[-1]
+
+def _deletions(plate: str, depth: int) -> set:
+    """``plate`` and every string obtained from it by up to ``depth`` deletions."""
+    keys = {plate}
+    level = {plate}
+    for _ in range(depth):
+        level = {s[:i] + s[i + 1:] for s in level for i in range(len(s))}
+        keys |= level
+    return keys
+
+def _confusion_variants(plate: str, budget: float, start: int = 0, cost: float = 0.0):
+    """Yields ``(variant, cost)`` for every set of confusion swaps on ``plate`` costing at most ``budget``."""
+    yield plate, cost
+    for i in range(start, len(plate)):
+        for alt, swap in CONFUSIONS.get(plate[i], ()):
+            if cost + swap <= budget:
+                yield from _confusion_variants(plate[:i] + alt + plate[i + 1:], budget, i + 1, cost + swap)
+
+class WatchlistIndex:
+    """Immutable index over normalized plates.
+
+    Exact hits are a dict lookup. For fuzzy hits every entry is also filed
+    under its deletion neighbourhood (all strings with up to ``max_cost``
+    deleted characters), and a query expands into its cheap OCR-confusion
+    variants plus their own deletions. Any entry within the cost budget
+    shares a key with one of those, so candidates come from a few dozen
+    dict lookups and only they are checked with ``plate_distance``.
+    """
+
+    def __init__(self, entries: dict, max_cost: float = WATCHLIST_MAX_COST):
+        self.depth = int(max_cost)
+        self.entries = {}
+        self._keys = {}
+        for plate, label in entries.items():
+            plate = normalize_plate(plate)
+            if not plate:
+                continue
+            self.entries[plate] = label
+            for key in _deletions(plate, self.depth):
+                # most keys belong to a single plate, keep those as a bare string
+                held = self._keys.get(key)
+                if held is None:
+                    self._keys[key] = plate
+                elif isinstance(held, str):
+                    self._keys[key] = [held, plate]
+                else:
+                    held.append(plate)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def match(self, plate: str, max_cost: float = WATCHLIST_MAX_COST) -> list[tuple[str, str, float]]:
+        """``(plate, label, cost)`` of the entries within ``max_cost`` of ``plate``, closest first.
+
+        Insertions, deletions and non-confusion swaps beyond the ``max_cost``
+        the index was built with are not searched.
+        """
+        plate = normalize_plate(plate)
+        if not plate:
+            return []
+        if plate in self.entries:
+            return [(plate, self.entries[plate], 0.0)]
+        if max_cost <= 0:
+            return []
+
+        candidates = set()
+        for variant, cost in _confusion_variants(plate, max_cost):
+            for key in _deletions(variant, min(int(max_cost - cost), self.depth)):
+                held = self._keys.get(key)
+                if held is None:
+                    continue
+                if isinstance(held, str):
+                    candidates.add(held)
+                else:
+                    candidates.update(held)
+        found = []
+        for entry in candidates:
+            cost = plate_distance(plate, entry)
+            if cost <= max_cost:
+                found.append((entry, self.entries[entry], cost))
+        found.sort(key=lambda m: m[2])
+        return found
+
+def read_watchlist(path: str) -> dict:
+    """Reads ``plate[,label]`` lines; blank lines and lines starting with ``#`` are skipped."""
+    entries = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                continue
+            entries[row[0].strip()] = row[1].strip() if len(row) > 1 else None
+    return entries
+
+class Watchlist:
+    """Matches recognized plates against a hotlist and raises alerts.
+
+    ``check`` is called from the OCR workers for every new reading. The
+    index is rebuilt off to the side when the watchlist file changes and
+    swapped in with a single assignment, so lookups never wait on a reload.
+    Alerts go to ``alerts`` (oldest dropped when nobody drains it) and to
+    every registered callback, at most once per track and entry within
+    ``cooldown`` seconds.
+    """
+
+    def __init__(self, path: str = WATCHLIST_PATH, max_cost: float = WATCHLIST_MAX_COST,
+                 reload_interval: float = WATCHLIST_RELOAD_INTERVAL, cooldown: float = WATCHLIST_ALERT_COOLDOWN,
+                 queue_size: int = WATCHLIST_QUEUE_SIZE):
+        self.path = path
+        self.max_cost = max_cost
+        self.reload_interval = reload_interval
+        self.alerts = queue.Queue(queue_size)
+        self.raised = 0
+        self._index = WatchlistIndex({}, max_cost)
+        self._mtime = None
+        self._callbacks = []
+        self._recent = TTLCache(maxsize=max(queue_size, 1) * 16, ttl=cooldown)
+        self._stop = threading.Event()
+        self._thread = None
+        WATCHLIST_ENTRIES.set_function(lambda: len(self._index))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def load(self, entries: dict) -> None:
+        index = WatchlistIndex(entries, self.max_cost)
+        self._index = index
+        logger.info(f"[Watchlist] {len(index)} plates loaded")
+
+    def reload(self) -> bool:
+        """Reloads the file when its modification time changed, returns whether it did."""
+        if not self.path:
+            return False
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return False
+            entries = read_watchlist(self.path)
+        except OSError as e:
+            logger.error(f"[Watchlist] Không đọc được {self.path}: {e}")
+            return False
+        self.load(entries)
+        self._mtime = mtime
+        return True
+
+    def start(self) -> "Watchlist":
+        self.reload()
+        if self.path and self.reload_interval:
+            self._thread = threading.Thread(target=self._watch_file, name="watchlist-reload", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.reload_interval + 1)
+
+    def _watch_file(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            self.reload()
+
+    def add_callback(self, callback) -> None:
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback) -> None:
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def match(self, plate: str) -> list[tuple[str, str, float]]:
+        return self._index.match(plate, self.max_cost)
+
+    def check(self, readings, camera_id: str = None, track_id: int = None, vehicle_type: str = None) -> list[dict]:
+        """Matches one reading or several (raw and voted text) of a track, returns the alerts raised."""
+        if isinstance(readings, str):
+            readings = (readings,)
+        index = self._index
+        if not len(index):
+            return []
+        raised = []
+        with STAGE_SECONDS.time(stage="watchlist"):
+            for reading in readings:
+                for plate, label, cost in index.match(reading, self.max_cost):
+                    key = (camera_id, track_id, plate)
+                    if self._recent.get(key) is not None:
+                        continue
+                    self._recent.set(key, True)
+                    raised.append({
+                        "plate": plate,
+                        "label": label,
+                        "reading": reading,
+                        "cost": cost,
+                        "match": "exact" if cost == 0 else "fuzzy",
+                        "camera_id": camera_id,
+                        "track_id": track_id,
+                        "vehicle_type": vehicle_type,
+                        "timestamp": datetime.datetime.now(),
+                    })
+        for alert in raised:
+            self._publish(alert)
+        return raised
+
+    def _publish(self, alert: dict) -> None:
+        self.raised += 1
+        WATCHLIST_ALERTS.inc(match=alert["match"])
+        logger.warning(f"[Watchlist] {alert['match']} match {alert['plate']} ({alert['label']}) "
+                       f"read as {alert['reading']} on camera {alert['camera_id']}, track {alert['track_id']}")
+        while True:
+            try:
+                self.alerts.put_nowait(alert)
+                break
+            except queue.Full:
+                try:
+                    self.alerts.get_nowait()
+                except queue.Empty:
+                    pass
+        for callback in list(self._callbacks):
+            try:
+                callback(alert)
+            except Exception as e:
+                logger.error(f"[Watchlist] Alert callback failed: {e}")
+
+_watchlist = None
+_watchlist_lock = threading.Lock()
+
+def get_watchlist() -> Watchlist:
+    """Process-wide watchlist, or None when ``WATCHLIST_PATH`` is not set."""
+    global _watchlist
+    if _watchlist is None and WATCHLIST_PATH:
+        with _watchlist_lock:
+            if _watchlist is None:
+                _watchlist = Watchlist().start()
+    return _watchlist
@@ -0,0 +1,142 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+# batch.py pulls in the pipeline, which needs the model runtime
+pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+
+import batch
+from batch import Checkpoint, camera_from_path, load_inputs, plan_segments, merge_parts
+
+def test_directory_inputs_take_the_camera_from_the_top_directory(tmp_path):
+    for rel in ("cam1/2024-05-01/a.mp4", "cam2/b.mp4", "c.mp4"):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_bytes(b"")
+    assert [e["camera_id"] for e in load_inputs(str(tmp_path))] == ["c", "cam1", "cam2"]
+
+def test_manifest_entries_outside_its_directory_take_their_parent_directory(tmp_path):
+    video = tmp_path / "nvr" / "cam3" / "x.mp4"
+    video.parent.mkdir(parents=True)
+    video.write_bytes(b"")
+    manifest = tmp_path / "manifests" / "batch.txt"
+    manifest.parent.mkdir()
+    manifest.write_text(f"{video}\n../nvr/cam3/x.mp4\n", encoding="utf-8")
+
+    entries = load_inputs(str(manifest))
+    assert [e["camera_id"] for e in entries] == ["cam3", "cam3"]
+    assert all(e["path"] == str(video) for e in entries)
+
+def test_manifest_camera_id_wins_and_unnamed_cameras_are_rejected(tmp_path):
+    manifest = tmp_path / "batch.json"
+    manifest.write_text(json.dumps([{"path": "../x.mp4", "camera_id": "gate"}]), encoding="utf-8")
+    assert load_inputs(str(manifest))[0]["camera_id"] == "gate"
+    with pytest.raises(ValueError):
+        camera_from_path("/x.mp4", str(tmp_path))
+
+def test_plan_segments_cuts_at_the_first_keyframe_past_the_length():
+    keyframes = [0.0, 2.0, 4.0, 5.5, 8.0, 10.0, 11.0]
+    assert plan_segments(keyframes, 5) == [(0.0, 5.5), (5.5, 11.0), (11.0, None)]
+
+def test_plan_segments_without_keyframes_or_length_is_one_segment():
+    assert plan_segments([], 600) == [(0.0, None)]
+    assert plan_segments([0.0, 10.0], 0) == [(0.0, None)]
+
+def test_keyframe_times_are_relative_to_the_stream_start(monkeypatch):
+    outputs = {
+        "stream=start_time": "1.400000\n",
+        "packet=pts_time,flags": "1.400000,K__\n1.440000,___\n3.400000,K__\nN/A,K__\n",
+    }
+
+    def fake_run(cmd, **kwargs):
+        entries = cmd[cmd.index("-show_entries") + 1]
+        return subprocess.CompletedProcess(cmd, 0, stdout=outputs[entries], stderr="")
+
+    monkeypatch.setattr(batch.subprocess, "run", fake_run)
+    assert batch.keyframe_times("clip.ts") == pytest.approx([0.0, 2.0])
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "cam1" / "clip.mp4"
+    path.parent.mkdir()
+    path.write_bytes(b"\0" * 128)
+    return {"path": str(path), "name": "cam1/clip.mp4", "camera_id": "cam1"}
+
+def test_checkpoint_resumes_plans_and_finished_segments(tmp_path, video):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path)
+    checkpoint.set_plan(video, [(0.0, 600.0), (600.0, None)])
+    checkpoint.mark("cam1/clip.mp4@0.000", "done", records=3)
+    checkpoint.mark("cam1/clip.mp4@600.000", "failed", error="IOError")
+    checkpoint.save()
+    assert not os.path.exists(path + ".tmp")
+
+    resumed = Checkpoint(path)
+    assert resumed.plan(video) == [(0.0, 600.0), (600.0, None)]
+    assert resumed.is_done("cam1/clip.mp4@0.000")
+    assert not resumed.is_done("cam1/clip.mp4@600.000")
+
+def test_checkpoint_plans_a_changed_file_again(tmp_path, video):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    checkpoint.set_plan(video, [(0.0, None)])
+    with open(video["path"], "ab") as f:
+        f.write(b"more")
+    assert checkpoint.plan(video) is None
+
+def test_merge_parts_keeps_finished_segments_in_file_and_time_order(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    segments = []
+    for name, start, done in [("b.mp4", 0.0, True), ("a.mp4", 600.0, True), ("a.mp4", 0.0, True),
+                              ("a.mp4", 1200.0, False)]:
+        seg = {"id": f"{name}@{start}", "name": name, "start": start, "part": str(tmp_path / f"{name}-{start}.jsonl")}
+        with open(seg["part"], "w", encoding="utf-8") as f:
+            f.write(json.dumps({"segment": seg["id"]}) + "\n")
+        if done:
+            checkpoint.mark(seg["id"], "done")
+        segments.append(seg)
+
+    output = str(tmp_path / "plates.jsonl")
+    assert merge_parts(segments, checkpoint, output) == 3
+    with open(output, encoding="utf-8") as f:
+        order = [json.loads(line)["segment"] for line in f]
+    assert order == ["a.mp4@0.0", "a.mp4@600.0", "b.mp4@0.0"]
+
+class FakeCapture:
+    def __init__(self, path):
+        pass
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return 25.0
+
+    def release(self):
+        pass
+
+@pytest.mark.parametrize("errors, unwritten", [({"decode": 0, "track": 3}, 0), ({"track": 0}, 2), (None, 0)])
+def test_run_segment_fails_on_stage_errors_or_unwritten_records(tmp_path, monkeypatch, errors, unwritten):
+    monkeypatch.setattr(batch.cv2, "VideoCapture", FakeCapture)
+    monkeypatch.setattr(batch, "create_tracker", lambda fps: None)
+    monkeypatch.setattr(batch, "process_video", lambda *args: errors)
+    monkeypatch.setattr(batch, "close_writer", lambda: unwritten)
+    segment = {"id": "cam1/clip.mp4@0.000", "path": "clip.mp4", "camera_id": "cam1", "start": 0.0, "end": None,
+               "part": str(tmp_path / "part.jsonl")}
+
+    with pytest.raises((IOError, RuntimeError)):
+        batch.run_segment(segment)
+    # no part file: the segment is not merged and the next run retries it
+    assert not os.path.exists(segment["part"])
+
+def test_run_segment_succeeds_without_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch.cv2, "VideoCapture", FakeCapture)
+    monkeypatch.setattr(batch, "create_tracker", lambda fps: None)
+    monkeypatch.setattr(batch, "process_video", lambda *args: {"decode": 0, "track": 0})
+    monkeypatch.setattr(batch, "close_writer", lambda: 0)
+    segment = {"id": "cam1/clip.mp4@0.000", "path": "clip.mp4", "camera_id": "cam1", "start": 0.0, "end": None,
+               "part": str(tmp_path / "part.jsonl")}
+
+    assert batch.run_segment(segment)["records"] == 0
+    assert os.path.exists(segment["part"])
@@ -0,0 +1,86 @@
+from database import BulkWriter
+from memory_db import InMemoryClient
+
+class FlakyCollection:
+    """memory_db collection whose next ``failures`` bulk writes raise."""
+
+    def __init__(self, collection, failures: int = 0):
+        self.collection = collection
+        self.failures = failures
+
+    def bulk_write(self, requests, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("server unavailable")
+        return self.collection.bulk_write(requests, ordered=ordered)
+
+def new_collection():
+    return InMemoryClient()["test"]["plates"]
+
+def upsert(writer, track_id, **fields):
+    writer.add(("cam", track_id), {"camera_id": "cam", "track_id": track_id}, {"$set": fields})
+
+def test_updates_of_one_key_are_coalesced():
+    collection = new_collection()
+    writer = BulkWriter(collection, batch_size=100)
+    upsert(writer, 1, plate="51F12345", ocr_confidence=0.5)
+    upsert(writer, 1, ocr_confidence=0.9)
+    upsert(writer, 2, plate="30A99999")
+    assert writer.pending() == 2
+    assert writer.coalesced == 1
+
+    assert writer.flush() == 2
+    doc = collection.find_one({"track_id": 1})
+    assert doc["plate"] == "51F12345"
+    assert doc["ocr_confidence"] == 0.9
+    assert "written_at" in doc
+    assert collection.count_documents({}) == 2
+
+def test_failed_flush_keeps_records_and_newer_updates_win():
+    collection = new_collection()
+    writer = BulkWriter(FlakyCollection(collection, failures=1))
+    upsert(writer, 1, plate="51F12345")
+    assert writer.flush() == 0
+    assert writer.pending() == 1
+    assert collection.count_documents({}) == 0
+
+    # a later update of the same key merges into the re-buffered one
+    upsert(writer, 1, ocr_confidence=0.9)
+    upsert(writer, 2, plate="30A99999")
+    assert writer.flush() == 2
+    assert writer.pending() == 0
+    doc = collection.find_one({"track_id": 1})
+    assert (doc["plate"], doc["ocr_confidence"]) == ("51F12345", 0.9)
+    assert collection.count_documents({}) == 2
+
+def test_close_reports_unwritten_records():
+    writer = BulkWriter(FlakyCollection(new_collection(), failures=10)).start()
+    upsert(writer, 1, plate="51F12345")
+    upsert(writer, 2, plate="30A99999")
+    assert writer.close() == 2
+
+def test_close_drains_the_buffer():
+    collection = new_collection()
+    writer = BulkWriter(collection, flush_interval=60).start()
+    for track_id in range(5):
+        upsert(writer, track_id, plate=f"51F1234{track_id}")
+    assert writer.close() == 0
+    assert collection.count_documents({}) == 5
+
+def test_full_buffer_drops_the_oldest_key():
+    writer = BulkWriter(new_collection(), max_buffer=2)
+    for track_id in range(3):
+        upsert(writer, track_id, plate="51F12345")
+    assert writer.pending() == 2
+    assert writer.dropped == 1
+
+def test_on_inserted_sees_only_new_records():
+    inserted = []
+    collection = new_collection()
+    writer = BulkWriter(collection, on_inserted=inserted.extend)
+    upsert(writer, 1, plate="51F12345")
+    writer.flush()
+    upsert(writer, 1, plate="51F12346")
+    upsert(writer, 2, plate="30A99999")
+    writer.flush()
+    assert [(d["track_id"], d["plate"]) for d in inserted] == [(1, "51F12345"), (2, "30A99999")]
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from detections import DetectionBatch, RoiFilter, filter_detections, iou_matrix, rider_mask
+
+NAMES = {0: "person", 2: "car", 3: "motorcycle"}
+
+class FakeBoxes:
+    """Stand-in for ultralytics ``Boxes``: only ``.data.cpu().numpy()`` is used."""
+
+    def __init__(self, rows: list):
+        self._data = np.asarray(rows, dtype=np.float32)
+
+    @property
+    def data(self):
+        return self
+
+    def cpu(self):
+        return self
+
+    def numpy(self) -> np.ndarray:
+        return self._data
+
+def test_batch_reads_track_ids_when_present():
+    tracked = DetectionBatch.from_boxes(FakeBoxes([[10, 20, 110, 120, 7, 0.9, 2]]), NAMES)
+    det = next(iter(tracked))
+    assert det.box == (10, 20, 110, 120)
+    assert (det.track_id, det.cls, det.name) == (7, 2, "car")
+    assert det.conf == pytest.approx(0.9)
+
+    untracked = DetectionBatch.from_boxes(FakeBoxes([[10, 20, 110, 120, 0.9, 3]]), NAMES)
+    assert [d.track_id for d in untracked] == [-1]
+    assert len(DetectionBatch.from_boxes(None, NAMES)) == 0
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [0, 0, 0, 0]], dtype=np.float32)
+    iou = iou_matrix(a, b)
+    assert iou.shape == (2, 3)
+    assert iou[0, 0] == pytest.approx(1.0)
+    assert iou[0, 1] == pytest.approx(50 / 150)
+    # degenerate boxes have no area and no overlap
+    assert iou[0, 2] == 0.0 and not iou[1].any()
+
+def test_only_persons_on_a_motorcycle_are_riders():
+    batch = DetectionBatch.from_boxes(FakeBoxes([
+        [100, 100, 200, 300, 0.9, 3],   # motorcycle
+        [110, 90, 190, 280, 0.8, 0],    # its rider
+        [400, 100, 450, 250, 0.8, 0],   # pedestrian
+        [105, 100, 205, 300, 0.7, 2],   # car overlapping the motorcycle
+    ]), NAMES)
+    assert rider_mask(batch, 0.3).tolist() == [False, True, False, False]
+
+def test_roi_margin_drops_boxes_touching_the_edge():
+    roi = RoiFilter(polygon=None, margin=5)
+    xyxy = np.array([[10, 10, 100, 100], [0, 10, 100, 100], [10, 10, 640, 100]], dtype=np.float32)
+    assert roi(xyxy, 640, 480).tolist() == [True, False, False]
+
+def test_roi_polygon_tests_the_bottom_centre():
+    xyxy = np.array([[100, 50, 200, 300], [100, 50, 200, 150]], dtype=np.float32)
+    pixels = RoiFilter(polygon=[[0, 200], [640, 200], [640, 480], [0, 480]], margin=0)
+    fractions = RoiFilter(polygon=[[0, 0.5], [1, 0.5], [1, 1], [0, 1]], margin=0)
+    assert pixels(xyxy, 640, 400).tolist() == [True, False]
+    assert fractions(xyxy, 640, 400).tolist() == [True, False]
+
+@pytest.mark.parametrize("polygon", [[[0, 0], [1, 1]], [0, 1, 2], [[0, 0, 0], [1, 1, 1], [2, 2, 2]]])
+def test_invalid_roi_polygon_is_rejected(polygon):
+    with pytest.raises(ValueError):
+        RoiFilter(polygon=polygon)
+
+def test_filter_detections_applies_roi_and_rider_suppression():
+    boxes = FakeBoxes([
+        [100, 100, 200, 300, 1, 0.9, 3],
+        [110, 90, 190, 280, 2, 0.8, 0],
+        [0, 100, 80, 300, 3, 0.9, 2],     # cut off by the frame edge
+        [300, 100, 420, 300, 4, 0.9, 2],
+    ])
+    kept = filter_detections(boxes, 640, 480, NAMES, RoiFilter(polygon=None, margin=5), rider_iou=0.3)
+    assert [d.track_id for d in kept] == [1, 4]
+    assert len(filter_detections(FakeBoxes(np.zeros((0, 7))), 640, 480, NAMES)) == 0
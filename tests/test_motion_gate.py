@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from motion_gate import MotionScheduler
+
+def still_frame() -> np.ndarray:
+    return np.full((120, 160, 3), 90, dtype=np.uint8)
+
+def moving_frame(x: int) -> np.ndarray:
+    frame = still_frame()
+    frame[30:90, x:x + 40] = 250
+    return frame
+
+def scheduler(**kwargs) -> MotionScheduler:
+    options = dict(method="diff", downscale_width=80, pixel_threshold=25, min_area=0.01, max_stride=4,
+                   idle_frames=3)
+    options.update(kwargs)
+    return MotionScheduler(**options)
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        MotionScheduler(method="optical_flow")
+
+def test_moving_scene_is_detected_on_every_frame():
+    gate = scheduler()
+    runs = [gate.should_detect(moving_frame(10 + 20 * (i % 4)), i) for i in range(8)]
+    assert all(runs)
+    assert (gate.stride, gate.detected, gate.skipped) == (1, 8, 0)
+
+def test_static_scene_doubles_the_stride_up_to_the_cap():
+    gate = scheduler()
+    runs = [gate.should_detect(still_frame(), i) for i in range(30)]
+    assert gate.stride == 4
+    # the first frame has nothing to compare with and always runs
+    assert runs[0] and runs[1] and runs[2]
+    assert not all(runs[10:])
+    assert gate.detected + gate.skipped == 30
+    assert gate.skipped > gate.detected
+
+def test_motion_resets_the_stride_at_once():
+    gate = scheduler()
+    for i in range(30):
+        gate.should_detect(still_frame(), i)
+    assert gate.stride == 4
+    assert gate.should_detect(moving_frame(60), 30)
+    assert gate.stride == 1
+    assert gate.should_detect(moving_frame(100), 31)
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import STOP, Pipeline, StageQueue
+
+def drain(q: StageQueue) -> list:
+    items = []
+    while q.depth():
+        items.append(q.get(timeout=1))
+    return items
+
+def test_block_waits_for_room():
+    q = StageQueue("q", 1, "block")
+    q.put(1)
+    done = threading.Event()
+    threading.Thread(target=lambda: (q.put(2), done.set()), daemon=True).start()
+    assert not done.wait(0.1)
+    assert q.get(timeout=1) == 1
+    assert done.wait(1)
+    assert q.get(timeout=1) == 2 and q.dropped == 0
+
+def test_drop_newest_discards_the_incoming_item():
+    dropped = []
+    q = StageQueue("q", 2, "drop_newest", on_drop=dropped.append)
+    assert [q.put(i) for i in range(4)] == [True, True, False, False]
+    assert drain(q) == [0, 1]
+    assert dropped == [2, 3] and q.dropped == 2
+
+def test_drop_oldest_keeps_the_latest_items():
+    dropped = []
+    q = StageQueue("q", 2, "drop_oldest", on_drop=dropped.append)
+    assert all(q.put(i) for i in range(4))
+    assert drain(q) == [2, 3]
+    assert dropped == [0, 1] and q.dropped == 2
+
+def test_drop_oldest_never_discards_stop():
+    dropped = []
+    q = StageQueue("q", 1, "drop_oldest", on_drop=dropped.append)
+    q.put(STOP)
+    assert q.put(1) is False
+    assert q.get(timeout=1) is STOP
+    assert dropped == [1]
+
+def test_stop_is_never_dropped_by_a_full_queue():
+    q = StageQueue("q", 1, "drop_newest")
+    q.put(1)
+    threading.Thread(target=q.put, args=(STOP,), daemon=True).start()
+    assert q.get(timeout=1) == 1
+    assert q.get(timeout=1) is STOP
+
+def test_unknown_drop_policy_is_rejected():
+    with pytest.raises(ValueError):
+        StageQueue("q", 1, "drop_all")
+
+def run(pipeline: Pipeline, timeout: float = 5) -> dict:
+    pipeline.start()
+    deadline = time.time() + timeout
+    while pipeline.is_alive():
+        assert time.time() < deadline, "pipeline did not stop"
+        time.sleep(0.01)
+    return pipeline.join()
+
+def test_stop_flows_through_every_stage_after_the_last_worker():
+    first_q, second_q = StageQueue("first", 4), StageQueue("second", 4)
+    seen, events = [], []
+    lock = threading.Lock()
+
+    def first(item):
+        time.sleep(0.001)
+        second_q.put(item * 10)
+
+    def second(item):
+        with lock:
+            seen.append(item)
+
+    pipeline = Pipeline("test")
+    pipeline.add_source("source", iter(range(20)), first_q)
+    pipeline.add_stage("first", first, first_q, outputs=(second_q,), workers=3,
+                       on_stop=lambda: events.append(("first stopped", len(seen))))
+    pipeline.add_stage("second", second, second_q, on_stop=lambda: events.append(("second stopped", len(seen))))
+    run(pipeline)
+
+    assert sorted(seen) == [i * 10 for i in range(20)]
+    # on_stop runs once per stage, and the next stage only stops after it
+    assert [name for name, _ in events] == ["first stopped", "second stopped"]
+    assert events[-1][1] == 20
+
+def test_batched_stage_gets_every_item_once():
+    inbox = StageQueue("batched", 16)
+    batches = []
+    pipeline = Pipeline("test")
+    pipeline.add_source("source", iter(range(10)), inbox)
+    pipeline.add_stage("batched", batches.append, inbox, batch_size=4, batch_window=0.05)
+    run(pipeline)
+    assert all(1 <= len(b) <= 4 for b in batches)
+    assert sorted(i for b in batches for i in b) == list(range(10))
+
+def test_a_failing_source_still_stops_the_pipeline():
+    def items():
+        yield 1
+        raise IOError("stream lost")
+
+    inbox = StageQueue("q", 4)
+    seen = []
+    pipeline = Pipeline("test")
+    pipeline.add_source("source", items(), inbox)
+    pipeline.add_stage("stage", seen.append, inbox)
+    assert run(pipeline) == {"source": 1, "stage": 0}
+    assert seen == [1]
+
+def test_join_returns_the_errors_of_every_stage_and_on_stop():
+    def fail_odd(item):
+        if item % 2:
+            raise ValueError(item)
+
+    def fail_on_stop():
+        raise RuntimeError("flush failed")
+
+    inbox = StageQueue("q", 4)
+    pipeline = Pipeline("test")
+    pipeline.add_source("source", iter(range(6)), inbox)
+    pipeline.add_stage("stage", fail_odd, inbox, workers=2, on_stop=fail_on_stop)
+    assert run(pipeline) == {"source": 0, "stage": 4}
@@ -0,0 +1,67 @@
+import time
+
+import numpy as np
+import pytest
+
+from plate_cache import PlateCache
+
+@pytest.fixture
+def crop():
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 255, (40, 120, 3), dtype=np.uint8)
+
+def test_near_identical_crop_of_the_same_track_hits(crop):
+    cache = PlateCache(maxsize=8)
+    cache.put(cache.signature(crop), 1, "car", ("51F12345", 0.9), ("cam1", None))
+    # sensor noise flips no gradient sign worth more than a few bits
+    noisy = np.clip(crop.astype(np.int16) + 1, 0, 255).astype(np.uint8)
+    assert cache.get(cache.signature(noisy), 1, "car", ("cam1", None)) == ("51F12345", 0.9)
+    assert (cache.hits, cache.misses) == (1, 0)
+
+def test_other_crops_tracks_types_and_sizes_miss(crop):
+    cache = PlateCache(maxsize=8)
+    cache.put(cache.signature(crop), 1, "car", ("51F12345", 0.9), ("cam1", None))
+    other = np.random.default_rng(2).integers(0, 255, crop.shape, dtype=np.uint8)
+    assert cache.get(cache.signature(other), 1, "car", ("cam1", None)) is None
+    assert cache.get(cache.signature(crop), 2, "car", ("cam1", None)) is None
+    assert cache.get(cache.signature(crop), 1, "motorcycle", ("cam1", None)) is None
+    bigger = np.repeat(np.repeat(crop, 2, axis=0), 2, axis=1)
+    assert cache.get(cache.signature(bigger), 1, "car", ("cam1", None)) is None
+    assert cache.misses == 4
+
+def test_scopes_are_isolated(crop):
+    cache = PlateCache(maxsize=8)
+    cache.put(cache.signature(crop), 3, "car", ("51F12345", 0.9), ("cam1", None))
+    # track 3 of another camera, or of another batch segment, is another vehicle
+    assert cache.get(cache.signature(crop), 3, "car", ("cam2", None)) is None
+    assert cache.get(cache.signature(crop), 3, "car", ("cam1", "clip.mp4@600.000")) is None
+    assert cache.get(cache.signature(crop), 3, "car", ("cam1", None)) is not None
+
+def test_entries_expire_after_the_ttl(crop):
+    cache = PlateCache(maxsize=8, ttl=0.05)
+    cache.put(cache.signature(crop), 1, "car", ("51F12345", 0.9), ("cam1", None))
+    assert len(cache) == 1
+    time.sleep(0.1)
+    assert len(cache) == 0
+    assert cache.get(cache.signature(crop), 1, "car", ("cam1", None)) is None
+
+def test_scopes_without_live_entries_are_forgotten(crop):
+    cache = PlateCache(maxsize=4, ttl=0.05)
+    for segment in range(50):
+        cache.put(cache.signature(crop), 1, "car", ("51F12345", 0.9), ("cam1", f"clip.mp4@{segment}"))
+    # the oldest scopes lost their entries to newer ones
+    assert len(cache._scope_ids) <= 4
+    time.sleep(0.1)
+    cache.put(cache.signature(crop), 1, "car", ("51F12345", 0.9), ("cam2", None))
+    assert list(cache._scope_ids) == [("cam2", None)]
+    assert cache.get(cache.signature(crop), 1, "car", ("cam1", "clip.mp4@49")) is None
+
+def test_least_recently_used_entry_makes_room(crop):
+    cache = PlateCache(maxsize=2)
+    crops = [np.random.default_rng(seed).integers(0, 255, crop.shape, dtype=np.uint8) for seed in range(3)]
+    for track_id, c in enumerate(crops[:2]):
+        cache.put(cache.signature(c), track_id, "car", (f"plate{track_id}", 0.9), None)
+    assert cache.get(cache.signature(crops[0]), 0, "car", None) is not None
+    cache.put(cache.signature(crops[2]), 2, "car", ("plate2", 0.9), None)
+    assert cache.get(cache.signature(crops[1]), 1, "car", None) is None
+    assert cache.get(cache.signature(crops[0]), 0, "car", None) == ("plate0", 0.9)
@@ -0,0 +1,68 @@
+import random
+
+import numpy as np
+import pytest
+
+from plate_decode import group_chars, assemble_plate
+
+NAMES = {i: c for i, c in enumerate("0123456789ABCDEFGHKLMNPSTUVXYZ")}
+
+def reference_lines(boxes: np.ndarray, names: dict, min_conf: float = 0.5) -> list:
+    """The per-box loop decode_plate_text used before group_chars."""
+    chars = []
+    for x1, y1, x2, y2, conf, cls in boxes:
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        if conf < min_conf:
+            continue
+        chars.append(((x1 + x2) / 2, (y1 + y2) / 2, y2 - y1, names[int(cls)], float(np.float32(conf))))
+    if not chars:
+        return []
+    chars.sort(key=lambda c: (c[1], c[0]))
+    lines, current = [], [chars[0]]
+    for ch in chars[1:]:
+        if abs(ch[1] - current[-1][1]) < np.mean([c[2] for c in current]) * 0.7:
+            current.append(ch)
+        else:
+            lines.append(current)
+            current = [ch]
+    lines.append(current)
+    return [[(c[3], c[4]) for c in sorted(line, key=lambda c: c[0])] for line in lines]
+
+def random_plate_boxes(rng: random.Random, rows: int) -> np.ndarray:
+    # uniform glyph height per plate, a little vertical jitter, shuffled like detector output
+    height = rng.randint(30, 60)
+    boxes = []
+    for row in range(rows):
+        top = 10 + row * int(height * 1.4)
+        for col in range(rng.randint(3, 6)):
+            x1 = 10 + col * int(height * 0.7) + rng.randint(-2, 2)
+            y1 = top + rng.randint(-3, 3)
+            boxes.append([x1, y1, x1 + int(height * 0.6), y1 + height, rng.uniform(0.3, 1.0), rng.randrange(len(NAMES))])
+    rng.shuffle(boxes)
+    return np.asarray(boxes, dtype=np.float32)
+
+@pytest.mark.parametrize("rows", [1, 2])
+def test_group_chars_matches_reference_loop(rows):
+    rng = random.Random(rows)
+    for _ in range(200):
+        boxes = random_plate_boxes(rng, rows)
+        assert group_chars(boxes, NAMES) == reference_lines(boxes, NAMES)
+
+def test_group_chars_accepts_tracked_layout():
+    boxes = random_plate_boxes(random.Random(0), 2)
+    tracked = np.insert(boxes, 4, 7, axis=1)  # x1, y1, x2, y2, track_id, conf, cls
+    assert group_chars(tracked, NAMES) == group_chars(boxes, NAMES)
+
+def test_group_chars_empty_and_low_confidence():
+    assert group_chars(np.zeros((0, 6)), NAMES) == []
+    assert group_chars(np.array([[0, 0, 10, 20, 0.2, 1]]), NAMES) == []
+
+def test_assemble_plate_two_line_car():
+    lines = [[(c, 0.9) for c in "51F"], [(c, 0.8) for c in "12345"]]
+    text, conf = assemble_plate(lines, "car")
+    assert text == "51F12345"
+    assert conf == pytest.approx((0.9 * 3 + 0.8 * 5) / 8)
+
+def test_assemble_plate_rejects_bad_length():
+    assert assemble_plate([[(c, 0.9) for c in "51F1"]], "car") == ("N/A", 0.0)
+    assert assemble_plate([], "car") == ("None4", 0.0)
@@ -0,0 +1,55 @@
+import datetime
+import queue
+
+import pytest
+from bson import ObjectId
+
+from memory_db import InMemoryClient
+from plate_feed import PlateFeed
+from plate_search import utc_now
+
+@pytest.fixture
+def collection():
+    return InMemoryClient()["vehicle_db"]["vehicle_plates"]
+
+def record(plate: str, written_at: datetime.datetime, segment=None) -> dict:
+    return {"_id": ObjectId(), "plate_text": plate, "vehicle_type": "car", "written_at": written_at,
+            "timestamp": written_at, "segment": segment}
+
+def test_subscribers_beyond_the_limit_are_refused(collection):
+    feed = PlateFeed(collection, max_subscribers=2)
+    first, second = feed.subscribe(), feed.subscribe()
+    assert feed.subscribe() is None
+    assert (feed.subscribers(), feed.rejected) == (2, 1)
+    feed.unsubscribe(first)
+    assert feed.subscribe() is not None
+    assert second is not None
+
+def test_slow_subscriber_loses_its_oldest_events(collection):
+    feed = PlateFeed(collection, queue_size=2)
+    q = feed.subscribe()
+    for plate in ("A", "B", "C"):
+        feed.publish({"plate_text": plate})
+    assert [q.get_nowait()["plate_text"] for _ in range(2)] == ["B", "C"]
+    feed.unsubscribe(q)
+    feed.publish({"plate_text": "D"})
+    assert q.empty()
+    assert feed.published == 4
+
+def test_poller_publishes_new_live_records_once(collection):
+    now = utc_now()
+    collection.insert_one(record("OLD", now - datetime.timedelta(seconds=1)))
+    feed = PlateFeed(collection, poll_interval=0.02, lookback=60)
+    q = feed.subscribe()
+    feed.start()
+    try:
+        # a reprocessed recording is not live traffic
+        collection.insert_one(record("BATCH", now, segment=3))
+        collection.insert_one(record("51F12345", now))
+        assert q.get(timeout=2)["plate_text"] == "51F12345"
+        # the lookback window is read again on every pass without repeating records
+        with pytest.raises(queue.Empty):
+            q.get(timeout=0.2)
+        assert feed.mode == "poll"
+    finally:
+        feed.stop()
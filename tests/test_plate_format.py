@@ -0,0 +1,55 @@
+import pytest
+
+from plate_format import correct_plate, is_valid_plate
+
+@pytest.mark.parametrize("plate, vehicle_type", [
+    ("51F12345", "car"),
+    ("30A6789", "car"),
+    ("80NG12345", "car"),
+    ("AB1234", "car"),
+    ("51f12345 ", "car"),
+    ("29C12345", "truck"),
+    ("59X123456", "motorcycle"),
+    ("59AB12345", "motorcycle"),
+    ("59X1-23456", "motorcycle"),
+])
+def test_valid_plates(plate, vehicle_type):
+    assert is_valid_plate(plate, vehicle_type)
+
+@pytest.mark.parametrize("plate, vehicle_type", [
+    ("5F12345", "car"),
+    ("51F123", "car"),
+    ("51F1234567", "car"),
+    ("AB1234", "bus"),
+    ("5X12345", "motorcycle"),
+    ("59123456", "motorcycle"),
+    ("51F12345", "boat"),
+    ("", "car"),
+    (None, "car"),
+])
+def test_invalid_plates(plate, vehicle_type):
+    assert not is_valid_plate(plate, vehicle_type)
+
+@pytest.mark.parametrize("plate, vehicle_type, expected", [
+    ("51F1234S", "car", ("51F12345", 0.5)),
+    ("5IF12345", "car", ("51F12345", 0.5)),
+    ("51F1Z34B", "car", ("51F12348", 1.0)),
+    ("59X1Z3456", "motorcycle", ("59X123456", 0.5)),
+    ("51f-12345", "car", ("51F12345", 0.0)),
+])
+def test_correct_plate_swaps_confused_characters(plate, vehicle_type, expected):
+    assert correct_plate(plate, vehicle_type) == expected
+
+@pytest.mark.parametrize("plate, vehicle_type", [
+    ("ABCDEFGH", "car"),
+    ("SIF1234S", "car"),    # three swaps, above the edit budget
+    ("51F12345", "boat"),
+    ("", "car"),
+])
+def test_correct_plate_gives_up(plate, vehicle_type):
+    assert correct_plate(plate, vehicle_type) == (None, float("inf"))
+
+def test_correct_plate_respects_the_cost_budget():
+    # 6 <-> G costs 0.6, above a budget of 0.5
+    assert correct_plate("51F1234G", "car", max_cost=0.5) == (None, float("inf"))
+    assert correct_plate("51F1234G", "car", max_cost=0.6) == ("51F12346", 0.6)
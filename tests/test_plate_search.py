@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+from bson import ObjectId
+
+import plate_search
+from memory_db import InMemoryClient
+from plate_search import (
+    decode_cursor, encode_cursor, encode_since, ensure_indexes, search_plates, search_since, settled_since, utc_now,
+)
+
+@pytest.fixture
+def collection(monkeypatch):
+    monkeypatch.setattr(plate_search, "SINCE_SETTLE_SECONDS", 5)
+    collection = InMemoryClient()["vehicle_db"]["vehicle_plates"]
+    ensure_indexes(collection)
+    return collection
+
+def record(plate: str, age: float, vehicle_type: str = "car", segment=None) -> dict:
+    """A record written ``age`` seconds ago."""
+    written_at = utc_now() - datetime.timedelta(seconds=age)
+    return {"_id": ObjectId(), "plate": plate, "plate_key": plate_search.normalize_plate(plate),
+            "vehicle_type": vehicle_type, "timestamp": written_at, "written_at": written_at, "segment": segment}
+
+def test_cursor_round_trip():
+    doc = {"timestamp": datetime.datetime(2024, 5, 1, 8, 30, 15, 250000), "_id": ObjectId()}
+    assert decode_cursor(encode_cursor(doc)) == (doc["timestamp"], doc["_id"])
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+def test_cursor_pages_cover_every_record_once(collection):
+    docs = [record(f"51F{i:05d}", age=100 - i) for i in range(7)]
+    # records sharing a timestamp are ordered by _id
+    docs[4]["timestamp"] = docs[3]["timestamp"]
+    collection.insert_many(docs)
+    seen, cursor = [], None
+    while True:
+        page, cursor = search_plates(collection, limit=3, cursor=cursor)
+        seen += [doc["plate"] for doc in page]
+        if cursor is None:
+            break
+    assert len(seen) == 7 and set(seen) == {doc["plate"] for doc in docs}
+    assert seen[0] == "51F00006"
+    assert search_plates(collection, search="51f-00002")[0][0]["plate"] == "51F00002"
+
+def test_since_returns_settled_live_records_in_write_order(collection):
+    old, first, second, fresh = (record("A1", 60), record("B2", 30), record("C3", 20), record("D4", 1))
+    collection.insert_many([old, first, second, fresh, record("E5", 25, segment=2)])
+    since = encode_since(old)
+    docs, token = search_since(collection, since)
+    # the reprocessed recording and the record that has not settled yet are left out
+    assert [doc["plate"] for doc in docs] == ["B2", "C3"]
+    assert token == encode_since(second)
+    # nothing new: the token stays put
+    assert search_since(collection, token) == ([], token)
+    # the live stream backlog does not wait for records to settle
+    assert [doc["plate"] for doc in search_since(collection, token, settled=False)[0]] == ["D4"]
+
+def test_lookback_returns_recent_records_again(collection):
+    first, second = record("B2", 30), record("C3", 20)
+    collection.insert_many([first, second])
+    docs, _ = search_since(collection, encode_since(second), lookback=15)
+    assert [doc["plate"] for doc in docs] == ["B2", "C3"]
+
+def test_settled_since_skips_records_already_settled(collection):
+    collection.insert_many([record("A1", 60), record("B2", 1)])
+    token = settled_since()
+    assert search_since(collection, token) == ([], token)
+    assert [doc["plate"] for doc in search_since(collection, token, settled=False)[0]] == ["B2"]
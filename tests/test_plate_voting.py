@@ -0,0 +1,60 @@
+from plate_voting import PlateVote
+from config import OCR_RETRY_INTERVAL
+
+def test_single_reading_is_not_enough():
+    vote = PlateVote(min_readings=2, threshold=0.75)
+    vote.add_reading("51F12345", 0.9, 10.0)
+    assert vote.text == "51F12345"
+    assert not vote.done
+
+def test_agreeing_readings_close_the_vote():
+    vote = PlateVote(min_readings=2, threshold=0.75)
+    vote.add_reading("51F12345", 0.9, 10.0)
+    vote.add_reading("51F-12345", 0.8, 9.0)
+    assert vote.done
+    assert vote.text == "51F12345"
+    assert vote.consensus == 1.0
+
+def test_disagreement_below_threshold_keeps_reading():
+    vote = PlateVote(min_readings=2, threshold=0.75)
+    vote.add_reading("51F12345", 0.9, 10.0)
+    vote.add_reading("51F12845", 0.9, 10.0)
+    assert not vote.done
+    assert vote.consensus < 0.75
+    # a third reading breaks the tie on the disputed character
+    vote.add_reading("51F12345", 0.9, 10.0)
+    vote.add_reading("51F12345", 0.9, 10.0)
+    assert vote.done
+    assert vote.text == "51F12345"
+
+def test_invalid_readings_spend_attempts_until_the_cap():
+    vote = PlateVote(max_attempts=3)
+    for _ in range(3):
+        assert vote.wants_ocr(10.0)
+        vote.add_reading("None4", 0.0, 10.0)
+    assert vote.done
+    assert vote.text is None
+    assert not vote.wants_ocr(10.0)
+
+def test_cached_readings_neither_vote_nor_spend_attempts():
+    vote = PlateVote(max_attempts=3, min_readings=2, threshold=0.75)
+    vote.add_reading("51F12345", 0.9, 10.0)
+    # a parked vehicle: every later crop hits the cache
+    for _ in range(5):
+        vote.add_reading("51F12345", 0.9, 10.0, cached=True)
+    assert not vote.done
+    assert (vote.attempts, len(vote.readings), vote.cached) == (1, 1, 5)
+    assert vote.wants_ocr(10.0)
+    # once the cache entry expires a real reading closes the vote
+    vote.add_reading("51F12345", 0.85, 10.0)
+    assert vote.done and vote.consensus == 1.0
+
+def test_retry_waits_for_interval_and_quality():
+    vote = PlateVote()
+    assert vote.wants_ocr(10.0, frame_idx=0)
+    vote.mark_attempt(0)
+    vote.add_reading("51F12345", 0.9, 10.0)
+    assert not vote.wants_ocr(10.0, frame_idx=OCR_RETRY_INTERVAL - 1)
+    assert vote.wants_ocr(10.0, frame_idx=OCR_RETRY_INTERVAL)
+    # a clearly worse frame is not worth an OCR call
+    assert not vote.wants_ocr(1.0, frame_idx=OCR_RETRY_INTERVAL)
@@ -0,0 +1,62 @@
+import datetime
+import os
+import time
+
+import numpy as np
+import pytest
+
+import analytics
+from analytics import ensure_retention
+from image_store import DiskImageStore
+from memory_db import InMemoryClient
+from plate_search import ensure_indexes
+
+@pytest.fixture
+def collection(monkeypatch):
+    # the sweeper thread is exercised through DiskImageStore.expire below
+    monkeypatch.setattr(analytics, "start_image_expiry", lambda days, collection=None: None)
+    collection = InMemoryClient()["vehicle_db"]["vehicle_plates"]
+    ensure_indexes(collection)
+    return collection
+
+def test_records_expire_on_written_at(collection):
+    collection.create_index([("timestamp", 1)], name="timestamp_ttl", expireAfterSeconds=3600)
+    ensure_retention(collection, days=30)
+    indexes = collection.index_information()
+    assert "timestamp_ttl" not in indexes
+    assert indexes["written_at"]["key"] == [("written_at", 1)]
+    assert indexes["written_at"]["expireAfterSeconds"] == 30 * 86400
+
+    ensure_retention(collection, days=7)
+    assert collection.index_information()["written_at"]["expireAfterSeconds"] == 7 * 86400
+
+def test_switching_retention_off_keeps_a_plain_written_at_index(collection):
+    ensure_retention(collection, days=30)
+    ensure_retention(collection, days=None)
+    assert "expireAfterSeconds" not in collection.index_information()["written_at"]
+    # a later ensure_indexes does not trip over the index either way
+    ensure_retention(collection, days=30)
+    ensure_indexes(collection)
+    assert collection.index_information()["written_at"]["expireAfterSeconds"] == 30 * 86400
+
+def test_written_at_is_backfilled_in_utc(collection):
+    filmed = datetime.datetime(2024, 5, 1, 8, 30)
+    collection.insert_one({"plate": "51F12345", "timestamp": filmed})
+    ensure_indexes(collection)
+    doc = collection.find_one({})
+    assert doc["written_at"] == filmed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def test_image_expiry_keeps_images_still_referenced(tmp_path):
+    store = DiskImageStore(str(tmp_path))
+    rng = np.random.default_rng(0)
+    ids = [store.put(rng.integers(0, 255, (32, 32, 3), dtype=np.uint8)) for _ in range(3)]
+    old = time.time() - 10 * 86400
+    for image_id in ids[:2]:
+        for thumbnail in (False, True):
+            os.utime(store._path(image_id, thumbnail), (old, old))
+
+    before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=7)
+    # ids[0] is old but a record still shows it, ids[2] is recent
+    assert store.expire(before, lambda batch: {ids[0]} & set(batch)) == 1
+    assert store.get(ids[0]) is not None and store.get(ids[2], thumbnail=True) is not None
+    assert store.get(ids[1]) is None and store.get(ids[1], thumbnail=True) is None
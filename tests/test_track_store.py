@@ -0,0 +1,76 @@
+import time
+
+from track_store import TrackStore
+
+def test_tracks_missing_for_too_many_frames_are_closed():
+    closed = []
+    store = TrackStore(max_missing_frames=5, ttl=None, on_close=closed.append)
+    store.touch(1, frame_idx=0)
+    store.touch(2, frame_idx=4)
+    assert store.evict_stale(frame_idx=5) == []
+    evicted = store.evict_stale(frame_idx=6)
+    assert [s.track_id for s in evicted] == [1]
+    assert [s.track_id for s in closed] == [1]
+    assert 1 not in store and 2 in store
+
+def test_seeing_a_track_again_keeps_it_open():
+    store = TrackStore(max_missing_frames=5, ttl=None)
+    store.touch(1, frame_idx=0)
+    store.touch(2, frame_idx=1)
+    store.touch(1, frame_idx=6)
+    assert [s.track_id for s in store.evict_stale(frame_idx=7)] == [2]
+    assert 1 in store
+
+def test_tracks_expire_after_ttl():
+    store = TrackStore(ttl=10, max_missing_frames=1000)
+    store.touch(1)
+    assert store.evict_stale(now=time.time() + 5) == []
+    assert [s.track_id for s in store.evict_stale(now=time.time() + 11)] == [1]
+
+def test_pending_tracks_are_not_evicted():
+    store = TrackStore(max_missing_frames=1, ttl=None)
+    store.touch(1, frame_idx=0).pending = True
+    assert store.evict_stale(frame_idx=10) == []
+    store.get(1).pending = False
+    assert [s.track_id for s in store.evict_stale(frame_idx=10)] == [1]
+
+def test_store_is_bounded_least_recently_seen_first():
+    closed = []
+    store = TrackStore(max_entries=3, on_close=closed.append)
+    for track_id in (1, 2, 3):
+        store.touch(track_id, frame_idx=track_id)
+    store.touch(1, frame_idx=4)
+    store.touch(4, frame_idx=5)
+    assert len(store) == 3
+    assert [s.track_id for s in closed] == [2]
+
+def test_close_all_survives_a_failing_callback():
+    def on_close(state):
+        raise RuntimeError("boom")
+    store = TrackStore(on_close=on_close)
+    store.touch(1)
+    store.touch(2)
+    assert len(store.close_all()) == 2
+    assert len(store) == 0
+    assert store.closed == 2
+
+def test_bound_skips_tracks_waiting_on_ocr():
+    closed = []
+    store = TrackStore(max_entries=3, on_close=closed.append)
+    for track_id in (1, 2, 3):
+        store.touch(track_id, frame_idx=track_id).pending = track_id < 3
+    store.touch(4, frame_idx=4)
+    assert [s.track_id for s in closed] == [3]
+    assert 1 in store and 2 in store
+
+def test_bound_is_restored_once_ocr_comes_back():
+    closed = []
+    store = TrackStore(max_entries=2, on_close=closed.append)
+    for track_id in (1, 2):
+        store.touch(track_id).pending = True
+    store.touch(3)
+    assert closed == [] and len(store) == 3
+    store.get(1).pending = store.get(2).pending = False
+    store.touch(4)
+    assert [s.track_id for s in closed] == [1, 2]
+    assert len(store) == 2
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+# vehicle_detection pulls in the tracker and the model runtime
+pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+
+from detections import Detection
+from stream_context import StreamContext
+from vehicle_detection import build_result, prepare_vehicle
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+
+def car(track_id: int, x: int = 10) -> Detection:
+    return Detection((x, 20, x + 100, 120), 0.9, 2, "car", track_id)
+
+def test_untracked_detections_get_no_track_state(frame):
+    ctx = StreamContext("cam1")
+    assert prepare_vehicle(frame, car(-1, 10), ctx, 1) is None
+    assert prepare_vehicle(frame, car(-1, 150), ctx, 1) is None
+    assert len(ctx.tracks) == 0 and -1 not in ctx.tracks
+
+def test_readings_of_different_vehicles_never_share_a_vote(frame):
+    ctx = StreamContext("cam1")
+    jobs = [prepare_vehicle(frame, det, ctx, 1) for det in (car(-1, 10), car(7, 10), car(-1, 150), car(8, 150))]
+    assert jobs[0] is None and jobs[2] is None
+
+    build_result(jobs[1], "51F12345", 0.9)
+    build_result(jobs[3], "30A67890", 0.9)
+    assert [r[0] for r in ctx.tracks.get(7).vote.readings] == ["51F12345"]
+    assert [r[0] for r in ctx.tracks.get(8).vote.readings] == ["30A67890"]
+    assert len(ctx.tracks) == 2
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from plate_search import normalize_plate as search_normalize
+from watchlist import Watchlist, WatchlistIndex, normalize_plate, plate_distance
+
+@pytest.mark.parametrize("a, b, cost", [
+    ("51F12345", "51F12345", 0.0),
+    ("51F12345", "51F1234S", 0.5),   # 5/S is a confused pair
+    ("51F12345", "5IF1234S", 1.0),   # two confused pairs, 1/I and 5/S
+    ("51F12345", "51F12349", 1.0),   # any other swap
+    ("51F12345", "51F1234", 1.0),    # deletion
+    ("51F12345", "51F123456", 1.0),  # insertion
+    ("51F12345", "51F12399", 2.0),
+])
+def test_plate_distance(a, b, cost):
+    assert plate_distance(a, b) == cost
+    assert plate_distance(b, a) == cost
+
+def test_watchlist_and_search_normalize_alike():
+    for plate in ("51f-123.45", " 30A 678.90 ", None):
+        assert normalize_plate(plate) == search_normalize(plate)
+
+@pytest.fixture
+def index():
+    return WatchlistIndex({"51F-123.45": "stolen", "30A67890": "wanted"}, max_cost=1.0)
+
+def test_exact_match(index):
+    assert index.match("51f12345") == [("51F12345", "stolen", 0.0)]
+
+@pytest.mark.parametrize("reading, cost", [
+    ("51F1234S", 0.5),
+    ("5IF1234S", 1.0),
+    ("51F1234", 1.0),
+    ("51F12349", 1.0),
+])
+def test_fuzzy_match_up_to_the_cost(index, reading, cost):
+    assert index.match(reading) == [("51F12345", "stolen", cost)]
+
+@pytest.mark.parametrize("reading", ["51F123B4S", "51F12399", "51F1234S9", "99Z99999"])
+def test_no_match_beyond_the_cost(index, reading):
+    assert index.match(reading) == []
+
+def test_lower_cost_budget_per_query(index):
+    assert index.match("5IF1234S", max_cost=0.5) == []
+    assert index.match("51F1234S", max_cost=0.5) == [("51F12345", "stolen", 0.5)]
+    assert index.match("51F1234S", max_cost=0) == []
+
+def test_closest_entry_first():
+    index = WatchlistIndex({"51F12345": "a", "51F12348": "b"}, max_cost=1.0)
+    assert [m[0] for m in index.match("51F1234B")] == ["51F12348", "51F12345"]
+
+def test_reload_swaps_in_the_changed_file(tmp_path):
+    path = tmp_path / "watchlist.csv"
+    path.write_text("# plate,label\n51F12345,stolen\n\n", encoding="utf-8")
+    watchlist = Watchlist(str(path), max_cost=1.0, reload_interval=0).start()
+    assert len(watchlist) == 1
+    assert not watchlist.reload()
+
+    path.write_text("30A67890,wanted\n", encoding="utf-8")
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+    assert watchlist.reload()
+    assert watchlist.match("51F12345") == []
+    assert watchlist.match("30A6789O") == [("30A67890", "wanted", 0.5)]
+
+def test_missing_file_keeps_the_loaded_index(tmp_path):
+    path = tmp_path / "watchlist.csv"
+    path.write_text("51F12345\n", encoding="utf-8")
+    watchlist = Watchlist(str(path), reload_interval=0).start()
+    os.remove(path)
+    assert not watchlist.reload()
+    assert watchlist.match("51F12345") == [("51F12345", None, 0.0)]
+
+def test_check_alerts_once_per_track_and_entry():
+    watchlist = Watchlist(None, max_cost=1.0, cooldown=60)
+    watchlist.load({"51F12345": "stolen"})
+    alerts = watchlist.check({"51F12345", "51F1234S"}, "cam1", 7, "car")
+    assert len(alerts) == 1 and alerts[0]["label"] == "stolen"
+    assert watchlist.check("51F12345", "cam1", 7, "car") == []
+    assert watchlist.check("51F12345", "cam1", 8, "car")[0]["match"] == "exact"
+    assert watchlist.alerts.qsize() == 2